@@ -0,0 +1 @@
+"""性能基准测试，用法见 python -m benchmarks --help"""
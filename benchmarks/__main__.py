@@ -0,0 +1,245 @@
+"""基准测试入口
+
+    python -m benchmarks run -o results.json            # 运行全部用例
+    python -m benchmarks run -k gif -k pdf -n 5          # 只运行名称包含 gif 或 pdf 的用例，每个重复 5 次
+    python -m benchmarks compare base.json results.json  # 对比两次结果，有退化时返回 1
+    python -m benchmarks list
+
+每次测量在单独的子进程中执行，峰值内存（RSS）互不影响；
+墙钟时间和 CPU 时间取多次测量的中位数，峰值内存取最大值。
+同时记录缺页次数和 read 系统调用次数（Linux），用于观察输入读取方式的影响；
+设置 PYHANDLE_NO_MMAP=1 可与普通文件读取对比。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_FIXTURES_DIR = os.path.join(REPO_DIR, 'benchmarks', 'fixtures-data')
+
+# compare 时参与比较的指标；时间低于下限的用例波动太大，不判定退化
+METRICS = ('wall', 'cpu', 'peak_rss', 'output_bytes')
+NOISE_FLOOR = {'wall': 0.02, 'cpu': 0.02, 'peak_rss': 4 * 1024 * 1024, 'output_bytes': 0}
+
+
+def _peak_rss():
+    """本进程及已结束子进程（如进程池）的峰值 RSS（字节）"""
+    import resource
+    # Linux 的 ru_maxrss 单位为 KB，macOS 为字节
+    unit = 1 if sys.platform == 'darwin' else 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    try:
+        # Linux 上 exec 之后 ru_maxrss 仍包含父进程 fork 时的占用，VmHWM 只统计本进程
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return max(int(line.split()[1]) * 1024, children)
+    except OSError:
+        pass
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit, children)
+
+
+def _io_counters():
+    """缺页次数（含已结束的子进程）和 read 系统调用次数、读取字节数（仅本进程）"""
+    import resource
+    counters = {'minor_faults': 0, 'major_faults': 0}
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        counters['minor_faults'] += usage.ru_minflt
+        counters['major_faults'] += usage.ru_majflt
+    try:
+        with open('/proc/self/io') as f:
+            fields = dict(line.split(':') for line in f)
+        counters['read_calls'] = int(fields['syscr'])
+        counters['read_bytes'] = int(fields['rchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    return counters
+
+
+def measure(case_name, fixtures_dir):
+    """在当前进程中执行一次用例，返回测量结果（由子进程调用）"""
+    from benchmarks import fixtures
+    from benchmarks.cases import CASES
+    # 提前导入被测模块，计时不包含导入开销
+    import utils.batch_utils, utils.image_utils, utils.pdf_utils  # noqa: F401
+
+    paths = fixtures.ensure(fixtures_dir)
+    out_dir = tempfile.mkdtemp(prefix='pyhandle-bench-')
+    try:
+        start_io = _io_counters()
+        start_times = os.times()
+        start = time.perf_counter()
+        outputs = CASES[case_name](paths, out_dir)
+        wall = time.perf_counter() - start
+        end_times = os.times()
+        end_io = _io_counters()
+        cpu = sum(end_times[:4]) - sum(start_times[:4])
+        output_bytes = sum(os.path.getsize(path) for path in outputs)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    io = {key: end_io[key] - start_io[key] for key in end_io}
+    return {'wall': wall, 'cpu': cpu, 'peak_rss': _peak_rss(), 'output_bytes': output_bytes, 'io': io}
+
+
+def run_case(case_name, fixtures_dir, repeat):
+    """在 repeat 个子进程中分别测量一次，汇总为一条结果"""
+    samples = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-m', 'benchmarks', '_measure', case_name, '--fixtures', fixtures_dir],
+            cwd=REPO_DIR, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {'error': proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f'exit {proc.returncode}'}
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {
+        'wall': statistics.median(s['wall'] for s in samples),
+        'cpu': statistics.median(s['cpu'] for s in samples),
+        'peak_rss': max(s['peak_rss'] for s in samples),
+        'output_bytes': samples[-1]['output_bytes'],
+        'io': {key: statistics.median(s['io'][key] for s in samples) for key in samples[-1]['io']},
+        'samples': samples,
+    }
+
+
+def _environment():
+    import PIL
+    import PyPDF2
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pillow': PIL.__version__,
+        'pypdf2': PyPDF2.__version__,
+        'mmap': not os.environ.get('PYHANDLE_NO_MMAP'),
+    }
+
+
+def _selected(patterns):
+    from benchmarks.cases import CASES
+    return [name for name in CASES if not patterns or any(p in name for p in patterns)]
+
+
+def cmd_run(args):
+    from benchmarks import fixtures
+
+    fixtures_dir = os.path.abspath(args.fixtures)
+    print(f"准备 fixtures: {fixtures_dir}", file=sys.stderr)
+    fixtures.ensure(fixtures_dir)
+
+    results = {'environment': _environment(), 'repeat': args.repeat, 'cases': {}}
+    for name in _selected(args.keyword):
+        result = run_case(name, fixtures_dir, args.repeat)
+        results['cases'][name] = result
+        if 'error' in result:
+            print(f"{name:40s} 失败: {result['error']}", file=sys.stderr)
+        else:
+            io = result['io']
+            print(f"{name:40s} {result['wall']:8.3f}s  cpu {result['cpu']:8.3f}s  "
+                  f"rss {result['peak_rss'] / 1024 / 1024:7.1f}MB  out {result['output_bytes'] / 1024:9.1f}KB  "
+                  f"faults {io['minor_faults'] + io['major_faults']:7.0f}  reads {io.get('read_calls', 0):7.0f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"结果已写入 {args.output}", file=sys.stderr)
+    return 1 if any('error' in r for r in results['cases'].values()) else 0
+
+
+def compare(base, new, threshold):
+    """对比两次结果，返回 [(用例, 指标, 旧值, 新值, 比值)] 中超出阈值的退化项"""
+    regressions = []
+    for name, new_result in new['cases'].items():
+        base_result = base['cases'].get(name)
+        if not base_result or 'error' in base_result or 'error' in new_result:
+            continue
+        for metric in METRICS:
+            old_value, new_value = base_result[metric], new_result[metric]
+            if new_value - old_value <= NOISE_FLOOR[metric]:
+                continue
+            ratio = new_value / old_value if old_value else float('inf')
+            if ratio > 1 + threshold:
+                regressions.append((name, metric, old_value, new_value, ratio))
+    return regressions
+
+
+def cmd_compare(args):
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"{'用例':40s} {'旧(s)':>9s} {'新(s)':>9s} {'变化':>8s}")
+    for name, new_result in new['cases'].items():
+        base_result = base['cases'].get(name)
+        if not base_result or 'error' in base_result or 'error' in new_result:
+            continue
+        change = (new_result['wall'] / base_result['wall'] - 1) * 100 if base_result['wall'] else 0
+        print(f"{name:40s} {base_result['wall']:9.3f} {new_result['wall']:9.3f} {change:+7.1f}%")
+
+    regressions = compare(base, new, args.threshold)
+    if not regressions:
+        print(f"\n没有超过 {args.threshold:.0%} 的退化")
+        return 0
+    print(f"\n超过 {args.threshold:.0%} 的退化:")
+    for name, metric, old_value, new_value, ratio in regressions:
+        print(f"  {name} {metric}: {old_value:.4g} -> {new_value:.4g}（{ratio:.2f} 倍）")
+    return 1
+
+
+def cmd_list(args):
+    for name in _selected(args.keyword):
+        print(name)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='性能基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('run', help='运行基准测试')
+    p.add_argument('-o', '--output', help='结果 JSON 路径')
+    p.add_argument('-k', '--keyword', action='append', help='只运行名称包含该字符串的用例（可重复）')
+    p.add_argument('-n', '--repeat', type=int, default=3, help='每个用例的测量次数')
+    p.add_argument('--fixtures', default=DEFAULT_FIXTURES_DIR, help='fixtures 目录')
+    p.set_defaults(func=cmd_run)
+
+    p = subparsers.add_parser('compare', help='对比两次结果')
+    p.add_argument('base', help='基准结果 JSON')
+    p.add_argument('new', help='新结果 JSON')
+    p.add_argument('-t', '--threshold', type=float, default=0.10, help='判定退化的相对阈值（默认 0.10）')
+    p.set_defaults(func=cmd_compare)
+
+    p = subparsers.add_parser('list', help='列出用例')
+    p.add_argument('-k', '--keyword', action='append')
+    p.set_defaults(func=cmd_list)
+
+    p = subparsers.add_parser('_measure')
+    p.add_argument('case')
+    p.add_argument('--fixtures', default=DEFAULT_FIXTURES_DIR)
+    p.set_defaults(func=lambda args: print(json.dumps(measure(args.case, args.fixtures))) or 0)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""基准测试用例
+
+每个用例是 func(fixtures, out_dir)，返回生成的输出文件路径列表，用于统计输出大小。
+用例直接调用 utils 中的函数，与界面中对应的操作走同一条代码路径，但无需 PyQt5。
+"""
+import os
+
+# 转换用例的输入（fixtures 名称）和目标格式
+CONVERT_SOURCES = ('photo.jpg', 'photo_cmyk.jpg', 'screenshot.png', 'alpha.png', 'grey.png', 'palette.gif')
+CONVERT_FORMATS = ('png', 'jpg', 'webp', 'ico', 'icns', 'pdf')
+
+
+def _convert_case(source, format):
+    def run(fixtures, out_dir):
+        from utils.image_utils import _convert_image
+        name = os.path.splitext(source)[0]
+        return [_convert_image(fixtures[source], os.path.join(out_dir, f'{name}.{format}'), format)]
+    return run
+
+
+def _thumbnail_case(source, max_size):
+    def run(fixtures, out_dir):
+        from utils.image_utils import _convert_image
+        return [_convert_image(fixtures[source], os.path.join(out_dir, 'thumb.jpg'), 'jpg', max_size=max_size)]
+    return run
+
+
+def batch_convert(fixtures, out_dir):
+    """批量转换（进程池），对应图片转换页的“选择并转换图片”"""
+    from utils.batch_utils import convert_images
+    sources = [fixtures[name] for name in CONVERT_SOURCES] + fixtures['frames'][:24]
+    results = convert_images(sources, 'webp', output_dir=out_dir)
+    return [r.output_path for r in results if r.success]
+
+
+def _gif_case(**options):
+    def run(fixtures, out_dir):
+        """对应图片转换页的“合成 GIF”（select_and_merge_gif）"""
+        from utils.image_utils import merge_gif
+        output_path = os.path.join(out_dir, 'frames.gif')
+        merge_gif(fixtures['frames'], output_path, duration=100, **options)
+        return [output_path]
+    return run
+
+
+def merge_pdf(fixtures, out_dir):
+    """对应 PDF 合并页的“开始合并”"""
+    from utils.pdf_utils import merge_pdfs
+    output_path = os.path.join(out_dir, 'merged.pdf')
+    merge_pdfs(fixtures['pdfs'], output_path)
+    return [output_path]
+
+
+def _merge_invoices(**options):
+    def run(fixtures, out_dir):
+        """合并同一模板生成的发票，共享的字体和图片只写一次"""
+        from utils.pdf_utils import merge_pdfs
+        output_path = os.path.join(out_dir, 'invoices.pdf')
+        merge_pdfs(fixtures['invoices'], output_path, **options)
+        return [output_path]
+    return run
+
+
+def extract_pdf(fixtures, out_dir):
+    """对应 PDF 合并页中为每个文件设置页码范围（每个文件取第 3-5 页）"""
+    from utils.pdf_utils import merge_pdfs
+    output_path = os.path.join(out_dir, 'extracted.pdf')
+    merge_pdfs(fixtures['pdfs'], output_path, page_ranges=['3-5'] * len(fixtures['pdfs']))
+    return [output_path]
+
+
+def split_pdf(fixtures, out_dir):
+    """对应 PDF 合并页的“拆分”"""
+    from utils.pdf_utils import split_pdf
+    return split_pdf(fixtures['pdfs'][0], out_dir, chunk_size=10)
+
+
+def images_to_pdf(fixtures, out_dir):
+    """对应 PDF 合并页的“图片合成PDF”模式"""
+    from utils.pdf_utils import images_to_pdf
+    output_path = os.path.join(out_dir, 'scans.pdf')
+    images_to_pdf(fixtures['scans'], output_path)
+    return [output_path]
+
+
+CASES = {}
+for _source in CONVERT_SOURCES:
+    for _format in CONVERT_FORMATS:
+        CASES[f'convert:{_source}->{_format}'] = _convert_case(_source, _format)
+CASES['thumbnail:photo.jpg->jpg@256'] = _thumbnail_case('photo.jpg', 256)
+CASES['batch:webp'] = batch_convert
+CASES['gif:frames'] = _gif_case()
+CASES['gif:frames-no-optimize'] = _gif_case(optimize=False)
+CASES['gif:frames@320'] = _gif_case(max_size=320)
+CASES['pdf:merge'] = merge_pdf
+CASES['pdf:invoices'] = _merge_invoices()
+CASES['pdf:invoices-no-dedup'] = _merge_invoices(dedup=False)
+CASES['pdf:invoices-compress'] = _merge_invoices(compress=True)
+CASES['pdf:extract'] = extract_pdf
+CASES['pdf:split'] = split_pdf
+CASES['pdf:images'] = images_to_pdf
@@ -0,0 +1,217 @@
+"""生成基准测试用的合成数据
+
+所有内容由固定种子生成，同一版本的 fixtures 在任何机器上都完全相同。
+生成结果放在 fixtures 目录下，FIXTURE_VERSION 变化时重新生成。
+"""
+import io
+import json
+import os
+import random
+import shutil
+
+from PIL import Image, ImageDraw
+
+FIXTURE_VERSION = 2
+SEED = 20240501
+
+
+def _noise(rng, size, mode='L'):
+    return Image.frombytes(mode, size, rng.randbytes(size[0] * size[1] * len(mode)))
+
+
+def photo(rng, size):
+    """类似照片的图像：渐变背景、随机色块和颗粒噪声"""
+    gradient = Image.linear_gradient('L')
+    img = Image.merge('RGB', [gradient.resize(size), gradient.rotate(90).resize(size),
+                              gradient.transpose(Image.FLIP_TOP_BOTTOM).resize(size)])
+    draw = ImageDraw.Draw(img)
+    for _ in range(60):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        r = rng.randrange(size[0] // 40, size[0] // 6)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return Image.blend(img, _noise(rng, size, 'RGB'), 0.08)
+
+
+def screenshot(rng, size):
+    """类似截图的图像：纯色区域、文字和细线"""
+    img = Image.new('RGB', size, (246, 246, 246))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle((x, y, x + rng.randrange(50, 600), y + rng.randrange(30, 300)),
+                       fill=tuple(rng.randrange(180, 256) for _ in range(3)), outline=(90, 90, 90))
+    for y in range(20, size[1], 22):
+        draw.text((30, y), 'The quick brown fox jumps over the lazy dog 0123456789' * 3, fill=(20, 20, 20))
+    return img
+
+
+def screen_frames(rng, size, count):
+    """屏幕录像式的帧序列：背景不变，光标和一小块区域在变化"""
+    base = screenshot(rng, size)
+    frames = []
+    for i in range(count):
+        frame = base.copy()
+        draw = ImageDraw.Draw(frame)
+        x = 40 + i * (size[0] - 120) // count
+        draw.rectangle((x, size[1] // 2, x + 60, size[1] // 2 + 40), fill=(220, 40, 40))
+        draw.text((20, size[1] - 30), f'frame {i:04d}', fill=(0, 0, 0))
+        frames.append(frame)
+    return frames
+
+
+def text_pdf(path, page_count, rng):
+    """生成多页文字 PDF，所有页面共享同一个字体对象"""
+    offsets = []
+    out = bytearray(b"%PDF-1.4\n")
+
+    def obj(text):
+        offsets.append(len(out))
+        out.extend(f"{len(offsets)} 0 obj\n".encode() + text + b"\nendobj\n")
+
+    page_ids = [4 + i * 2 for i in range(page_count)]
+    obj(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = ' '.join(f"{i} 0 R" for i in page_ids)
+    obj(f"<< /Type /Pages /Kids [{kids}] /Count {page_count} >>".encode())
+    obj(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page in range(page_count):
+        lines = ' '.join(f"({rng.randrange(10 ** 12):x} line {n} of page {page + 1}) '" for n in range(45))
+        content = f"BT /F1 11 Tf 14 TL 50 800 Td {lines} ET".encode()
+        obj(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(offsets) + 2} 0 R >>".encode())
+        obj(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+
+    xref = len(out)
+    out.extend(f"xref\n0 {len(offsets) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.extend(f"{offset:010d} 00000 n \n".encode())
+    out.extend(f"trailer\n<< /Size {len(offsets) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def template_pdf(path, number, logo, font_data, icc_data, rng):
+    """生成套用同一模板的两页发票：嵌入字体、ICC 配置、标志图片和背景表单每份都相同"""
+    offsets = {}
+    out = bytearray(b"%PDF-1.4\n")
+
+    def obj(obj_id, text, data=None):
+        offsets[obj_id] = len(out)
+        out.extend(f"{obj_id} 0 obj\n".encode() + text)
+        if data is not None:
+            out.extend(b"\nstream\n" + data + b"\nendstream")
+        out.extend(b"\nendobj\n")
+
+    background = b"q 0.9 g 0 0 595 842 re f Q q 180 0 0 90 40 730 cm /Logo Do Q"
+    obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    obj(2, b"<< /Type /Pages /Kids [10 0 R 12 0 R] /Count 2 >>")
+    obj(3, b"<< /Type /Font /Subtype /TrueType /BaseFont /InvoiceSans /FirstChar 32 /LastChar 126 "
+           b"/FontDescriptor 4 0 R >>")
+    obj(4, b"<< /Type /FontDescriptor /FontName /InvoiceSans /Flags 32 /FontBBox [0 -200 1000 900] "
+           b"/ItalicAngle 0 /Ascent 900 /Descent -200 /CapHeight 700 /StemV 80 /FontFile2 5 0 R >>")
+    obj(5, f"<< /Length {len(font_data)} /Length1 {len(font_data)} >>".encode(), font_data)
+    obj(6, f"<< /Length {len(icc_data)} /N 3 >>".encode(), icc_data)
+    obj(7, f"<< /Type /XObject /Subtype /Image /Width {logo[1][0]} /Height {logo[1][1]} "
+           f"/ColorSpace [/ICCBased 6 0 R] /BitsPerComponent 8 /Filter /DCTDecode "
+           f"/Length {len(logo[0])} >>".encode(), logo[0])
+    obj(8, f"<< /Type /XObject /Subtype /Form /BBox [0 0 595 842] /Resources << /XObject << /Logo 7 0 R >> >> "
+           f"/Length {len(background)} >>".encode(), background)
+    resources = b"/Resources << /Font << /F1 3 0 R >> /XObject << /Bg 8 0 R >> >>"
+    for page in range(2):
+        lines = ' '.join(f"(Invoice {number} item {n}: {rng.randrange(10 ** 6)}) '" for n in range(30))
+        content = f"q /Bg Do Q BT /F1 11 Tf 14 TL 50 700 Td {lines} ET".encode()
+        obj(10 + page * 2, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] " + resources +
+            f" /Contents {11 + page * 2} 0 R >>".encode())
+        obj(11 + page * 2, f"<< /Length {len(content)} >>".encode(), content)
+
+    size = max(offsets) + 1
+    xref = len(out)
+    out.extend(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+    for obj_id in range(1, size):
+        if obj_id in offsets:
+            out.extend(f"{offsets[obj_id]:010d} 00000 n \n".encode())
+        else:
+            out.extend(b"0000000000 65535 f \n")
+    out.extend(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def generate(fixtures_dir):
+    """生成全部 fixtures，返回 {名称: 路径或路径列表}"""
+    rng = random.Random(SEED)
+    os.makedirs(fixtures_dir, exist_ok=True)
+    paths = {}
+
+    def save(name, img, **params):
+        path = os.path.join(fixtures_dir, name)
+        img.save(path, **params)
+        paths[name] = path
+
+    big_photo = photo(rng, (4000, 3000))
+    save('photo.jpg', big_photo, quality=90)
+    save('photo_small.jpg', big_photo.resize((1024, 768), Image.LANCZOS), quality=85)
+    save('photo_cmyk.jpg', big_photo.resize((1600, 1200)).convert('CMYK'), quality=90)
+    save('screenshot.png', screenshot(rng, (1920, 1080)))
+    alpha = photo(rng, (1024, 1024)).convert('RGBA')
+    alpha.putalpha(Image.radial_gradient('L').resize((1024, 1024)))
+    save('alpha.png', alpha)
+    save('grey.png', screenshot(rng, (1600, 1200)).convert('L'))
+    save('palette.gif', screenshot(rng, (800, 600)).convert('P', palette=Image.ADAPTIVE))
+
+    frame_dir = os.path.join(fixtures_dir, 'frames')
+    os.makedirs(frame_dir, exist_ok=True)
+    paths['frames'] = []
+    for i, frame in enumerate(screen_frames(rng, (800, 600), 60)):
+        path = os.path.join(frame_dir, f'{i:04d}.png')
+        frame.save(path)
+        paths['frames'].append(path)
+
+    scan_dir = os.path.join(fixtures_dir, 'scans')
+    os.makedirs(scan_dir, exist_ok=True)
+    paths['scans'] = []
+    for i in range(200):
+        path = os.path.join(scan_dir, f'{i:04d}.jpg')
+        if i < 4:
+            page = screenshot(rng, (1240, 1754)).convert('L')
+            page.save(path, quality=75)
+        else:
+            # 扫描页内容对计时影响不大，复用前几页节省生成时间
+            shutil.copyfile(paths['scans'][i % 4], path)
+        paths['scans'].append(path)
+
+    paths['pdfs'] = []
+    for i, page_count in enumerate((300, 150, 50)):
+        path = os.path.join(fixtures_dir, f'doc{i}.pdf')
+        text_pdf(path, page_count, rng)
+        paths['pdfs'].append(path)
+
+    # 同一模板生成的发票，用于测试跨文档去重
+    invoice_dir = os.path.join(fixtures_dir, 'invoices')
+    os.makedirs(invoice_dir, exist_ok=True)
+    buf = io.BytesIO()
+    logo = photo(rng, (600, 300))
+    logo.save(buf, format='JPEG', quality=85)
+    logo = (buf.getvalue(), logo.size)
+    font_data = rng.randbytes(60 * 1024)
+    icc_data = rng.randbytes(3 * 1024)
+    paths['invoices'] = []
+    for i in range(200):
+        path = os.path.join(invoice_dir, f'{i:04d}.pdf')
+        template_pdf(path, i, logo, font_data, icc_data, rng)
+        paths['invoices'].append(path)
+
+    with open(os.path.join(fixtures_dir, 'manifest.json'), 'w') as f:
+        json.dump({'version': FIXTURE_VERSION, 'paths': paths}, f, indent=1)
+    return paths
+
+
+def ensure(fixtures_dir):
+    """fixtures 不存在或版本不一致时重新生成，返回 {名称: 路径或路径列表}"""
+    try:
+        with open(os.path.join(fixtures_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest['version'] == FIXTURE_VERSION:
+            return manifest['paths']
+    except (OSError, ValueError, KeyError):
+        pass
+    return generate(fixtures_dir)
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""命令行入口，无需 PyQt5，可用于定时任务和服务器
+
+    python -m cli convert -f webp photos/*.jpg -o out/
+    python -m cli convert -f png --sizes 16,32,64,128 logo.svg -o icons/
+    python -m cli convert -f webp --target-size 150K --min-ssim 0.95 photos/ -o cdn/
+    python -m cli gif -o anim.gif -d 0.2 frames/
+    python -m cli dupes -r photos/
+    python -m cli merge -o merged.pdf @list.txt
+    python -m cli merge --pages 3-5 -o invoices.pdf invoices/
+    python -m cli split -n 10 -o parts/ book.pdf
+    python -m cli extract -p 1-3,7 -o excerpt.pdf book.pdf
+    python -m cli img2pdf -o scans.pdf scans/
+    python -m cli watch -f webp drop/ -o out/
+    python -m cli serve --port 8765
+
+输入可以是文件、通配符、目录，或以 @ 开头的清单文件（每行一个路径）。
+各子命令只在执行时导入所需模块，以保证启动速度。
+--stats 输出各处理阶段（读取、解码、缩放、编码等）的耗时，--profile 保存 cProfile 结果。
+"""
+import argparse
+import os
+import sys
+
+IMAGE_TYPES = {'jpg', 'jpeg', 'png', 'gif', 'webp', 'svg'}
+PDF_TYPES = {'pdf'}
+RASTER_TYPES = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tif', 'tiff', 'webp'}
+
+
+def _collect(args, allowed_types, unique=True):
+    """展开输入参数，@file 视为清单文件"""
+    from utils.file_utils import expand_inputs
+
+    manifests = [item[1:] for item in args.inputs if item.startswith('@')]
+    inputs = [item for item in args.inputs if not item.startswith('@')]
+    return expand_inputs(inputs, allowed_types, recursive=args.recursive,
+                         manifests=manifests, unique=unique)
+
+
+def _target_warning(result):
+    """按目标大小或画质编码但未达到目标时的提示，达到或未设置目标时返回 None"""
+    search = result.search
+    if search is None or search.met:
+        return None
+    ssim = f"，SSIM {search.ssim:.3f}" if search.ssim is not None else ""
+    return f"未达到目标: {result.input_path}（质量 {search.quality}，{search.size / 1024:.1f} KB{ssim}）"
+
+
+def cmd_convert(args):
+    from utils.batch_utils import output_path_for
+    from utils.file_utils import allowed_file
+
+    files = _collect(args, IMAGE_TYPES)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    if (args.target_size or args.min_ssim) and args.format not in ('jpg', 'webp'):
+        print("--target-size 和 --min-ssim 只能用于 jpg 和 webp", file=sys.stderr)
+        return 2
+
+    options = {'max_size': args.max_size} if args.max_size else {}
+    if args.dpi:
+        options['dpi'] = args.dpi
+    if args.target_size:
+        options['target_bytes'] = args.target_size
+    if args.min_ssim:
+        options['min_ssim'] = args.min_ssim
+    jobs = []
+    failed = 0
+    for path in files:
+        if not allowed_file(path, IMAGE_TYPES):
+            print(f"跳过不支持的文件: {path}", file=sys.stderr)
+            failed += 1
+            continue
+        output_path = output_path_for(path, args.format, args.output_dir)
+        if not args.sizes:
+            jobs.append((path, output_path, args.format, options))
+            continue
+        # 每个尺寸一个任务，分别缓存；同一个 SVG 的各尺寸由转换器合为一组，在同一个工作进程中渲染
+        base, ext = os.path.splitext(output_path)
+        for size in args.sizes:
+            jobs.append((path, f"{base}-{size}{ext}", args.format, dict(options, max_size=size)))
+
+    duplicates = {}
+    if args.skip_duplicates:
+        from utils.phash_utils import split_duplicates
+        jobs, duplicates = split_duplicates(jobs, _hash_index(args), args.max_distance)
+        if args.verbose:
+            for path, original in duplicates.items():
+                print(f"跳过重复图片: {path}（与 {original} 相同）")
+
+    cache = None
+    if args.cache or args.cache_dir:
+        from utils.cache_utils import ConversionCache
+        cache = ConversionCache(args.cache_dir, max_bytes=args.cache_size * 1024 * 1024)
+
+    from utils.pipeline_utils import PipelineConverter
+    converter = PipelineConverter(max_workers=args.jobs, cache=cache, prefetch=args.prefetch,
+                                  write_behind=args.write_queue, io_threads=args.io_threads)
+    journal = _journal(args)
+    success = 0
+    resumed = 0
+    missed = 0
+    for result in (converter.iter_journaled(jobs, journal) if journal else converter.iter_results(jobs)):
+        if result.resumed:
+            resumed += 1
+        if result.success:
+            success += 1
+            if args.verbose:
+                print(result.output_path)
+            warning = _target_warning(result)
+            if warning:
+                missed += 1
+                print(warning, file=sys.stderr)
+        else:
+            failed += 1
+            print(f"转换失败: {result.input_path}: {result.error}", file=sys.stderr)
+
+    print(f"成功转换 {success} 个文件，失败 {failed} 个。")
+    if missed:
+        print(f"其中 {missed} 个文件在质量下限内无法达到目标大小或画质，已写出最接近的结果。")
+    if duplicates:
+        print(f"跳过 {len(duplicates)} 个与其它输入重复的图片。")
+    if resumed:
+        print(f"其中 {resumed} 个在上次运行中已完成，已跳过。")
+    if cache:
+        stats = cache.stats()
+        print(f"缓存命中 {stats['hits']} 个，未命中 {stats['misses']} 个，节省 {stats['bytes_saved'] / 1024:.1f} KB，"
+              f"缓存占用 {stats['cache_bytes'] / 1024 / 1024:.1f} MB")
+    return 1 if failed or missed else 0
+
+
+def _journal(args):
+    """--resume 时返回作业日志，记录进度并跳过上次已完成的部分"""
+    if not (args.resume or args.journal):
+        return None
+    from utils.journal_utils import JobJournal
+    return JobJournal(args.journal)
+
+
+def _hash_index(args):
+    from utils.phash_utils import HashIndex
+    return HashIndex(args.hash_index, method=args.hash)
+
+
+def cmd_gif(args):
+    from utils.image_utils import merge_gif
+
+    files = _collect(args, IMAGE_TYPES)
+    if len(files) < 2:
+        print("请至少提供两张图片", file=sys.stderr)
+        return 2
+
+    report = merge_gif(files, args.output, duration=args.duration * 1000, loop=args.loop,
+                       size=args.size, max_size=args.max_size, keep_aspect=not args.stretch,
+                       optimize=not args.no_optimize, palette_sample=args.palette_sample,
+                       merge_similar=args.merge_similar,
+                       hash_index=_hash_index(args) if args.hash_index else None)
+    print(f"GIF 合成成功: {report.output_path}（{report.frame_count} 帧，写出 {report.written_frames} 帧，"
+          f"{report.output_bytes / 1024:.1f} KB，耗时 {report.seconds:.2f} 秒）")
+    return 0
+
+
+def cmd_dupes(args):
+    files = _collect(args, RASTER_TYPES)
+    index = _hash_index(args)
+    duplicates = index.duplicates(files, args.max_distance)
+    groups = {}
+    for path, original in duplicates.items():
+        groups.setdefault(original, []).append(path)
+    for original, paths in groups.items():
+        print(original)
+        for path in paths:
+            print(f"  = {path}")
+    print(f"共 {len(files)} 个文件，{len(duplicates)} 个与其它文件重复。")
+    if args.prune:
+        print(f"从哈希索引中删除 {index.prune()} 条已不存在的文件记录。")
+    return 0
+
+
+def cmd_merge(args):
+    from utils.pdf_utils import merge_pdfs
+
+    # 同一个PDF允许重复出现在合并列表中
+    files = _collect(args, PDF_TYPES, unique=False)
+    if not files:
+        print("没有要合并的PDF文件", file=sys.stderr)
+        return 2
+
+    errors = []
+
+    def on_error(path, error):
+        errors.append(path)
+        print(f"处理文件 {path} 失败: {error}", file=sys.stderr)
+
+    reports = []
+    page_ranges = [args.pages] * len(files) if args.pages else None
+    pages = merge_pdfs(files, args.output, error_callback=on_error, page_ranges=page_ranges,
+                       dedup=not args.no_dedup, compress=args.compress, report_callback=reports.append,
+                       journal=_journal(args))
+    print(f"合并完成: {args.output}（{pages} 页，{os.path.getsize(args.output) / 1024:.1f} KB）")
+    report = reports[0]
+    if report.duplicates:
+        print(f"去重: 跳过 {report.duplicates} 个重复对象，节省 {report.duplicate_bytes / 1024:.1f} KB")
+    if report.compressed_bytes:
+        print(f"压缩: 节省 {report.compressed_bytes / 1024:.1f} KB")
+    return 1 if errors else 0
+
+
+def cmd_split(args):
+    from utils.pdf_utils import split_pdf
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    output_files = split_pdf(args.input, args.output_dir, args.chunk_size)
+    print(f"拆分完成: {len(output_files)} 个文件")
+    return 0
+
+
+def cmd_extract(args):
+    from utils.pdf_utils import extract_pages
+
+    try:
+        pages = extract_pages(args.input, args.output, args.pages)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"提取完成: {args.output}（{pages} 页）")
+    return 0
+
+
+def cmd_img2pdf(args):
+    from utils.pdf_utils import images_to_pdf
+
+    files = _collect(args, RASTER_TYPES, unique=False)
+    if not files:
+        print("没有要合成的图片", file=sys.stderr)
+        return 2
+
+    errors = []
+
+    def on_error(path, error):
+        errors.append(path)
+        print(f"处理文件 {path} 失败: {error}", file=sys.stderr)
+
+    pages = images_to_pdf(files, args.output, error_callback=on_error)
+    print(f"合成完成: {args.output}（{pages} 页，{os.path.getsize(args.output) / 1024:.1f} KB）")
+    return 1 if errors else 0
+
+
+def cmd_watch(args):
+    import threading
+    from utils.watch_utils import FolderWatcher, WatchRule, create_backend, load_rules
+
+    rules = load_rules(args.rules) if args.rules else []
+    if args.folders:
+        if not args.format:
+            print("监视目录时需要指定 -f/--format", file=sys.stderr)
+            return 2
+        options = {'max_size': args.max_size} if args.max_size else None
+        rules.extend(WatchRule(os.path.abspath(folder), args.format, args.output_dir, options, args.recursive)
+                     for folder in args.folders)
+    if not rules:
+        print("没有要监视的目录", file=sys.stderr)
+        return 2
+
+    def on_result(result):
+        if result.success:
+            print(result.output_path, flush=True)
+            warning = _target_warning(result)
+            if warning:
+                print(warning, file=sys.stderr, flush=True)
+        else:
+            print(f"转换失败: {result.input_path}: {result.error}", file=sys.stderr, flush=True)
+
+    backend = create_backend(polling=args.poll, interval=args.interval)
+    watcher = FolderWatcher(rules, settle=args.settle, max_workers=args.jobs, backend=backend,
+                            initial_scan=not args.no_initial_scan, on_result=on_result)
+    print(f"正在监视 {len(rules)} 个目录（{type(backend).__name__}），按 Ctrl+C 退出", file=sys.stderr)
+    stop_event = threading.Event()
+    try:
+        watcher.run(stop_event)
+    except KeyboardInterrupt:
+        pass
+    print(f"已转换 {watcher.converted} 个文件，失败 {watcher.failed} 个，跳过 {watcher.skipped} 个", file=sys.stderr)
+    return 0
+
+
+def cmd_serve(args):
+    from utils.job_server import serve
+
+    serve(host=args.host, port=args.port, unix_path=args.unix, workers=args.jobs,
+          max_concurrent=args.concurrency, max_queue=args.max_queue)
+    return 0
+
+
+def _parse_size(text):
+    try:
+        width, height = text.lower().split('x')
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的尺寸: {text}（应为 WxH）")
+
+
+def _parse_bytes(text):
+    """解析 200K、1.5M 或字节数"""
+    units = {'k': 1024, 'm': 1024 * 1024}
+    value = text.strip().lower().rstrip('b')
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的大小: {text}（如 200K、1.5M）")
+
+
+def _parse_sizes(text):
+    try:
+        return [int(size) for size in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的尺寸列表: {text}（应为逗号分隔的整数）")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m cli', description='图片转换与 PDF 合并工具（命令行）')
+    parser.add_argument('--stats', action='store_true', help='结束后输出各处理阶段的耗时和字节数')
+    parser.add_argument('--profile', metavar='FILE', help='用 cProfile 采集主进程并保存到 FILE')
+    parser.add_argument('--trace-memory', action='store_true', help='用 tracemalloc 统计主进程的 Python 内存分配')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_inputs(p):
+        p.add_argument('inputs', nargs='+', help='文件、通配符、目录或 @清单文件')
+        p.add_argument('-r', '--recursive', action='store_true', help='递归展开目录和 ** 通配符')
+
+    def add_resume(p):
+        p.add_argument('--resume', action='store_true',
+                       help='在作业日志中记录进度；中断后以相同参数重新运行时跳过已完成的部分')
+        p.add_argument('--journal', metavar='FILE', help='作业日志路径（指定后自动启用 --resume）')
+
+    def add_hash(p):
+        p.add_argument('--hash', choices=['ahash', 'dhash', 'phash'], default='phash', help='感知哈希算法（默认 phash）')
+        p.add_argument('--hash-index', metavar='FILE', help='感知哈希索引路径（默认在缓存目录中）')
+
+    p = subparsers.add_parser('convert', help='批量转换图片格式')
+    add_inputs(p)
+    p.add_argument('-f', '--format', required=True, choices=['png', 'jpg', 'webp', 'gif', 'icns', 'ico', 'svg', 'eps', 'pdf'])
+    p.add_argument('-o', '--output-dir', help='输出目录（默认与源文件同目录）')
+    p.add_argument('-j', '--jobs', type=int, help='并行进程数（默认 CPU 核数）')
+    p.add_argument('--prefetch', type=int, help='提前读取的文件数（默认进程数的两倍）；网络共享上的输入先复制到本地')
+    p.add_argument('--io-threads', type=int, default=4, help='读取和写出线程数（默认 4）')
+    p.add_argument('--write-queue', type=int, help='同时写出的文件数（默认等于 --io-threads）')
+    p.add_argument('--max-size', type=int, help='输出最长边上限（生成缩略图）；ico/icns 为最大图标尺寸')
+    p.add_argument('--sizes', type=_parse_sizes,
+                   help='输出多个尺寸，如 16,32,64（最长边像素），文件名为 <原名>-<尺寸>.<格式>')
+    p.add_argument('--dpi', type=float, help='SVG 渲染分辨率（默认 96）')
+    p.add_argument('--target-size', type=_parse_bytes, metavar='SIZE',
+                   help='jpg/webp 输出大小上限，如 200K、1.5M，自动搜索满足条件的最高质量')
+    p.add_argument('--min-ssim', type=float, metavar='SSIM',
+                   help='jpg/webp 与原图的最低 SSIM（0-1，如 0.95），自动搜索满足条件的最低质量')
+    p.add_argument('-v', '--verbose', action='store_true', help='输出每个生成的文件')
+    p.add_argument('--cache', action='store_true', help='使用转换缓存，跳过内容未变化的文件')
+    p.add_argument('--cache-dir', help='缓存目录（指定后自动启用缓存）')
+    p.add_argument('--cache-size', type=int, default=1024, help='缓存大小上限（MB）')
+    p.add_argument('--skip-duplicates', action='store_true',
+                   help='跳过与前面的输入重复的图片（按感知哈希比较，包括重新压缩、缩放过的副本）')
+    p.add_argument('--max-distance', type=int, default=4, help='视为重复的最大哈希距离（0-64，默认 4）')
+    add_hash(p)
+    add_resume(p)
+    p.set_defaults(func=cmd_convert)
+
+    p = subparsers.add_parser('gif', help='将多张图片合成 GIF')
+    add_inputs(p)
+    p.add_argument('-o', '--output', required=True, help='输出 GIF 路径')
+    p.add_argument('-d', '--duration', type=float, default=0.1, help='每帧间隔（秒）')
+    p.add_argument('--loop', type=int, default=0, help='循环次数，0 表示无限循环')
+    p.add_argument('--size', type=_parse_size, help='画布大小 WxH（默认为首帧大小）')
+    p.add_argument('--max-size', type=int, help='画布最长边上限（像素）')
+    p.add_argument('--stretch', action='store_true', help='拉伸帧以填满画布，而不是等比缩放居中')
+    p.add_argument('--no-optimize', action='store_true', help='不使用全局调色板和帧差分，每帧独立量化')
+    p.add_argument('--palette-sample', type=int, default=64, help='统计全局调色板时抽样的帧数（0 表示全部）')
+    p.add_argument('--merge-similar', type=int, metavar='N',
+                   help='相邻帧的感知哈希距离不超过 N 时只保留前一帧并累加时长（0 表示只合并哈希相同的帧）；'
+                        '感知哈希忽略小范围的变化，不要用于屏幕录像等只有局部变化的帧序列')
+    add_hash(p)
+    p.set_defaults(func=cmd_gif)
+
+    p = subparsers.add_parser('dupes', help='按感知哈希列出重复的图片')
+    add_inputs(p)
+    p.add_argument('-d', '--max-distance', type=int, default=4, help='视为重复的最大哈希距离（0-64，默认 4）')
+    add_hash(p)
+    p.add_argument('--prune', action='store_true', help='同时从哈希索引中删除已不存在的文件的记录')
+    p.set_defaults(func=cmd_dupes)
+
+    p = subparsers.add_parser('merge', help='合并多个 PDF 文件')
+    add_inputs(p)
+    p.add_argument('-o', '--output', required=True, help='输出 PDF 路径')
+    p.add_argument('-p', '--pages', help='每个文件只合并这些页，如 1-3,5,8-（页码从 1 开始）')
+    p.add_argument('--no-dedup', action='store_true', help='不合并各文件中内容相同的字体、图片等对象')
+    p.add_argument('--compress', action='store_true', help='压缩输入中未压缩的流')
+    add_resume(p)
+    p.set_defaults(func=cmd_merge)
+
+    p = subparsers.add_parser('split', help='把 PDF 按固定页数拆分为多个文件')
+    p.add_argument('input', help='输入 PDF')
+    p.add_argument('-n', '--chunk-size', type=int, default=1, help='每个文件的页数（默认 1）')
+    p.add_argument('-o', '--output-dir', help='输出目录（默认与源文件同目录）')
+    p.set_defaults(func=cmd_split)
+
+    p = subparsers.add_parser('extract', help='从 PDF 中提取指定页面')
+    p.add_argument('input', help='输入 PDF')
+    p.add_argument('-p', '--pages', required=True, help='页码范围，如 1-3,5,8-；"5-3" 表示倒序')
+    p.add_argument('-o', '--output', required=True, help='输出 PDF 路径')
+    p.set_defaults(func=cmd_extract)
+
+    p = subparsers.add_parser('img2pdf', help='将多张图片合成 PDF（每张一页，JPEG/PNG 不重新压缩）')
+    add_inputs(p)
+    p.add_argument('-o', '--output', required=True, help='输出 PDF 路径')
+    p.set_defaults(func=cmd_img2pdf)
+
+    p = subparsers.add_parser('watch', help='监视目录，自动转换新增或修改的图片')
+    p.add_argument('folders', nargs='*', help='要监视的目录')
+    p.add_argument('-f', '--format', choices=['png', 'jpg', 'webp', 'gif', 'icns', 'ico', 'svg', 'eps', 'pdf'])
+    p.add_argument('-o', '--output-dir', help='输出目录（默认与源文件同目录），子目录中的文件按相对路径放到对应的子目录')
+    p.add_argument('-r', '--recursive', action='store_true', help='同时监视子目录')
+    p.add_argument('--max-size', type=int, help='输出最长边上限（生成缩略图）')
+    p.add_argument('--rules', help='JSON 规则文件，为不同目录指定不同的格式和选项')
+    p.add_argument('-j', '--jobs', type=int, help='并行进程数（默认 CPU 核数）')
+    p.add_argument('--settle', type=float, default=0.5, help='文件停止变化多少秒后开始转换（默认 0.5）')
+    p.add_argument('--poll', action='store_true', help='不使用 inotify，定期扫描目录')
+    p.add_argument('--interval', type=float, default=1.0, help='轮询间隔（秒）')
+    p.add_argument('--no-initial-scan', action='store_true', help='启动时不处理目录中已有的文件')
+    p.set_defaults(func=cmd_watch)
+
+    p = subparsers.add_parser('serve', help='启动本地作业服务，通过 HTTP 提交转换和合并作业')
+    p.add_argument('--host', default='127.0.0.1', help='监听地址（仅限本机，默认 127.0.0.1）')
+    p.add_argument('--port', type=int, default=8765, help='端口（默认 8765）')
+    p.add_argument('--unix', metavar='PATH', help='改为监听 Unix 套接字')
+    p.add_argument('-j', '--jobs', type=int, help='工作进程数（默认 CPU 核数）')
+    p.add_argument('--concurrency', type=int, help='同时执行的作业数（默认等于进程数）')
+    p.add_argument('--max-queue', type=int, default=1000, help='排队作业数上限，超出时返回 503')
+    p.set_defaults(func=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not (args.stats or args.profile or args.trace_memory):
+        return args.func(args)
+
+    from utils.profiling import Capture, StageStats, add_hook
+
+    stats = StageStats()
+    if args.stats:
+        add_hook(stats)
+    with Capture(profile=bool(args.profile), memory=args.trace_memory) as capture:
+        code = args.func(args)
+    if args.stats:
+        print(stats.report(), file=sys.stderr)
+    if args.profile:
+        capture.dump(args.profile)
+        print(f"cProfile 结果已保存到 {args.profile}", file=sys.stderr)
+    if args.trace_memory:
+        print(capture.report(), file=sys.stderr)
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
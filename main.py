@@ -1,10 +1,19 @@
+import time
+
+# 启动计时从导入 PyQt5 之前开始（--startup-time）
+STARTUP_START = time.perf_counter()
+
 import sys
 from PyQt5 import QtGui  # 之前添加的导入
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, 
                              QHBoxLayout, QListWidget, QFileDialog, QLabel, 
-                             QWidget, QMessageBox, QComboBox, QTabWidget, QProgressBar)  # 添加这一行
-from ui.image_converter import ImageConverter
-from ui.pdf_merger import PDFMergerPanel
+                             QWidget, QMessageBox, QComboBox, QTabWidget, QProgressBar,
+                             QCheckBox)  # 添加这一行
+from PyQt5.QtCore import QTimer
+from utils import profiling
+
+# 启动计时报告中列出的重量级模块，首个窗口显示前不应被加载
+HEAVY_MODULES = ('PIL.Image', 'PyPDF2', 'numpy', 'cairosvg')
 
 class MainWindow(QMainWindow):
     """主窗口"""
@@ -16,22 +25,98 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("多功能文件处理工具")
         self.setGeometry(300, 300, 600, 400)
         
-        # 创建标签页控件
+        # 创建标签页控件；各面板在标签页首次显示时才导入和构建
         tab_widget = QTabWidget()
-        
+        self.image_converter = None
+        self.pdf_merger = None
+        self.tab_builders = []
+
         # 添加图片转换标签页
-        self.image_converter = ImageConverter()
-        tab_widget.addTab(self.image_converter, "图片转换")
-        
+        self.add_lazy_tab(tab_widget, "图片转换", 'image_converter', self.build_image_converter)
+
         # 添加PDF合并标签页
-        self.pdf_merger = PDFMergerPanel(self)  # 传递主窗口引用
-        tab_widget.addTab(self.pdf_merger, "PDF合并")
-        
+        self.add_lazy_tab(tab_widget, "PDF合并", 'pdf_merger', self.build_pdf_merger)
+
+        tab_widget.currentChanged.connect(self.ensure_tab)
+        self.tab_widget = tab_widget
         self.setCentralWidget(tab_widget)
+        self.ensure_tab(tab_widget.currentIndex())
         
         # 状态栏
         self.statusBar().showMessage('就绪')
+
+        # 性能统计：勾选后记录各处理阶段的耗时，显示在状态栏右侧
+        self.stage_stats = profiling.StageStats()
+        self.stats_label = QLabel()
+        self.stats_check = QCheckBox('性能统计')
+        self.stats_check.toggled.connect(self.toggle_stats)
+        self.statusBar().addPermanentWidget(self.stats_label)
+        self.statusBar().addPermanentWidget(self.stats_check)
+        # 钩子可能在工作线程中调用，界面通过定时器刷新
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(500)
+        self.stats_timer.timeout.connect(self.update_stats)
+
+    def add_lazy_tab(self, tab_widget, title, attr, builder):
+        """添加占位标签页，真正的面板由 ensure_tab 在首次显示时放入"""
+        placeholder = QWidget()
+        layout = QVBoxLayout(placeholder)
+        layout.setContentsMargins(0, 0, 0, 0)
+        tab_widget.addTab(placeholder, title)
+        self.tab_builders.append((attr, builder))
+
+    def ensure_tab(self, index):
+        if index < 0:
+            return
+        attr, builder = self.tab_builders[index]
+        if getattr(self, attr) is None:
+            panel = builder()
+            self.tab_widget.widget(index).layout().addWidget(panel)
+            setattr(self, attr, panel)
+
+    def build_image_converter(self):
+        from ui.image_converter import ImageConverter
+        return ImageConverter()
+
+    def build_pdf_merger(self):
+        from ui.pdf_merger import PDFMergerPanel
+        return PDFMergerPanel(self)  # 传递主窗口引用
+
+    def toggle_stats(self, checked):
+        if checked:
+            self.stage_stats.reset()
+            profiling.add_hook(self.stage_stats)
+            self.stats_timer.start()
+        else:
+            profiling.remove_hook(self.stage_stats)
+            self.stats_timer.stop()
+            self.stats_label.clear()
+
+    def update_stats(self):
+        self.stats_label.setText(self.stage_stats.summary())
+        self.stats_label.setToolTip(self.stage_stats.report())
+
+
+def report_startup(budget=None):
+    """输出从启动到首个窗口显示的耗时；超出预算（秒）时以状态码 1 退出"""
+    elapsed = time.perf_counter() - STARTUP_START
+    loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(f"首个窗口显示耗时: {elapsed * 1000:.0f} ms")
+    print(f"已加载的重量级模块: {', '.join(loaded) if loaded else '无'}")
+    over_budget = budget is not None and elapsed > budget
+    if over_budget:
+        print(f"超出启动预算 {budget * 1000:.0f} ms")
+    QApplication.exit(1 if over_budget else 0)
+
+
 if __name__ == '__main__':
+    # --startup-time：显示首个窗口后输出启动耗时并退出；--startup-budget 秒数：超出时返回 1
+    startup_time = '--startup-time' in sys.argv
+    startup_budget = None
+    if '--startup-budget' in sys.argv:
+        startup_time = True
+        startup_budget = float(sys.argv[sys.argv.index('--startup-budget') + 1])
+
     app = QApplication(sys.argv)
     
     # 改进字体设置，尝试多种中文字体
@@ -47,4 +132,7 @@ if __name__ == '__main__':
     
     window = MainWindow()
     window.show()
+    if startup_time:
+        # 事件循环处理完窗口的显示事件后再计时
+        QTimer.singleShot(0, lambda: report_startup(startup_budget))
     sys.exit(app.exec_())
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+# 从仓库根目录导入 utils
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_pdf(path, texts):
+    """直接写出每页一行文字的 PDF，各页共用同一个字体对象"""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in texts:
+        content = f"BT /F1 24 Tf 72 700 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{obj}\nendobj\n".encode('ascii')
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('ascii')
+    data += ''.join(f"{offset:010d} 00000 n \n" for offset in offsets).encode('ascii')
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('ascii')
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+@pytest.fixture
+def pdf_inputs(tmp_path):
+    """6 个输入 PDF 及各自每页的文字"""
+    inputs = []
+    for i in range(6):
+        texts = [f"file {i} page {n}" for n in range(1, i % 3 + 2)]
+        inputs.append((make_pdf(str(tmp_path / f"in{i}.pdf"), texts), texts))
+    return inputs
@@ -0,0 +1,85 @@
+import pytest
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+from utils.image_utils import _convert_image
+
+SIZE = (64, 48)
+COLORS = [(220, 40, 40), (40, 160, 60), (30, 60, 200), (240, 200, 20)]
+# 第 3 帧与第 2 帧相同，输出时合并为一帧
+DURATIONS = [100, 50, 80, 200, 120]
+
+
+def make_frames():
+    frames = []
+    for position, color in [(0, 0), (10, 1), (10, 1), (24, 2), (36, 3)]:
+        frame = Image.new('RGBA', SIZE, (255, 255, 255, 255))
+        draw = ImageDraw.Draw(frame)
+        draw.rectangle((position, 8, position + 20, 36), fill=COLORS[color] + (255,))
+        frames.append(frame)
+    return frames
+
+
+def save_animation(path, format):
+    frames = make_frames()
+    options = {'save_all': True, 'append_images': frames[1:], 'duration': DURATIONS, 'loop': 0}
+    if format == 'gif':
+        frames = [frame.convert('RGB') for frame in frames]
+        frames[0].save(path, format='GIF', **dict(options, append_images=frames[1:]))
+    elif format == 'webp':
+        frames[0].save(path, format='WEBP', lossless=True, **options)
+    else:
+        frames[0].save(path, format='PNG', **options)
+    return path
+
+
+def timeline(path):
+    """解码动画，返回合并相同的相邻帧后的 [(RGBA 帧, 时长)] 和循环次数"""
+    result = []
+    with Image.open(path) as img:
+        loop = img.info.get('loop')
+        for index in range(img.n_frames):
+            img.seek(index)
+            frame = img.convert('RGBA')
+            duration = img.info['duration']
+            if result and ImageChops.difference(frame, result[-1][0]).getbbox(alpha_only=False) is None:
+                result[-1][1] += duration
+            else:
+                result.append([frame, duration])
+    return result, loop
+
+
+def max_difference(a, b):
+    return max(high for _, high in ImageChops.difference(a, b).getextrema())
+
+
+def mean_difference(a, b):
+    return max(ImageStat.Stat(ImageChops.difference(a, b)).mean)
+
+
+@pytest.mark.parametrize('input_format', ['gif', 'webp', 'png'])
+@pytest.mark.parametrize('output_format', ['gif', 'webp', 'png'])
+def test_animation_round_trip(tmp_path, input_format, output_format):
+    source = save_animation(str(tmp_path / f"in.{input_format}"), input_format)
+    output = _convert_image(source, str(tmp_path / f"out.{output_format}"), output_format)
+
+    expected, loop = timeline(source)
+    actual, output_loop = timeline(output)
+    assert [duration for _, duration in actual] == [duration for _, duration in expected]
+    assert len(expected) == len(DURATIONS) - 1
+    assert output_loop == loop
+    for (frame, _), (original, _) in zip(actual, expected):
+        assert frame.size == original.size
+        if output_format == 'webp':
+            # webp 按有损编码输出，只在色块边缘有误差
+            assert mean_difference(frame, original) < 4
+        else:
+            assert max_difference(frame, original) == 0
+
+
+def test_max_size_scales_every_frame(tmp_path):
+    source = save_animation(str(tmp_path / 'in.gif'), 'gif')
+    output = _convert_image(source, str(tmp_path / 'out.png'), 'png', max_size=32)
+
+    frames, _ = timeline(output)
+    assert [duration for _, duration in frames] == [100, 130, 200, 120]
+    assert all(frame.size == (32, 24) for frame, _ in frames)
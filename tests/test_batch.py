@@ -0,0 +1,75 @@
+import os
+
+import pytest
+from PIL import Image
+
+from utils import batch_utils
+from utils.batch_utils import BatchConverter, _convert_job, output_path_for
+from utils.pipeline_utils import PipelineConverter
+
+
+def make_jobs(tmp_path, names, format='png'):
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir(exist_ok=True)
+    jobs = []
+    for index, name in enumerate(names):
+        path = str(tmp_path / f"{name}.jpg")
+        Image.new('RGB', (48, 32), (index * 10 % 256, 80, 160)).save(path)
+        jobs.append((path, output_path_for(path, format, str(output_dir)), format))
+    return jobs
+
+
+def test_converts_all_jobs(tmp_path):
+    jobs = make_jobs(tmp_path, [f"{index}" for index in range(8)])
+    progress = []
+    results = BatchConverter(max_workers=2).run(jobs, lambda done, total, _: progress.append((done, total)))
+    assert sorted(result.input_path for result in results) == sorted(job[0] for job in jobs)
+    assert all(result.success for result in results)
+    assert progress == [(done, 8) for done in range(1, 9)]
+    with Image.open(jobs[0][1]) as image:
+        assert (image.format, image.size) == ('PNG', (48, 32))
+
+
+def test_cancel_stops_submitting(tmp_path):
+    jobs = make_jobs(tmp_path, [f"{index}" for index in range(30)])
+    converter = BatchConverter(max_workers=1, max_pending=2)
+    results = []
+    for result in converter.iter_results(jobs):
+        results.append(result)
+        converter.cancel()
+    # 取消时在途的任务照常完成，其余的不再提交
+    assert 1 <= len(results) <= 3
+    assert all(result.success for result in results)
+    assert sum(os.path.exists(job[1]) for job in jobs) == len(results)
+
+    # 再次运行时取消状态被清除
+    assert len(converter.run(jobs)) == 30
+    assert not converter.cancelled
+
+
+def _convert_or_crash(input_path, output_path, format, options=None, profile=False):
+    """输入文件名含 crash 时工作进程直接退出，模拟解码器崩溃"""
+    if 'crash' in os.path.basename(input_path):
+        os._exit(1)
+    return _convert_job(input_path, output_path, format, options, profile)
+
+
+@pytest.mark.parametrize('converter', [BatchConverter(max_workers=1, max_pending=2),
+                                       PipelineConverter(max_workers=1, max_pending=2)],
+                         ids=['batch', 'pipeline'])
+def test_worker_crash_fails_only_jobs_in_flight(tmp_path, monkeypatch, converter):
+    # 工作进程在提交时才创建，替换后 fork 出的进程使用替换的函数
+    monkeypatch.setattr(batch_utils, '_convert_job', _convert_or_crash)
+    jobs = make_jobs(tmp_path, ['crash'] + [f"ok{index}" for index in range(8)])
+    results = {result.input_path: result for result in converter.run(jobs)}
+    assert len(results) == 9
+
+    crashed = results[jobs[0][0]]
+    assert not crashed.success
+    assert '异常退出' in crashed.error
+    # 与崩溃的任务同时在途的任务（最多 max_pending 个）一起失败，其余任务在新的进程池中转换
+    # （流水线按预读完成的顺序提交，不一定是任务顺序）
+    failed = [job for job in jobs if not results[job[0]].success]
+    assert len(failed) <= 2
+    assert all(os.path.exists(job[1]) for job in jobs if job not in failed)
+    assert not [name for name in os.listdir(tmp_path / 'out') if name.endswith('.part')]
@@ -0,0 +1,90 @@
+import os
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from utils import cache_utils
+from utils.batch_utils import convert_images
+from utils.cache_utils import ConversionCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ConversionCache(str(tmp_path / 'cache'))
+    yield cache
+    cache.close()
+
+
+def make_png(path, color=(10, 160, 90), size=(32, 20)):
+    Image.new('RGB', size, color).save(path)
+    return str(path)
+
+
+def write_blob(path, size):
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    return str(path)
+
+
+def test_second_run_is_served_from_cache(tmp_path, cache):
+    inputs = [make_png(tmp_path / f"{index}.png", (index * 60, 0, 0)) for index in range(3)]
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    first = convert_images(inputs, 'webp', str(output_dir), max_workers=1, cache=cache)
+    assert [result.cached for result in first] == [False] * 3
+    expected = {result.output_path: Path(result.output_path).read_bytes() for result in first}
+
+    # 删除一个输出，命中时从缓存恢复
+    os.unlink(first[0].output_path)
+    second = convert_images(inputs, 'webp', str(output_dir), max_workers=1, cache=cache)
+    assert all(result.success and result.cached for result in second)
+    assert {path: Path(path).read_bytes() for path in expected} == expected
+    assert cache.stats()['hits'] == 3
+
+    # 输入内容变化后不再命中
+    make_png(inputs[1], (255, 255, 0))
+    third = convert_images(inputs, 'webp', str(output_dir), max_workers=1, cache=cache)
+    assert {result.input_path: result.cached for result in third} == {inputs[0]: True, inputs[1]: False,
+                                                                     inputs[2]: True}
+
+
+def test_key_depends_on_format_options_and_content(tmp_path, cache):
+    source = make_png(tmp_path / 'a.png')
+    copy = make_png(tmp_path / 'b.png')
+    assert cache.make_key(source, 'webp') == cache.make_key(copy, 'WEBP')
+    assert cache.make_key(source, 'webp') != cache.make_key(source, 'png')
+    assert cache.make_key(source, 'webp', {'max_size': 16}) != cache.make_key(source, 'webp')
+
+
+def test_output_version_invalidates_only_that_format(tmp_path, cache, monkeypatch):
+    source = make_png(tmp_path / 'a.png')
+    webp_key = cache.make_key(source, 'webp')
+    png_key = cache.make_key(source, 'png')
+    monkeypatch.setitem(cache_utils.OUTPUT_VERSIONS, 'webp', cache_utils.OUTPUT_VERSIONS['webp'] + 1)
+    assert cache.make_key(source, 'webp') != webp_key
+    assert cache.make_key(source, 'png') == png_key
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    cache = ConversionCache(str(tmp_path / 'cache'), max_bytes=2500)
+    clock = iter(range(1000))
+    monkeypatch.setattr(cache_utils.time, 'time', lambda: next(clock))
+    outputs = [write_blob(tmp_path / f"{index}.bin", 1000) for index in range(3)]
+    keys = [f"{index:02d}" * 32 for index in range(3)]
+
+    cache.store(keys[0], outputs[0])
+    cache.store(keys[1], outputs[1])
+    # 访问第一个条目后，最久未使用的是第二个
+    assert cache.fetch(keys[0], outputs[0])
+    cache.store(keys[2], outputs[2])
+
+    stats = cache.stats()
+    assert (stats['entries'], stats['cache_bytes'], stats['evictions']) == (2, 2000, 1)
+    os.unlink(outputs[1])
+    assert not cache.fetch(keys[1], outputs[1])
+    assert not os.path.exists(cache._blob_path(keys[1]))
+    os.unlink(outputs[0])
+    assert cache.fetch(keys[0], outputs[0])
+    assert os.path.getsize(outputs[0]) == 1000
+    cache.close()
@@ -0,0 +1,91 @@
+import io
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from utils import encode_utils
+from utils.batch_utils import convert_images, missed_target
+from utils.encode_utils import encode, search_quality
+
+
+@pytest.fixture(scope='module')
+def photo():
+    """渐变加噪声的 RGB 图像，各质量的编码大小差别明显"""
+    rng = np.random.default_rng(7)
+    y, x = np.mgrid[0:192, 0:256]
+    base = np.stack([x, y, (x + y) // 2], axis=-1).astype(np.float64)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, 'RGB')
+
+
+def test_ssim(photo):
+    reference = encode_utils._luma(photo)
+    assert encode_utils.ssim(reference, reference) == pytest.approx(1.0)
+    with Image.open(io.BytesIO(encode(photo, 'jpg', 10))) as low:
+        assert encode_utils.ssim(reference, encode_utils._luma(low)) < 0.9
+
+
+@pytest.mark.parametrize('format', ['jpg', 'webp'])
+def test_target_bytes_takes_highest_quality_that_fits(photo, format):
+    smallest = len(encode(photo, format, encode_utils.MIN_QUALITY))
+    largest = len(encode(photo, format, encode_utils.MAX_QUALITY))
+    target = (smallest + largest) // 2
+    result = search_quality(photo, format, target_bytes=target)
+    assert result.met
+    assert result.size == len(result.data) <= target
+    # 提前结束时大小在容差内，否则高一级的质量已超过目标
+    assert result.size >= target * (1 - encode_utils.SIZE_SLACK) or \
+        len(encode(photo, format, result.quality + 1)) > target
+    assert result.attempts < encode_utils.MAX_QUALITY - encode_utils.MIN_QUALITY
+
+
+def test_unreachable_target_returns_closest(photo):
+    result = search_quality(photo, 'jpg', target_bytes=100)
+    assert not result.met
+    assert result.quality == encode_utils.MIN_QUALITY
+    assert result.size > 100
+
+
+@pytest.mark.parametrize('format', ['jpg', 'webp'])
+def test_min_ssim_takes_lowest_quality_that_passes(photo, format):
+    result = search_quality(photo, format, min_ssim=0.9)
+    assert result.met
+    assert result.ssim >= 0.9
+    assert result.size < len(encode(photo, format, encode_utils.MAX_QUALITY))
+    if result.ssim >= 0.9 + encode_utils.SSIM_SLACK and result.quality > encode_utils.MIN_QUALITY:
+        relaxed = search_quality(photo, format, min_ssim=0.9, max_quality=result.quality - 1)
+        assert not relaxed.met
+
+
+def test_size_wins_over_quality(photo):
+    target = len(encode(photo, 'jpg', 30))
+    result = search_quality(photo, 'jpg', target_bytes=target, min_ssim=0.999)
+    assert not result.met
+    assert result.size <= target
+
+
+def test_invalid_arguments(photo):
+    with pytest.raises(ValueError):
+        search_quality(photo, 'png', target_bytes=1000)
+    with pytest.raises(ValueError):
+        search_quality(photo, 'jpg')
+
+
+def test_batch_reports_search(tmp_path, photo):
+    source = str(tmp_path / 'photo.png')
+    photo.save(source)
+    target = len(encode(photo, 'webp', 60))
+    met, = convert_images([source], 'webp', max_workers=1, target_bytes=target)
+    assert met.success and not missed_target(met)
+    assert met.search.met and met.search.data is None
+    assert os.path.getsize(met.output_path) == met.search.size <= target
+
+    missed, = convert_images([source], 'jpg', max_workers=1, target_bytes=100)
+    # 无法达到目标时仍写出最接近的结果
+    assert missed.success and missed_target(missed)
+    assert os.path.getsize(missed.output_path) == missed.search.size
+
+    failed, = convert_images([source], 'png', max_workers=1, target_bytes=100)
+    assert not failed.success
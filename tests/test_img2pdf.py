@@ -0,0 +1,98 @@
+import io
+import os
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+from PyPDF2 import PdfReader
+
+from utils.pdf_utils import images_to_pdf
+
+
+def page_images(path):
+    """各页的图片 XObject"""
+    reader = PdfReader(path, strict=True)
+    return [page['/Resources']['/XObject']['/Im0'].get_object() for page in reader.pages]
+
+
+def png_from_stream(image, color_type):
+    """用 XObject 的数据重建 PNG：流的内容应当就是原 PNG 的 IDAT 数据"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', image['/Width'], image['/Height'], image['/BitsPerComponent'],
+                         color_type, 0, 0, 0)
+    palette = chunk(b'PLTE', image['/ColorSpace'][3]) if color_type == 3 else b''
+    data = b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + palette + chunk(b'IDAT', image._data)
+    return Image.open(io.BytesIO(data + chunk(b'IEND', b'')))
+
+
+def noise(mode, size=(64, 48)):
+    rng = np.random.default_rng(3)
+    channels = {'L': 1, 'RGB': 3, 'RGBA': 4}[mode]
+    pixels = rng.integers(0, 256, (size[1], size[0], channels), dtype=np.uint8)
+    return Image.fromarray(pixels.squeeze(), mode)
+
+
+def test_jpeg_is_embedded_unchanged(tmp_path):
+    inputs = []
+    for index, mode in enumerate(['RGB', 'L', 'RGB']):
+        path = str(tmp_path / f"{index}.jpg")
+        noise(mode).save(path, quality=90, dpi=(144, 144))
+        inputs.append(path)
+    output = str(tmp_path / 'photos.pdf')
+    assert images_to_pdf(inputs, output) == 3
+
+    for path, image in zip(inputs, page_images(output)):
+        assert image['/Filter'] == '/DCTDecode'
+        with open(path, 'rb') as f:
+            assert image._data == f.read()
+    assert os.path.getsize(output) < sum(map(os.path.getsize, inputs)) + 4096
+    # 页面大小按 DPI 换算
+    assert [float(v) for v in PdfReader(output).pages[0].mediabox] == [0, 0, 32, 24]
+
+
+@pytest.mark.parametrize('mode', ['RGB', 'L', 'P'])
+def test_png_data_is_copied_with_predictor(tmp_path, mode):
+    img = noise('RGB').quantize(64) if mode == 'P' else noise(mode)
+    path = str(tmp_path / 'image.png')
+    img.save(path)
+    output = str(tmp_path / 'image.pdf')
+    images_to_pdf([path], output)
+
+    image, = page_images(output)
+    assert image['/Filter'] == '/FlateDecode'
+    assert image['/DecodeParms']['/Predictor'] == 15
+    assert '/SMask' not in image
+    # PyPDF2 的 PNG 预测器解码不支持多通道，按 PNG 解码嵌入的数据，像素（调色板图片为索引）与原图一致
+    with png_from_stream(image, {'L': 0, 'RGB': 2, 'P': 3}[mode]) as decoded:
+        assert decoded.tobytes() == img.tobytes()
+    if mode == 'P':
+        assert image['/ColorSpace'][0] == '/Indexed'
+
+
+def test_transparent_png_is_reencoded_with_soft_mask(tmp_path):
+    img = noise('RGBA')
+    path = str(tmp_path / 'alpha.png')
+    img.save(path)
+    output = str(tmp_path / 'alpha.pdf')
+    images_to_pdf([path], output)
+
+    image, = page_images(output)
+    assert '/DecodeParms' not in image
+    assert image.get_data() == img.convert('RGB').tobytes()
+    assert image['/SMask'].get_object().get_data() == img.getchannel('A').tobytes()
+
+
+def test_unreadable_image_is_reported_and_skipped(tmp_path):
+    good = str(tmp_path / 'good.jpg')
+    noise('RGB').save(good)
+    bad = tmp_path / 'bad.jpg'
+    bad.write_bytes(b'not an image')
+    errors = []
+    output = str(tmp_path / 'out.pdf')
+    assert images_to_pdf([str(bad), good], output, error_callback=lambda path, e: errors.append(path)) == 1
+    assert errors == [str(bad)]
+    assert len(page_images(output)) == 1
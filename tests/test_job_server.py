@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+
+import pytest
+from PIL import Image
+from PyPDF2 import PdfReader
+
+from utils import job_server
+from utils.job_server import HTTPError, JobClient, JobServer
+
+
+@pytest.fixture
+def server(tmp_path):
+    """在后台线程的事件循环中运行的服务，一个工作进程"""
+    server = JobServer(port=0, workers=1, max_upload_bytes=64 * 1024, work_dir=str(tmp_path / 'work'))
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result(timeout=10)
+    yield server
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(timeout=60)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def client(server):
+    client = JobClient(server.address, timeout=60)
+    yield client
+    client.close()
+
+
+def make_png(path, color=(200, 30, 30)):
+    Image.new('RGB', (40, 30), color).save(path)
+    return str(path)
+
+
+def _execute_or_crash(kind, inputs, output_path, format=None, options=None):
+    """输入文件名含 crash 时工作进程直接退出，模拟解码器崩溃"""
+    if 'crash' in os.path.basename(inputs[0]):
+        os._exit(1)
+    return _execute_job(kind, inputs, output_path, format, options)
+
+
+_execute_job = job_server.execute_job
+
+
+def test_convert_job(tmp_path, client):
+    output = client.run('convert', [make_png(tmp_path / 'red.png')], str(tmp_path / 'red.jpg'), format='jpg')
+    with Image.open(output) as image:
+        assert image.format == 'JPEG'
+        assert image.size == (40, 30)
+    # 下载后作业已删除
+    assert client.status()['jobs'] == 0
+
+
+def test_gif_and_img2pdf_jobs(tmp_path, client):
+    frames = [make_png(tmp_path / f"{index}.png", (index * 100, 0, 0)) for index in range(3)]
+    job_ids = [client.submit('gif', frames, options={'duration': 50}), client.submit('img2pdf', frames[:2])]
+    infos = [client.wait(job_id, timeout=60) for job_id in job_ids]
+    assert [info['status'] for info in infos] == ['done', 'done']
+    assert [info['filename'] for info in infos] == ['result.gif', 'images.pdf']
+
+    client.download(job_ids[0], str(tmp_path / 'result.gif'))
+    with Image.open(tmp_path / 'result.gif') as image:
+        assert image.n_frames == 3
+    client.download(job_ids[1], str(tmp_path / 'images.pdf'))
+    assert len(PdfReader(str(tmp_path / 'images.pdf')).pages) == 2
+
+
+@pytest.mark.parametrize('payload, status', [
+    ({'type': 'resize', 'uploads': []}, 400),
+    ({'type': 'convert', 'uploads': ['x'], 'format': 'bmp'}, 400),
+    ({'type': 'convert', 'uploads': ['x', 'y'], 'format': 'png'}, 400),
+    ({'type': 'gif', 'uploads': ['x'], 'options': {'colors': 8}}, 400),
+    ({'type': 'merge', 'uploads': []}, 400),
+    ({'type': 'merge', 'uploads': ['x'], 'priority': 'high'}, 400),
+    ({'type': 'merge', 'uploads': ['missing']}, 404),
+    (['not', 'an', 'object'], 400),
+])
+def test_invalid_job_is_rejected(client, payload, status):
+    with pytest.raises(HTTPError) as error:
+        client._json('POST', '/jobs', payload)
+    assert error.value.status == status
+    # 请求体已读完，连接可以继续使用
+    assert client.status()['queued'] == 0
+
+
+def test_request_errors(client):
+    for method, path, status in [('GET', '/jobs/unknown', 404), ('PUT', '/status', 405)]:
+        with pytest.raises(HTTPError) as error:
+            client._request(method, path).read()
+        assert error.value.status == status
+
+
+@pytest.mark.parametrize('length_header, status', [(b'', 411), (b'Content-Length: 65537\r\n', 413)])
+def test_upload_rejected_before_body(server, length_header, status):
+    # 只发送请求头：没有长度或超过上限的上传在读取请求体前被拒绝
+    with socket.create_connection((server.host, server.port), timeout=10) as sock:
+        sock.sendall(b"POST /uploads?name=a.png HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                     + length_header + b"\r\n")
+        response = sock.makefile('rb').read()
+    head, _, body = response.partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 %d ' % status)
+    assert 'error' in json.loads(body)
+
+
+def test_worker_crash_fails_only_that_job(tmp_path, server, client, monkeypatch):
+    # 工作进程在提交时才创建，替换后 fork 出的进程使用替换的函数
+    monkeypatch.setattr(job_server, 'execute_job', _execute_or_crash)
+    crashed = client.wait(client.submit('convert', [make_png(tmp_path / 'crash.png')], format='jpg'), timeout=60)
+    assert crashed['status'] == 'failed'
+    assert '异常退出' in crashed['error']
+
+    for index in range(2):
+        output = client.run('convert', [make_png(tmp_path / f"ok{index}.png")], str(tmp_path / f"ok{index}.webp"),
+                            format='webp')
+        with Image.open(output) as image:
+            assert image.format == 'WEBP'
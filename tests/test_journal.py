@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+
+import pytest
+from PIL import Image
+
+from test_pdf_merge import page_texts
+from utils import pdf_utils
+from utils.batch_utils import BatchConverter
+from utils.journal_utils import JobJournal
+from utils.pdf_utils import merge_pdfs
+
+
+def _crash_during_merge(inputs, output, journal_path, dedup, crash_at):
+    """在子进程中合并，处理到第 crash_at 个输入时直接退出，模拟崩溃（不清理临时文件）"""
+    # 每个输入之后都提交检查点
+    pdf_utils.CHECKPOINT_INTERVAL = 0
+
+    def progress(file_index, file_count, page_number, page_count):
+        if file_index == crash_at:
+            os._exit(1)
+
+    merge_pdfs(inputs, output, dedup=dedup, progress_callback=progress, journal=JobJournal(journal_path))
+
+
+@pytest.mark.parametrize('dedup', [False, True])
+def test_resume_after_crash_is_byte_identical(tmp_path, pdf_inputs, dedup):
+    inputs = [path for path, _ in pdf_inputs]
+    reference = str(tmp_path / 'reference.pdf')
+    merge_pdfs(inputs, reference, dedup=dedup)
+
+    output = str(tmp_path / 'merged.pdf')
+    journal_path = str(tmp_path / 'journal.sqlite')
+    process = multiprocessing.get_context('fork').Process(
+        target=_crash_during_merge, args=(inputs, output, journal_path, dedup, 4))
+    process.start()
+    process.join()
+    assert process.exitcode == 1
+    assert not os.path.exists(output)
+    assert os.path.exists(output + '.part')
+
+    resumed_files = set()
+    merge_pdfs(inputs, output, dedup=dedup, journal=JobJournal(journal_path),
+               progress_callback=lambda index, *_: resumed_files.add(index))
+
+    # 崩溃前已提交检查点的输入不再读取，从崩溃时正在合并的输入继续
+    assert min(resumed_files) == 4
+    with open(reference, 'rb') as a, open(output, 'rb') as b:
+        assert a.read() == b.read()
+    assert page_texts(output) == [text for _, texts in pdf_inputs for text in texts]
+
+
+def test_convert_resumes_completed_files(tmp_path):
+    inputs = []
+    for i in range(4):
+        path = str(tmp_path / f"{i}.png")
+        Image.new('RGB', (32, 32), (i * 60, 0, 0)).save(path)
+        inputs.append(path)
+    jobs = [(path, os.path.splitext(path)[0] + '.jpg', 'jpg') for path in inputs]
+    # 第一次运行时输入 2 缺失，作业没有完成，日志保留
+    missing = inputs[2] + '.moved'
+    os.rename(inputs[2], missing)
+    journal = JobJournal(str(tmp_path / 'journal.sqlite'))
+    results = BatchConverter(max_workers=2).run(jobs, journal=journal)
+    assert sorted(result.success for result in results) == [False, True, True, True]
+
+    os.rename(missing, inputs[2])
+    results = {result.input_path: result for result in BatchConverter(max_workers=2).run(jobs, journal=journal)}
+    assert all(result.success for result in results.values())
+    assert [results[path].resumed for path in inputs] == [True, True, False, True]
+
+    # 全部成功后日志删除记录，再次运行从头转换
+    results = BatchConverter(max_workers=2).run(jobs, journal=journal)
+    assert not any(result.resumed for result in results)
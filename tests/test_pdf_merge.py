@@ -0,0 +1,35 @@
+import os
+
+import pytest
+from PyPDF2 import PdfReader
+
+from utils.pdf_utils import merge_pdfs
+
+
+def page_texts(path):
+    """以严格模式重新读取 PDF，返回各页的文字"""
+    with open(path, 'rb') as f:
+        reader = PdfReader(f, strict=True)
+        return [page.extract_text().strip() for page in reader.pages]
+
+
+@pytest.mark.parametrize('dedup, compress', [(False, False), (True, False), (True, True)])
+def test_merge_rereads_strict(tmp_path, pdf_inputs, dedup, compress):
+    output = str(tmp_path / 'merged.pdf')
+    pages = merge_pdfs([path for path, _ in pdf_inputs], output, dedup=dedup, compress=compress)
+
+    expected = [text for _, texts in pdf_inputs for text in texts]
+    assert pages == len(expected)
+    assert page_texts(output) == expected
+    assert not os.path.exists(output + '.part')
+
+
+def test_merge_page_ranges(tmp_path, pdf_inputs):
+    output = str(tmp_path / 'merged.pdf')
+    inputs = [path for path, _ in pdf_inputs[:3]]
+    merge_pdfs(inputs, output, page_ranges=['', '2-1', '2'])
+
+    _, first = pdf_inputs[0]
+    _, second = pdf_inputs[1]
+    _, third = pdf_inputs[2]
+    assert page_texts(output) == first + second[::-1] + [third[1]]
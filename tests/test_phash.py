@@ -0,0 +1,113 @@
+import os
+import random
+
+import pytest
+from PIL import Image, ImageFilter
+
+from utils.phash_utils import HashIndex, _bands, _signed, hamming
+
+
+def random_hashes(seed, count=3000, clusters=40):
+    """随机哈希，其中一部分在若干个中心附近（翻转 0~10 位），保证各个距离上都有记录"""
+    rng = random.Random(seed)
+    centers = [rng.getrandbits(64) for _ in range(clusters)]
+    values = []
+    for i in range(count):
+        if i % 3:
+            values.append(rng.getrandbits(64))
+            continue
+        value = rng.choice(centers)
+        for bit in rng.sample(range(64), rng.randint(0, 10)):
+            value ^= 1 << bit
+        values.append(value)
+    return centers, values
+
+
+def fill_index(index, values):
+    """不经过图片直接把哈希写入索引"""
+    rows = [(index._method_key, f"/img/{i}.png", 0, 0, _signed(value), *_bands(value))
+            for i, value in enumerate(values)]
+    index.conn.executemany('INSERT INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+    index.conn.commit()
+
+
+@pytest.mark.parametrize('max_distance', [0, 3, 4, 7, 8, 12])
+def test_lookup_matches_brute_force(tmp_path, max_distance):
+    centers, values = random_hashes(max_distance)
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    fill_index(index, values)
+
+    for query in centers + values[:50]:
+        expected = sorted((hamming(query, value), f"/img/{i}.png") for i, value in enumerate(values)
+                          if hamming(query, value) <= max_distance)
+        assert index.lookup(query, max_distance) == expected
+    index.close()
+
+
+@pytest.mark.parametrize('max_distance', [0, 4, 8])
+def test_duplicates_match_brute_force(tmp_path, monkeypatch, max_distance):
+    _, values = random_hashes(100 + max_distance, count=600, clusters=20)
+    paths = [f"{i}.png" for i in range(len(values))]
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    monkeypatch.setattr(index, 'hash_paths', lambda paths: dict(zip(paths, values)))
+
+    # 每个文件对应距离最近的已保留文件，距离相同时取先出现的
+    kept = []
+    expected = {}
+    for path, value in zip(paths, values):
+        matches = [(hamming(value, other), order, other_path) for order, (other_path, other) in enumerate(kept)
+                   if hamming(value, other) <= max_distance]
+        if matches:
+            expected[path] = min(matches)[2]
+        else:
+            kept.append((path, value))
+    assert index.duplicates(paths, max_distance) == expected
+    index.close()
+
+
+def test_duplicates_of_resized_copies(tmp_path):
+    paths = []
+    for i in range(4):
+        img = Image.effect_noise((256, 192), 40 + 10 * i).convert('RGB').filter(ImageFilter.GaussianBlur(4))
+        path = tmp_path / f"{i}.png"
+        img.save(path)
+        paths.append(str(path))
+    copy = tmp_path / 'copy.jpg'
+    with Image.open(paths[2]) as img:
+        img.resize((128, 96), Image.LANCZOS).save(copy, quality=85)
+
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    assert index.duplicates(paths + [str(copy)]) == {str(copy): paths[2]}
+    # 第二次从索引读取哈希，结果相同
+    assert index.duplicates(paths + [str(copy)]) == {str(copy): paths[2]}
+    index.close()
+
+
+def test_prune_removes_missing_files(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"{i}.png"
+        Image.effect_noise((64, 64), 30 + 20 * i).convert('RGB').save(path)
+        paths.append(str(path))
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    index.hash_paths(paths)
+    HashIndex(index.path, method='dhash').hash_paths(paths)
+    os.unlink(paths[1])
+
+    # 两种算法各有一条记录
+    assert index.prune() == 2
+    assert index.lookup(index.hash_paths(paths[:1])[paths[0]], 0) == [(0, paths[0])]
+    rows = index.conn.execute('SELECT method, path FROM hashes').fetchall()
+    assert sorted(path for _, path in rows) == sorted([paths[0], paths[0], paths[2], paths[2]])
+    # 刚清理过，maybe_prune 不再检查文件
+    os.unlink(paths[2])
+    assert index.maybe_prune() == 0
+    index.close()
+
+
+def test_prune_deletes_by_primary_key(tmp_path):
+    index = HashIndex(str(tmp_path / 'index.sqlite'))
+    plan = ' '.join(row[-1] for row in index.conn.execute(
+        'EXPLAIN QUERY PLAN DELETE FROM hashes WHERE method = ? AND path = ?', ('phash:1', '/a.png')))
+    assert 'SCAN' not in plan
+    index.close()
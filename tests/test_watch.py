@@ -0,0 +1,71 @@
+import os
+import queue
+import threading
+
+import pytest
+from PIL import Image
+
+from utils import batch_utils, watch_utils
+from utils.watch_utils import FolderWatcher, PollingBackend, WatchRule
+
+
+def _convert_or_crash(input_path, output_path, format, options=None, profile=False):
+    """输入文件名含 crash 时工作进程直接退出，模拟解码器崩溃"""
+    if 'crash' in os.path.basename(input_path):
+        os._exit(1)
+    return batch_utils._convert_job(input_path, output_path, format, options, profile)
+
+
+@pytest.fixture
+def watch(tmp_path):
+    """在后台线程运行监视器，返回 (输入目录, 输出目录, 结果队列, 监视器)"""
+    folder = tmp_path / 'in'
+    output_dir = tmp_path / 'out'
+    folder.mkdir()
+    results = queue.Queue()
+    watcher = FolderWatcher([WatchRule(str(folder), 'webp', str(output_dir), recursive=True)], settle=0.05,
+                            max_workers=1, backend=PollingBackend(0.05), on_result=results.put)
+    stop = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop, 0.05))
+    thread.start()
+    yield folder, output_dir, results, watcher
+    stop.set()
+    thread.join(timeout=30)
+    assert not thread.is_alive()
+
+
+def write_png(path, color=(0, 120, 200)):
+    # 先写临时文件再改名，监视器不会看到写了一半的文件
+    Image.new('RGB', (24, 16), color).save(str(path) + '.tmp', 'PNG')
+    os.replace(str(path) + '.tmp', path)
+
+
+def test_new_files_are_converted_into_mirrored_folders(watch):
+    folder, output_dir, results, watcher = watch
+    (folder / 'a').mkdir()
+    (folder / 'b').mkdir()
+    write_png(folder / 'a' / 'same.png')
+    write_png(folder / 'b' / 'same.png', (200, 0, 0))
+
+    converted = {results.get(timeout=30).output_path for _ in range(2)}
+    assert converted == {str(output_dir / 'a' / 'same.webp'), str(output_dir / 'b' / 'same.webp')}
+    with Image.open(output_dir / 'b' / 'same.webp') as image:
+        assert image.format == 'WEBP'
+        assert image.size == (24, 16)
+    assert watcher.converted == 2
+
+
+def test_worker_crash_fails_only_that_file(watch, monkeypatch):
+    folder, output_dir, results, watcher = watch
+    # 工作进程在提交时才创建，替换后 fork 出的进程使用替换的函数
+    monkeypatch.setattr(watch_utils, '_convert_job', _convert_or_crash)
+    write_png(folder / 'crash.png')
+    crashed = results.get(timeout=30)
+    assert not crashed.success
+    assert '异常退出' in crashed.error
+
+    # 监视器继续运行，之后的文件在新的进程池中转换
+    for index in range(3):
+        write_png(folder / f"ok{index}.png")
+    assert all(results.get(timeout=30).success for _ in range(3))
+    assert (watcher.converted, watcher.failed) == (3, 1)
@@ -2,9 +2,19 @@
 
 
 # from .main_window import MainWindow
-from .image_converter import ImageConverter
-from .pdf_merger import PDFMergerPanel
+import importlib
 
+# 面板模块在首次访问时才导入，主窗口只构建当前显示的标签页
+_EXPORTS = {
+    'ImageConverter': 'image_converter',
+    'PDFMergerPanel': 'pdf_merger',
+}
 
+__all__ = [ 'ImageConverter', 'PDFMergerPanel']
 
-__all__ = [ 'ImageConverter', 'PDFMergerPanel']
\ No newline at end of file
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f'.{module_name}', __name__), name)
\ No newline at end of file
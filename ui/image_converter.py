@@ -1,15 +1,74 @@
 #!/usr/bin/env python3
 import os
 import sys
+import threading
 import uuid
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, 
                              QHBoxLayout, QListWidget, QFileDialog, QLabel, 
-                             QWidget, QMessageBox, QComboBox, QTabWidget, QProgressBar)  # 添加这一行
-from PyQt5.QtCore import Qt
+                             QWidget, QMessageBox, QComboBox, QTabWidget, QProgressBar,
+                             QCheckBox)  # 添加这一行
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5 import QtGui  # 之前添加的导入
-import PyPDF2 
-from PIL import Image  # 保留PIL作为基础图像处理库
-from utils import allowed_file, convert_image
+# Pillow 和转换模块在开始转换时才导入，加快程序启动
+from utils.file_utils import allowed_file
+from ui.pdf_queue import FileQueueModel
+from ui.thumbnails import ThumbnailProvider, ThumbnailStrip
+
+
+class ConvertWorker(QThread):
+    """后台批量转换线程，通过信号汇报进度"""
+    progress = pyqtSignal(int, int)  # 已完成数, 总数
+    finished_with_results = pyqtSignal(list)
+
+    def __init__(self, jobs, cache=None, journal=None, hash_index=None, parent=None):
+        super().__init__(parent)
+        from utils.pipeline_utils import PipelineConverter
+
+        self.jobs = jobs
+        self.journal = journal
+        self.hash_index = hash_index
+        # 读取和写出与转换重叠，输出先写入临时文件再改名，取消或崩溃不会留下不完整的文件
+        self.converter = PipelineConverter(cache=cache)
+
+    def cancel(self):
+        self.converter.cancel()
+
+    def run(self):
+        jobs, duplicates = self.jobs, {}
+        if self.hash_index is not None:
+            # 按感知哈希去掉与前面的图片重复的文件，只需降采样解码
+            from utils.phash_utils import split_duplicates
+            jobs, duplicates = split_duplicates(jobs, self.hash_index)
+        results = self.converter.run(
+            jobs, lambda done, total, result: self.progress.emit(done, total), journal=self.journal
+        )
+        from utils.batch_utils import ConvertResult
+        results += [ConvertResult(path, None, True, None, duplicate_of=original)
+                    for path, original in duplicates.items()]
+        self.finished_with_results.emit(results)
+
+
+class GifMergeWorker(QThread):
+    """后台合成GIF线程，通过信号汇报逐帧进度"""
+    progress = pyqtSignal(int, int)  # 已处理帧数, 总帧数
+    merged = pyqtSignal(object)  # GifReport
+    failed = pyqtSignal(str)
+
+    def __init__(self, file_paths, output_path, options, parent=None):
+        super().__init__(parent)
+        self.file_paths = file_paths
+        self.output_path = output_path
+        self.options = options
+
+    def run(self):
+        try:
+            from utils.image_utils import merge_gif
+            report = merge_gif(self.file_paths, self.output_path, progress_callback=self.progress.emit,
+                               **self.options)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.merged.emit(report)
 
 
 class ImageConverter(QWidget):
@@ -25,14 +84,56 @@ class ImageConverter(QWidget):
         format_layout = QHBoxLayout()
         format_layout.addWidget(QLabel("选择转换格式:"))
         self.format_combo = QComboBox()
-        self.format_combo.addItems(["png", "jpg", "webp", "icns","ico"])
+        self.format_combo.addItems(["png", "jpg", "webp", "gif", "icns","ico", "svg", "eps", "pdf"])
         format_layout.addWidget(self.format_combo)
         layout.addLayout(format_layout)
 
+        # jpg/webp 按目标大小或画质下限自动搜索质量，在进程池中逐张搜索
+        target_layout = QHBoxLayout()
+        target_layout.addWidget(QLabel("目标大小:"))
+        self.target_size_combo = QComboBox()
+        self.target_size_combo.addItems(["不限", "50 KB", "100 KB", "200 KB", "500 KB", "1 MB"])
+        target_layout.addWidget(self.target_size_combo)
+        target_layout.addWidget(QLabel("最低画质 (SSIM):"))
+        self.min_ssim_combo = QComboBox()
+        self.min_ssim_combo.addItems(["不限", "0.90", "0.95", "0.98"])
+        target_layout.addWidget(self.min_ssim_combo)
+        layout.addLayout(target_layout)
+        self.format_combo.currentTextChanged.connect(self.update_target_options)
+        self.update_target_options(self.format_combo.currentText())
+
+        # 转换缓存：重复转换未变化的文件时直接使用上次的结果；会在磁盘上保存输出的副本，默认关闭
+        from utils.cache_utils import DEFAULT_MAX_BYTES, default_cache_dir
+        self.cache_check = QCheckBox("使用转换缓存（跳过未变化的文件）")
+        self.cache_check.setToolTip(f"转换结果的副本保存在 {default_cache_dir()}，"
+                                    f"最多占用 {DEFAULT_MAX_BYTES // 1024 // 1024} MB，超出时删除最久未用的结果")
+        layout.addWidget(self.cache_check)
+        self.cache = None
+        self.journal = None
+
+        # 同一张照片以不同文件名出现多次时只转换第一张
+        self.dedupe_check = QCheckBox("跳过重复的图片（按感知哈希比较）")
+        layout.addWidget(self.dedupe_check)
+        self.hash_index = None
+
         # 转换按钮
         convert_btn = QPushButton("选择文件并转换")
         convert_btn.clicked.connect(self.select_and_convert)
         layout.addWidget(convert_btn)
+        self.convert_btn = convert_btn
+
+        # 转换进度和取消按钮
+        progress_layout = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setTextVisible(True)
+        self.progress_bar.setValue(0)
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_convert)
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_btn)
+        layout.addLayout(progress_layout)
+        self.worker = None
 
         # GIF合成选项
         duration_layout = QHBoxLayout()
@@ -42,73 +143,248 @@ class ImageConverter(QWidget):
         duration_layout.addWidget(self.duration_combo)
         layout.addLayout(duration_layout)
 
+        # GIF 最大边长，超出时等比缩小
+        size_layout = QHBoxLayout()
+        size_layout.addWidget(QLabel("GIF 最大边长:"))
+        self.gif_size_combo = QComboBox()
+        self.gif_size_combo.addItems(["原始大小", "1920", "1280", "800", "480"])
+        size_layout.addWidget(self.gif_size_combo)
+        layout.addLayout(size_layout)
+
+        # 同一张图片（包括重新压缩、缩放过的副本）连续出现时合并为一帧
+        self.merge_frames_check = QCheckBox("合并连续的重复帧（按感知哈希比较）")
+        self.merge_frames_check.setToolTip("只有很小区域变化的帧（如屏幕录像）也会被当作重复帧")
+        layout.addWidget(self.merge_frames_check)
+
+        # GIF 帧：先加入缩略图条检查内容和顺序，再合成
+        self.gif_model = FileQueueModel(self)
+        self.thumbnails = ThumbnailProvider(parent=self)
+        self.gif_strip = ThumbnailStrip(self.thumbnails)
+        self.gif_strip.setModel(self.gif_model)
+        layout.addWidget(self.gif_strip)
+
+        frame_layout = QHBoxLayout()
+        for text, slot in (("添加图片", self.add_gif_frames), ("左移", lambda: self.move_gif_frames(-1)),
+                           ("右移", lambda: self.move_gif_frames(1)), ("移除选中", self.remove_gif_frames),
+                           ("清空", self.clear_gif_frames)):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            frame_layout.addWidget(button)
+        layout.addLayout(frame_layout)
+
         # GIF合成按钮
-        gif_btn = QPushButton("选择多张图片合成GIF")
+        gif_btn = QPushButton("按上面的顺序合成GIF")
         gif_btn.clicked.connect(self.select_and_merge_gif)
         layout.addWidget(gif_btn)
+        self.gif_btn = gif_btn
+
+        # GIF合成进度
+        self.gif_progress_bar = QProgressBar()
+        self.gif_progress_bar.setTextVisible(True)
+        self.gif_progress_bar.setValue(0)
+        layout.addWidget(self.gif_progress_bar)
+        self.gif_worker = None
 
         self.setLayout(layout)
 
+    def update_target_options(self, format):
+        enabled = format in ('jpg', 'webp')
+        self.target_size_combo.setEnabled(enabled)
+        self.min_ssim_combo.setEnabled(enabled)
+
+    def target_options(self, format):
+        """目标大小和画质下限对应的转换选项"""
+        if format not in ('jpg', 'webp'):
+            return {}
+        options = {}
+        size = self.target_size_combo.currentText()
+        if size != "不限":
+            value, unit = size.split()
+            options['target_bytes'] = int(value) * (1024 * 1024 if unit == 'MB' else 1024)
+        ssim = self.min_ssim_combo.currentText()
+        if ssim != "不限":
+            options['min_ssim'] = float(ssim)
+        return options
+
     def select_and_convert(self):
         """选择并转换图片"""
         file_paths, _ = QFileDialog.getOpenFileNames(
-            self, "选择多个图片文件", "", "图像文件 (*.jpg *.jpeg *.png *.gif)"
+            self, "选择多个图片文件", "", "图像文件 (*.jpg *.jpeg *.png *.gif *.webp *.svg)"
         )
         if not file_paths:
             return
     
+        from utils.batch_utils import output_path_for
+
         convert_type = self.format_combo.currentText()
-        success_count = 0
-        failed_files = []
+        options = self.target_options(convert_type)
+        self.skipped_files = []
+        jobs = []
     
         for file_path in file_paths:
-            if not allowed_file(file_path, {'jpg', 'jpeg', 'png', 'gif'}):
-                failed_files.append(file_path)
+            if not allowed_file(file_path, {'jpg', 'jpeg', 'png', 'gif', 'webp', 'svg'}):
+                self.skipped_files.append(file_path)
                 continue
-            
-            base_name = os.path.splitext(os.path.basename(file_path))[0]
-            output_path = os.path.join(os.path.dirname(file_path), f"{base_name}.{convert_type}")
-    
-            if convert_image(file_path, output_path, convert_type):
-                success_count += 1
-            else:
-                failed_files.append(file_path)
+            jobs.append((file_path, output_path_for(file_path, convert_type), convert_type, options))
+
+        # 在后台流水线中转换（预读、进程池转换、写出），界面保持响应
+        self.total_files = len(file_paths)
+        self.progress_bar.setMaximum(max(len(jobs), 1))
+        self.progress_bar.setValue(0)
+        self.convert_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+
+        cache = None
+        if self.cache_check.isChecked():
+            if self.cache is None:
+                from utils.cache_utils import ConversionCache
+                self.cache = ConversionCache()
+            cache = self.cache
+
+        # 记录进度，程序崩溃后重新转换同一批文件时跳过已完成的文件
+        if self.journal is None:
+            from utils.journal_utils import JobJournal
+            self.journal = JobJournal()
+
+        hash_index = None
+        if self.dedupe_check.isChecked():
+            hash_index = self.get_hash_index()
+
+        self.worker = ConvertWorker(jobs, cache, self.journal, hash_index, self)
+        self.worker.progress.connect(self.on_convert_progress)
+        self.worker.finished_with_results.connect(self.on_convert_finished)
+        self.worker.start()
+
+    def get_hash_index(self):
+        if self.hash_index is None:
+            from utils.phash_utils import HashIndex
+            self.hash_index = HashIndex()
+            # 清理已删除文件的记录需要检查索引中的每个文件，在后台线程中进行，每天最多一次
+            threading.Thread(target=self.hash_index.maybe_prune, name='phash-prune', daemon=True).start()
+        return self.hash_index
+
+    def cancel_convert(self):
+        """取消正在进行的批量转换"""
+        if self.worker:
+            self.worker.cancel()
+            self.cancel_btn.setEnabled(False)
+
+    def on_convert_progress(self, done, total):
+        # 跳过重复图片后总数可能变少
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def on_convert_finished(self, results):
+        """汇总转换结果"""
+        self.convert_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.progress_bar.reset()
+        self.worker = None
+
+        from utils.batch_utils import missed_target
+
+        duplicates = [r for r in results if r.duplicate_of]
+        missed = [r for r in results if r.success and missed_target(r)]
+        success_count = sum(1 for r in results if r.success and not r.duplicate_of)
+        cached_count = sum(1 for r in results if r.cached)
+        failed_files = self.skipped_files + [r.input_path for r in results if not r.success]
+        cancelled_count = self.total_files - len(self.skipped_files) - len(results)
     
         message = f"成功转换 {success_count} 个文件。"
+        if cached_count:
+            message += f"\n其中 {cached_count} 个文件未变化，直接使用缓存结果。"
+        resumed_count = sum(1 for r in results if r.resumed)
+        if resumed_count:
+            message += f"\n其中 {resumed_count} 个文件在上次中断前已完成，已跳过。"
+        if missed:
+            message += f"\n{len(missed)} 个文件在质量下限内无法达到目标大小或画质，已保存最接近的结果:\n" + "\n".join(
+                f"{os.path.basename(r.input_path)}（质量 {r.search.quality}，{r.search.size / 1024:.1f} KB）"
+                for r in missed[:10])
+        if duplicates:
+            message += f"\n跳过 {len(duplicates)} 个重复的图片:\n" + "\n".join(
+                f"{os.path.basename(r.input_path)} = {os.path.basename(r.duplicate_of)}" for r in duplicates[:10])
+        if cancelled_count:
+            message += f"\n已取消 {cancelled_count} 个文件。"
         if failed_files:
             message += f"\n失败文件:\n" + "\n".join(failed_files)
             QMessageBox.warning(self, "部分失败", message)
+        elif missed:
+            QMessageBox.warning(self, "未达到目标", message)
         else:
             QMessageBox.information(self, "成功", message)
 
-    def select_and_merge_gif(self):
-        """选择多张图片合成GIF"""
+    def gif_selected_rows(self):
+        return sorted({index.row() for index in self.gif_strip.selectionModel().selectedIndexes()})
+
+    def add_gif_frames(self):
+        """选择图片加入 GIF 帧列表"""
         file_paths, _ = QFileDialog.getOpenFileNames(
             self, "选择多张图片合成GIF", "", "图像文件 (*.jpg *.jpeg *.png *.gif)"
         )
-        if not file_paths or len(file_paths) < 2:
+        self.gif_model.add_paths(file_paths)
+
+    def move_gif_frames(self, step):
+        rows = self.gif_model.move_rows(self.gif_selected_rows(), step)
+        selection = self.gif_strip.selectionModel()
+        selection.clearSelection()
+        for row in rows:
+            selection.select(self.gif_model.index(row, 0), selection.Select)
+        if rows:
+            self.gif_strip.scrollTo(self.gif_model.index(rows[0], 0))
+
+    def remove_gif_frames(self):
+        self.gif_model.remove_rows(self.gif_selected_rows())
+
+    def clear_gif_frames(self):
+        self.gif_model.clear()
+        self.thumbnails.cancel_pending()
+
+    def select_and_merge_gif(self):
+        """按帧列表的顺序合成GIF；列表为空时先选择图片"""
+        if self.gif_model.rowCount() == 0:
+            self.add_gif_frames()
+        file_paths = self.gif_model.paths()
+        if len(file_paths) < 2:
             QMessageBox.critical(self, "错误", "请至少选择两张图片")
             return
 
-        try:
-            images = []
-            for fp in file_paths:
-                img = Image.open(fp).convert("RGBA")
-                images.append(img)
-            
-            duration = float(self.duration_combo.currentText()) * 1000  # 转换为毫秒
-            output_path = os.path.join(os.path.dirname(file_paths[0]), f"combo_{uuid.uuid4().hex}.gif")
-            
-            # 使用PIL的save方法创建GIF
-            images[0].save(
-                output_path,
-                format="GIF",
-                append_images=images[1:],
-                save_all=True,
-                duration=duration,
-                loop=0  # 0表示无限循环
-            )
-            
-            QMessageBox.information(self, "成功", f"GIF 合成成功！\n输出文件: {output_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "合成失败", str(e))
+        duration = float(self.duration_combo.currentText()) * 1000  # 转换为毫秒
+        output_path = os.path.join(os.path.dirname(file_paths[0]), f"combo_{uuid.uuid4().hex}.gif")
+        max_size = self.gif_size_combo.currentText()
+        max_size = int(max_size) if max_size.isdigit() else None
+        options = {'duration': duration, 'max_size': max_size}
+        # 相邻的重复帧只写一次，时长累加
+        if self.merge_frames_check.isChecked():
+            options.update(merge_similar=0, hash_index=self.get_hash_index())
+
+        # 在后台线程中逐帧解码和写出，界面保持响应
+        self.gif_progress_bar.setMaximum(len(file_paths))
+        self.gif_progress_bar.setValue(0)
+        self.gif_btn.setEnabled(False)
+        self.gif_worker = GifMergeWorker(file_paths, output_path, options, self)
+        self.gif_worker.progress.connect(self.on_gif_progress)
+        self.gif_worker.merged.connect(self.on_gif_merged)
+        self.gif_worker.failed.connect(self.on_gif_failed)
+        self.gif_worker.start()
+
+    def on_gif_progress(self, done, total):
+        self.gif_progress_bar.setMaximum(max(total, 1))
+        self.gif_progress_bar.setValue(done)
+
+    def gif_done(self):
+        self.gif_worker = None
+        self.gif_progress_bar.reset()
+        self.gif_btn.setEnabled(True)
+
+    def on_gif_merged(self, report):
+        self.gif_done()
+        QMessageBox.information(
+            self, "成功",
+            f"GIF 合成成功！\n输出文件: {report.output_path}\n"
+            f"大小: {report.output_bytes / 1024:.1f} KB，耗时 {report.seconds:.2f} 秒\n"
+            f"共 {report.frame_count} 帧，写出 {report.written_frames} 帧（重复帧已合并）"
+        )
+
+    def on_gif_failed(self, error):
+        self.gif_done()
+        QMessageBox.critical(self, "合成失败", error)
@@ -1,31 +1,172 @@
 #!/usr/bin/env python3
 import os
 import sys
+import threading
 import uuid
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, 
-                             QHBoxLayout, QListWidget, QFileDialog, QLabel, 
-                             QWidget, QMessageBox, QComboBox, QTabWidget, QProgressBar)  # 添加这一行
-from PyQt5.QtCore import Qt
+                             QHBoxLayout, QFileDialog, QLabel, QInputDialog, QCheckBox,
+                             QWidget, QMessageBox, QComboBox, QTabWidget, QProgressBar,
+                             QTableView, QAbstractItemView, QHeaderView)  # 添加这一行
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QItemSelection, QItemSelectionModel
 from PyQt5 import QtGui  # 之前添加的导入
-import PyPDF2 
-from PIL import Image  # 保留PIL作为基础图像处理库
-from utils import allowed_file
+# PyPDF2 和 Pillow 在开始合并时才导入（utils.pdf_utils），加快程序启动
+from utils.file_utils import allowed_file
+from ui.pdf_queue import (FileQueueModel, MetadataProber, apply_probe_results, format_size,
+                          probe_image, probe_pdf)
+from ui.thumbnails import ThumbnailProvider, ThumbnailStrip
+
+
+# 图片合成PDF模式支持的输入格式
+IMAGE_TYPES = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'tif', 'tiff', 'webp'}
+
+
+class PDFMergeWorker(QThread):
+    """后台合并线程，通过信号汇报逐页进度和单个文件的错误
+
+    images 为真时把输入的图片合成为 PDF，否则合并 PDF 文件。
+    """
+    progress = pyqtSignal(int, int, int, int)  # 文件序号, 文件数, 当前页, 该文件页数
+    file_error = pyqtSignal(str, str)
+    merged = pyqtSignal(int)  # 写入的总页数
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, input_files, output_file, images=False, page_ranges=None, compress=False,
+                 parent=None):
+        super().__init__(parent)
+        self.input_files = input_files
+        self.output_file = output_file
+        self.images = images
+        self.page_ranges = page_ranges
+        self.compress = compress
+        self.report = None  # 合并PDF完成后为 DedupReport
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def run(self):
+        try:
+            from utils.journal_utils import JobJournal
+            from utils.pdf_utils import images_to_pdf, merge_pdfs, MergeCancelled
+        except ImportError as e:
+            self.failed.emit(str(e))
+            return
+
+        # 合并PDF时记录进度，程序崩溃后再次合并同一列表时从中断处继续
+        options = {} if self.images else {
+            'page_ranges': self.page_ranges,
+            'compress': self.compress,
+            'report_callback': lambda report: setattr(self, 'report', report),
+            'journal': JobJournal(),
+        }
+        merge = images_to_pdf if self.images else merge_pdfs
+        try:
+            pages = merge(
+                self.input_files, self.output_file,
+                progress_callback=self.progress.emit,
+                error_callback=lambda path, e: self.file_error.emit(path, str(e)),
+                cancel_event=self._cancel_event,
+                **options
+            )
+            self.merged.emit(pages)
+        except MergeCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            if 'journal' in options:
+                options['journal'].close()
+
+
+class PDFSplitWorker(QThread):
+    """后台拆分线程，把一个 PDF 按固定页数拆分为多个文件"""
+    progress = pyqtSignal(int, int, int, int)  # 文件序号, 文件数, 当前页, 该文件页数
+    finished_files = pyqtSignal(list)  # 输出文件路径
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, input_file, output_dir, chunk_size, parent=None):
+        super().__init__(parent)
+        self.input_file = input_file
+        self.output_dir = output_dir
+        self.chunk_size = chunk_size
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def run(self):
+        try:
+            from utils.pdf_utils import split_pdf, MergeCancelled
+        except ImportError as e:
+            self.failed.emit(str(e))
+            return
+
+        try:
+            output_files = split_pdf(self.input_file, self.output_dir, self.chunk_size,
+                                     progress_callback=self.progress.emit,
+                                     cancel_event=self._cancel_event)
+            self.finished_files.emit(output_files)
+        except MergeCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
 
 class PDFMergerPanel(QWidget):
     """PDF合并功能面板"""
     def __init__(self, parent=None):
         super().__init__(parent)
         self.main_window = parent  # 保存对主窗口的引用
+        self.worker = None
+        self.page_offsets = None
         self.initUI()
         
     def initUI(self):
         # 创建主布局
         main_layout = QVBoxLayout()
         
-        # 文件列表区域
-        file_label = QLabel('待合并的PDF文件:')
-        self.file_list = QListWidget()
+        # 模式选择
+        mode_layout = QHBoxLayout()
+        mode_layout.addWidget(QLabel('模式:'))
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(['合并PDF', '图片合成PDF'])
+        self.mode_combo.currentIndexChanged.connect(self.on_mode_changed)
+        mode_layout.addWidget(self.mode_combo)
+        mode_layout.addStretch()
+        self.thumbnail_check = QCheckBox('显示缩略图')
+        self.thumbnail_check.setChecked(True)
+        mode_layout.addWidget(self.thumbnail_check)
+
+        # 文件列表区域：模型保存队列，页数、大小和加密状态由后台线程探测
+        self.file_label = QLabel('待合并的PDF文件:')
+        self.file_model = FileQueueModel(self)
+        self.file_list = QTableView()
+        self.file_list.setModel(self.file_model)
         self.file_list.setAlternatingRowColors(True)
+        self.file_list.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.file_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.file_list.verticalHeader().hide()
+        # 固定行高，视图不需要逐行计算大小
+        self.file_list.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        header = self.file_list.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        for column in range(1, len(FileQueueModel.COLUMNS)):
+            header.setSectionResizeMode(column, QHeaderView.ResizeToContents)
+
+        self.prober = MetadataProber(probe_pdf, self)
+        self.prober.probed.connect(lambda results: apply_probe_results(self.file_model, results))
+
+        # 缩略图条与表格共用模型和选区，只为可见的项生成缩略图（图片降采样解码、PDF 取第一页）
+        self.thumbnails = ThumbnailProvider(parent=self)
+        self.thumbnail_strip = ThumbnailStrip(self.thumbnails)
+        self.thumbnail_strip.setModel(self.file_model)
+        self.thumbnail_strip.setSelectionModel(self.file_list.selectionModel())
+        self.file_list.selectionModel().currentRowChanged.connect(
+            lambda current, previous: self.thumbnail_strip.scrollTo(self.file_model.index(current.row(), 0)))
+        self.thumbnail_strip.clicked.connect(self.file_list.scrollTo)
+        self.thumbnail_check.toggled.connect(self.thumbnail_strip.setVisible)
         
         # 按钮区域
         button_layout = QHBoxLayout()
@@ -44,12 +185,17 @@ class PDFMergerPanel(QWidget):
         
         self.move_down_button = QPushButton('下移')
         self.move_down_button.clicked.connect(self.move_down)
+
+        self.split_button = QPushButton('拆分')
+        self.split_button.setToolTip('把选中的PDF按固定页数拆分为多个文件')
+        self.split_button.clicked.connect(self.split_selected)
         
         button_layout.addWidget(self.add_button)
         button_layout.addWidget(self.remove_button)
         button_layout.addWidget(self.clear_button)
         button_layout.addWidget(self.move_up_button)
         button_layout.addWidget(self.move_down_button)
+        button_layout.addWidget(self.split_button)
         
         # 输出文件设置
         output_layout = QHBoxLayout()
@@ -64,6 +210,10 @@ class PDFMergerPanel(QWidget):
         output_layout.addWidget(output_label)
         output_layout.addWidget(self.output_path)
         output_layout.addWidget(self.select_output_button)
+
+        self.compress_check = QCheckBox('压缩')
+        self.compress_check.setToolTip('把输入中未压缩的流压缩后写出，输出更小但合并稍慢')
+        output_layout.addWidget(self.compress_check)
         
         # 合并按钮和进度条
         self.merge_button = QPushButton('开始合并')
@@ -73,64 +223,106 @@ class PDFMergerPanel(QWidget):
         self.progress_bar = QProgressBar()
         self.progress_bar.setTextVisible(True)
         self.progress_bar.setValue(0)
+
+        self.cancel_button = QPushButton('取消')
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_merge)
+
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.progress_bar)
+        progress_layout.addWidget(self.cancel_button)
         
         # 添加所有组件到主布局
-        main_layout.addWidget(file_label)
+        main_layout.addLayout(mode_layout)
+        main_layout.addWidget(self.file_label)
         main_layout.addWidget(self.file_list)
+        main_layout.addWidget(self.thumbnail_strip)
         main_layout.addLayout(button_layout)
         main_layout.addLayout(output_layout)
         main_layout.addWidget(self.merge_button)
-        main_layout.addWidget(self.progress_bar)
+        main_layout.addLayout(progress_layout)
         
         self.setLayout(main_layout)
         
+    @property
+    def image_mode(self):
+        return self.mode_combo.currentIndex() == 1
+
+    def on_mode_changed(self, index):
+        """切换模式时清空列表，两种模式的输入不能混用"""
+        self.file_label.setText('待合成的图片（每张一页）:' if self.image_mode else '待合并的PDF文件:')
+        self.clear_list()
+        self.file_model.ranges_editable = not self.image_mode
+        self.split_button.setEnabled(not self.image_mode)
+        self.compress_check.setEnabled(not self.image_mode)
+        self.prober.reset(probe_image if self.image_mode else probe_pdf)
+
     def add_files(self):
-        """添加PDF文件到列表"""
+        """添加PDF文件（图片模式下为图片）到列表"""
         options = QFileDialog.Options()
+        if self.image_mode:
+            allowed_types = IMAGE_TYPES
+            file_filter = "图像文件 (" + " ".join(f"*.{ext}" for ext in sorted(IMAGE_TYPES)) + ");;All Files (*)"
+        else:
+            allowed_types = {'pdf'}
+            file_filter = "PDF Files (*.pdf);;All Files (*)"
         files, _ = QFileDialog.getOpenFileNames(
-            self, "选择PDF文件", "", "PDF Files (*.pdf);;All Files (*)", options=options
+            self, "选择文件", "", file_filter, options=options
         )
         
         if files:
-            for file in files:
-                if allowed_file(file, {'pdf'}):
-                    self.file_list.addItem(file)
-                else:
-                    QMessageBox.warning(self, "警告", f"文件 {file} 不是有效的PDF文件")
+            accepted = [file for file in files if allowed_file(file, allowed_types)]
+            rejected = [file for file in files if not allowed_file(file, allowed_types)]
+            if rejected:
+                QMessageBox.warning(self, "警告", "以下文件格式不受支持:\n" + "\n".join(rejected[:20]))
+            self.prober.enqueue(self.file_model.add_paths(accepted))
             # 通过主窗口访问状态栏
             if self.main_window:
                 self.main_window.statusBar().showMessage(f"已添加 {len(files)} 个文件")
     
+    def selected_rows(self):
+        # 在缩略图条中选中时只有第一列被选中，按行号去重
+        return sorted({index.row() for index in self.file_list.selectionModel().selectedIndexes()})
+
+    def select_rows(self, rows):
+        """选中指定的行，连续的行合并为一个选区"""
+        selection = QItemSelection()
+        last_column = self.file_model.columnCount() - 1
+        start = previous = None
+        for row in sorted(rows) + [None]:
+            if start is not None and (row is None or row != previous + 1):
+                selection.select(self.file_model.index(start, 0), self.file_model.index(previous, last_column))
+                start = None
+            if row is not None and start is None:
+                start = row
+            previous = row
+        self.file_list.selectionModel().select(selection, QItemSelectionModel.ClearAndSelect)
+        if rows:
+            self.file_list.scrollTo(self.file_model.index(min(rows), 0))
+
     def remove_selected(self):
         """移除选中的文件"""
-        for item in self.file_list.selectedItems():
-            self.file_list.takeItem(self.file_list.row(item))
+        self.file_model.remove_rows(self.selected_rows())
         # 通过主窗口访问状态栏
         if self.main_window:
             self.main_window.statusBar().showMessage("已移除选中文件")
     
     def clear_list(self):
         """清空文件列表"""
-        self.file_list.clear()
+        self.file_model.clear()
+        self.prober.reset()
+        self.thumbnails.cancel_pending()
         # 通过主窗口访问状态栏
         if self.main_window:
             self.main_window.statusBar().showMessage("文件列表已清空")
     
     def move_up(self):
         """将选中项上移"""
-        current_row = self.file_list.currentRow()
-        if current_row > 0:
-            current_item = self.file_list.takeItem(current_row)
-            self.file_list.insertItem(current_row - 1, current_item)
-            self.file_list.setCurrentRow(current_row - 1)
+        self.select_rows(self.file_model.move_rows(self.selected_rows(), -1))
     
     def move_down(self):
         """将选中项下移"""
-        current_row = self.file_list.currentRow()
-        if current_row < self.file_list.count() - 1:
-            current_item = self.file_list.takeItem(current_row)
-            self.file_list.insertItem(current_row + 1, current_item)
-            self.file_list.setCurrentRow(current_row + 1)
+        self.select_rows(self.file_model.move_rows(self.selected_rows(), 1))
     
     def select_output_file(self):
         """选择输出文件位置"""
@@ -147,8 +339,8 @@ class PDFMergerPanel(QWidget):
             self.output_path.setText(file)
     
     def merge_pdfs(self):
-        if self.file_list.count() == 0:
-            QMessageBox.warning(self, "警告", "没有选择要合并的PDF文件")
+        if self.file_model.rowCount() == 0:
+            QMessageBox.warning(self, "警告", "没有选择要合并的文件")
             return
         
         output_file = self.output_path.text()
@@ -156,7 +348,14 @@ class PDFMergerPanel(QWidget):
             QMessageBox.warning(self, "警告", "请先设置输出文件位置")
             return
         
-        input_files = [self.file_list.item(i).text() for i in range(self.file_list.count())]
+        # 已探测出无法打开的文件直接跳过，不再交给合并线程解析
+        entries = self.file_model.entries
+        skipped = [f"{entry.path}: {entry.error}" for entry in entries if entry.probed and entry.error]
+        entries = [entry for entry in entries if not (entry.probed and entry.error)]
+        if not entries:
+            QMessageBox.warning(self, "警告", "没有可以合并的文件:\n" + "\n".join(skipped[:20]))
+            return
+        input_files = [entry.path for entry in entries]
         
         if os.path.exists(output_file):
             reply = QMessageBox.question(
@@ -166,43 +365,134 @@ class PDFMergerPanel(QWidget):
             if reply != QMessageBox.Yes:
                 return
         
-        try:
-            pdf_writer = PyPDF2.PdfWriter()
-            total_pages = sum(1 for file in input_files for _ in PyPDF2.PdfReader(file).pages)
-            current_page = 0
-            self.progress_bar.setMaximum(total_pages)
-            
-            for file_path in input_files:
-                try:
-                    with open(file_path, 'rb') as file:
-                        pdf_reader = PyPDF2.PdfReader(file)
-                        
-                        # 处理加密PDF（尝试空密码解密）
-                        if pdf_reader.is_encrypted:
-                            try:
-                                pdf_reader.decrypt("")
-                            except PyPDF2.errors.PdfStreamError:
-                                QMessageBox.warning(self, "警告", f"{file_path} 加密无法合并，已跳过")
-                                continue
-                        
-                        # 添加页面并更新进度
-                        for page in pdf_reader.pages:
-                            pdf_writer.add_page(page)
-                            current_page += 1
-                            self.progress_bar.setValue(current_page)
-                    
-                except Exception as e:
-                    QMessageBox.critical(self, "错误", f"处理文件 {file_path} 失败: {str(e)}")
-                    continue
-            
-            # 写入输出文件
-            with open(output_file, 'wb') as f:
-                pdf_writer.write(f)
-            
-            QMessageBox.information(self, "成功", f"合并完成！\n输出路径: {output_file}")
-            self.progress_bar.reset()
-            self.clear_list()
-        
-        except Exception as e:
-            QMessageBox.critical(self, "合并失败", f"错误原因: {str(e)}")
-            self.progress_bar.reset()
+        page_ranges = None
+        if not self.image_mode and any(entry.ranges for entry in entries):
+            page_ranges = [entry.ranges for entry in entries]
+
+        # 所有文件都已探测出页数时按总页数显示进度，否则按文件均分、文件内按页细分
+        page_counts = [self.file_model.selected_page_count(entry) for entry in entries]
+        if all(pages for pages in page_counts):
+            self.page_offsets = [0]
+            for pages in page_counts:
+                self.page_offsets.append(self.page_offsets[-1] + pages)
+            self.progress_bar.setMaximum(self.page_offsets[-1])
+        else:
+            self.page_offsets = None
+            self.progress_bar.setMaximum(len(input_files) * 1000)
+        self.progress_bar.setValue(0)
+        self.merge_errors = skipped
+        self.set_busy(True)
+
+        # 在后台线程中合并，界面保持响应
+        self.worker = PDFMergeWorker(input_files, output_file, self.image_mode, page_ranges,
+                                     self.compress_check.isChecked(), self)
+        self.worker.progress.connect(self.on_merge_progress)
+        self.worker.file_error.connect(self.on_merge_file_error)
+        self.worker.merged.connect(self.on_merge_finished)
+        self.worker.cancelled.connect(self.on_merge_cancelled)
+        self.worker.failed.connect(self.on_merge_failed)
+        self.worker.start()
+
+    def set_busy(self, busy):
+        """合并进行中禁用会修改列表的按钮"""
+        self.mode_combo.setEnabled(not busy)
+        for button in (self.merge_button, self.add_button, self.remove_button, self.clear_button,
+                       self.move_up_button, self.move_down_button, self.select_output_button):
+            button.setEnabled(not busy)
+        self.split_button.setEnabled(not busy and not self.image_mode)
+        self.compress_check.setEnabled(not busy and not self.image_mode)
+        self.file_list.setEditTriggers(QAbstractItemView.NoEditTriggers if busy else
+                                       QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
+        self.cancel_button.setEnabled(busy)
+
+    def cancel_merge(self):
+        """取消正在进行的合并，临时输出文件会被删除"""
+        if self.worker:
+            self.worker.cancel()
+            self.cancel_button.setEnabled(False)
+            if self.main_window:
+                self.main_window.statusBar().showMessage("正在取消合并...")
+
+    def split_selected(self):
+        """把当前选中的PDF按固定页数拆分，输出到用户选择的目录"""
+        rows = self.selected_rows()
+        if len(rows) != 1:
+            QMessageBox.warning(self, "警告", "请选中一个要拆分的PDF文件")
+            return
+        entry = self.file_model.entries[rows[0]]
+        if not entry.probed:
+            QMessageBox.warning(self, "警告", "正在读取文件信息，请稍后再试")
+            return
+        if entry.error:
+            QMessageBox.warning(self, "警告", f"无法拆分: {entry.error}")
+            return
+
+        chunk_size, ok = QInputDialog.getInt(self, "拆分PDF", f"共 {entry.pages} 页，每个文件的页数:",
+                                             1, 1, max(entry.pages, 1))
+        if not ok:
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "选择输出目录", os.path.dirname(entry.path))
+        if not output_dir:
+            return
+
+        # 按页显示进度：第 i 个输出文件从第 i * chunk_size 页开始
+        chunk_count = (entry.pages + chunk_size - 1) // chunk_size
+        self.page_offsets = [i * chunk_size for i in range(chunk_count)]
+        self.progress_bar.setMaximum(entry.pages)
+        self.progress_bar.setValue(0)
+        self.set_busy(True)
+
+        self.worker = PDFSplitWorker(entry.path, output_dir, chunk_size, self)
+        self.worker.progress.connect(self.on_merge_progress)
+        self.worker.finished_files.connect(self.on_split_finished)
+        self.worker.cancelled.connect(self.on_merge_cancelled)
+        self.worker.failed.connect(self.on_merge_failed)
+        self.worker.start()
+
+    def on_split_finished(self, output_files):
+        output_dir = self.worker.output_dir
+        self.merge_done()
+        QMessageBox.information(self, "成功", f"拆分完成！共 {len(output_files)} 个文件\n输出目录: {output_dir}")
+
+    def on_merge_progress(self, file_index, file_count, page_number, page_count):
+        if self.page_offsets:
+            self.progress_bar.setValue(self.page_offsets[file_index] + page_number)
+        else:
+            self.progress_bar.setValue(file_index * 1000 + page_number * 1000 // page_count)
+        if self.main_window:
+            self.main_window.statusBar().showMessage(
+                f"正在处理第 {file_index + 1}/{file_count} 个文件，第 {page_number}/{page_count} 页"
+            )
+
+    def on_merge_file_error(self, file_path, error):
+        self.merge_errors.append(f"{file_path}: {error}")
+
+    def on_merge_finished(self, pages):
+        output_file = self.worker.output_file
+        report = self.worker.report
+        self.merge_done()
+        message = f"合并完成！共 {pages} 页\n输出路径: {output_file}"
+        if report and report.duplicates:
+            message += f"\n去重: 跳过 {report.duplicates} 个重复对象，节省 {format_size(report.duplicate_bytes)}"
+        if report and report.compressed_bytes:
+            message += f"\n压缩: 节省 {format_size(report.compressed_bytes)}"
+        if self.merge_errors:
+            message += "\n\n以下文件处理失败，已跳过:\n" + "\n".join(self.merge_errors)
+            QMessageBox.warning(self, "部分失败", message)
+        else:
+            QMessageBox.information(self, "成功", message)
+        self.clear_list()
+
+    def on_merge_cancelled(self):
+        self.merge_done()
+        if self.main_window:
+            self.main_window.statusBar().showMessage("合并已取消")
+
+    def on_merge_failed(self, error):
+        self.merge_done()
+        QMessageBox.critical(self, "合并失败", f"错误原因: {error}")
+
+    def merge_done(self):
+        self.worker = None
+        self.progress_bar.reset()
+        self.set_busy(False)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+import os
+import threading
+import time
+from collections import deque
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QThread, pyqtSignal
+
+from ui.thumbnails import PathRole
+
+
+class QueueEntry:
+    """队列中的一个文件；pages/size/encrypted/error 由后台探测线程填充
+
+    ranges 为用户输入的页码范围（如 "1-3,5"），为空表示全部页面。
+    """
+    __slots__ = ('path', 'ranges', 'pages', 'size', 'encrypted', 'error', 'probed')
+
+    def __init__(self, path):
+        self.path = path
+        self.ranges = ''
+        self.pages = None
+        self.size = None
+        self.encrypted = False
+        self.error = None
+        self.probed = False
+
+
+def format_size(size):
+    if size is None:
+        return ''
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class FileQueueModel(QAbstractTableModel):
+    """合并队列的数据模型
+
+    数据保存在 Python 列表中，视图只请求可见行，几万个文件也不会卡顿。
+    批量删除和移动都是对列表的一次遍历，完成后整体刷新视图。
+    """
+    COLUMNS = ('文件', '页码范围', '页数', '大小', '状态')
+    RANGES_COLUMN = 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []
+        # 图片合成PDF时每个文件只有一页，页码范围不可编辑
+        self.ranges_editable = True
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        column = index.column()
+        if role == PathRole:
+            return entry.path
+        if role == Qt.EditRole and column == self.RANGES_COLUMN:
+            return entry.ranges
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return entry.path
+            if column == self.RANGES_COLUMN:
+                return entry.ranges or ('全部' if self.ranges_editable else '')
+            if column == 2:
+                return '' if entry.pages is None else str(entry.pages)
+            if column == 3:
+                return format_size(entry.size)
+            if not entry.probed:
+                return '读取中…'
+            if entry.error:
+                return '错误'
+            return '已加密' if entry.encrypted else '正常'
+        if role == Qt.ToolTipRole:
+            if column == self.RANGES_COLUMN and self.ranges_editable:
+                return '双击编辑页码范围，如 1-3,5,8-（留空表示全部页面）'
+            return entry.error or entry.path
+        if role == Qt.TextAlignmentRole and column in (2, 3):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.RANGES_COLUMN and self.ranges_editable:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        """编辑页码范围；页数已知时检查范围是否有效，无效的输入被拒绝"""
+        if role != Qt.EditRole or index.column() != self.RANGES_COLUMN:
+            return False
+        entry = self.entries[index.row()]
+        value = value.strip()
+        if value and entry.pages:
+            from utils.pdf_utils import parse_page_ranges
+            try:
+                parse_page_ranges(value, entry.pages)
+            except ValueError:
+                return False
+        entry.ranges = value
+        self.dataChanged.emit(index, index)
+        return True
+
+    def selected_page_count(self, entry):
+        """条目将要合并的页数，页数未知或范围无效时返回 None"""
+        if not entry.pages or not entry.ranges:
+            return entry.pages
+        from utils.pdf_utils import parse_page_ranges
+        try:
+            return len(parse_page_ranges(entry.ranges, entry.pages))
+        except ValueError:
+            return None
+
+    def paths(self):
+        return [entry.path for entry in self.entries]
+
+    def add_paths(self, paths):
+        """在末尾追加文件，返回新建的条目"""
+        entries = [QueueEntry(path) for path in paths]
+        if entries:
+            first = len(self.entries)
+            self.beginInsertRows(QModelIndex(), first, first + len(entries) - 1)
+            self.entries.extend(entries)
+            self.endInsertRows()
+        return entries
+
+    def remove_rows(self, rows):
+        """删除指定行，一次遍历完成"""
+        rows = set(rows)
+        if not rows:
+            return
+        self.beginResetModel()
+        self.entries = [entry for row, entry in enumerate(self.entries) if row not in rows]
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self.entries = []
+        self.endResetModel()
+
+    def move_rows(self, rows, step):
+        """把选中的行整体上移（step=-1）或下移（step=1）一位，返回移动后的行号
+
+        已经到顶（底）的行保持不动，并挡住紧挨着它的选中行，与逐项移动的结果一致。
+        """
+        rows = sorted(set(rows), reverse=step > 0)
+        if not rows:
+            return []
+        wall = -1 if step < 0 else len(self.entries)
+        new_rows = []
+        self.layoutAboutToBeChanged.emit()
+        for row in rows:
+            target = row + step
+            if target == wall:
+                wall = row
+                new_rows.append(row)
+                continue
+            self.entries[row], self.entries[target] = self.entries[target], self.entries[row]
+            new_rows.append(target)
+        self.layoutChanged.emit()
+        return sorted(new_rows)
+
+    def entries_probed(self):
+        """探测结果写入条目后刷新信息列"""
+        if self.entries:
+            self.dataChanged.emit(self.index(0, 2), self.index(len(self.entries) - 1, len(self.COLUMNS) - 1))
+
+
+class MetadataProber(QThread):
+    """后台读取队列中文件的页数、大小和加密状态
+
+    结果按批次通过 probed 信号返回，避免几万个文件产生几万次界面刷新。
+    队列为空时线程退出，再次添加文件时自动重新启动。
+    """
+    probed = pyqtSignal(list)  # [(QueueEntry, PdfInfo)]
+
+    BATCH_INTERVAL = 0.2
+
+    def __init__(self, probe_func=None, parent=None):
+        super().__init__(parent)
+        self.probe_func = probe_func
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._active = False
+        self._results = {}
+
+    def enqueue(self, entries):
+        with self._lock:
+            self._queue.extend(entries)
+            if self._active:
+                return
+            self._active = True
+        # 上一轮刚结束时等它完全退出再启动
+        self.wait()
+        self.start()
+
+    def reset(self, probe_func=None):
+        """丢弃尚未探测的条目和已缓存的结果，可同时更换探测函数"""
+        with self._lock:
+            self._queue.clear()
+            self._results = {}
+            if probe_func is not None:
+                self.probe_func = probe_func
+
+    def run(self):
+        batch = []
+        last_emit = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._active = False
+                    break
+                entry = self._queue.popleft()
+                probe_func = self.probe_func
+                results = self._results
+            # 同一个文件重复加入时只探测一次
+            info = results.get(entry.path)
+            if info is None:
+                info = probe_func(entry.path)
+                results[entry.path] = info
+            batch.append((entry, info))
+            if time.monotonic() - last_emit >= self.BATCH_INTERVAL:
+                self.probed.emit(batch)
+                batch = []
+                last_emit = time.monotonic()
+        if batch:
+            self.probed.emit(batch)
+
+
+def apply_probe_results(model, results):
+    """在界面线程中把探测结果写入条目"""
+    for entry, info in results:
+        entry.pages = info.pages
+        entry.size = info.size
+        entry.encrypted = info.encrypted
+        entry.error = info.error
+        entry.probed = True
+    model.entries_probed()
+
+
+def probe_pdf(path):
+    from utils.pdf_utils import probe_pdf as probe
+    return probe(path)
+
+
+def probe_image(path):
+    """图片每张一页，只读取文件大小"""
+    from utils.pdf_utils import PdfInfo
+    try:
+        return PdfInfo(1, os.path.getsize(path), False, None)
+    except OSError as e:
+        return PdfInfo(None, None, False, str(e))
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QCoreApplication, QObject, QRect, QSize, QThread, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtWidgets import QAbstractItemView, QListView, QStyle, QStyledItemDelegate
+
+# 模型通过该角色提供文件路径，缩略图视图据此请求缩略图
+PathRole = Qt.UserRole + 1
+
+# 与 utils.thumbnail_utils.THUMBNAIL_SIZE 一致；这里不导入 utils，避免启动时加载 Pillow
+THUMBNAIL_SIZE = 128
+
+
+class _ThumbnailWorker(QThread):
+    """从 ThumbnailProvider 的请求队列中取路径生成缩略图，队列为空时退出"""
+    rendered = pyqtSignal(list)  # [(路径, QImage 或 None)]
+
+    BATCH_INTERVAL = 0.05
+
+    def __init__(self, provider):
+        super().__init__(provider)
+        self.provider = provider
+        self.active = False
+
+    def run(self):
+        from utils.thumbnail_utils import ThumbnailCache
+
+        provider = self.provider
+        batch = []
+        last_emit = time.monotonic()
+        while True:
+            path = provider._next_request(self)
+            if path is None:
+                break
+            if provider.cache is None:
+                with provider._lock:
+                    if provider.cache is None:
+                        provider.cache = ThumbnailCache(size=provider.size)
+            provider._start_prune()
+            try:
+                image = QImage.fromData(provider.cache.get(path), 'PNG')
+            except Exception:
+                image = QImage()
+            batch.append((path, None if image.isNull() else image))
+            if time.monotonic() - last_emit >= self.BATCH_INTERVAL:
+                self.rendered.emit(batch)
+                batch = []
+                last_emit = time.monotonic()
+        if batch:
+            self.rendered.emit(batch)
+
+
+class ThumbnailProvider(QObject):
+    """在后台线程中生成缩略图，并在内存中保留最近使用的 QPixmap
+
+    视图绘制时调用 pixmap(path)：已有缩略图直接返回，否则加入请求队列并返回 None，
+    生成完成后发出 ready 信号，视图重绘即可。请求按后进先出处理，快速滚动时优先生成
+    当前可见的项；队列超过 MAX_PENDING 时丢弃最早的请求（滚回来时会重新请求）。
+    缩略图同时保存在磁盘缓存中（utils.thumbnail_utils.ThumbnailCache），按路径和修改时间失效，
+    第一次使用磁盘缓存时在后台线程中清理一次，把缓存控制在大小上限以内。
+    无法生成的路径最多记录 MAX_FAILED 个，清空列表或 invalidate() 后会重新尝试。
+    """
+    ready = pyqtSignal()
+
+    MAX_PIXMAPS = 512
+    MAX_PENDING = 256
+    MAX_FAILED = 1024
+
+    def __init__(self, workers=2, size=THUMBNAIL_SIZE, cache=None, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.cache = cache
+        self._pixmaps = OrderedDict()
+        self._failed = OrderedDict()
+        self._pending = OrderedDict()
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._prune_thread = None
+        self._workers = [_ThumbnailWorker(self) for _ in range(workers)]
+        for worker in self._workers:
+            worker.rendered.connect(self._on_rendered)
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
+    def pixmap(self, path):
+        """返回缓存的缩略图；还没有时请求生成并返回 None，无法生成时也返回 None"""
+        pixmap = self._pixmaps.get(path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(path)
+            return pixmap
+        if path not in self._failed:
+            self._request(path)
+        return None
+
+    def _request(self, path):
+        with self._lock:
+            if path in self._inflight:
+                return
+            self._pending[path] = None
+            self._pending.move_to_end(path)
+            while len(self._pending) > self.MAX_PENDING:
+                self._pending.popitem(last=False)
+            idle = [worker for worker in self._workers if not worker.active][:len(self._pending)]
+            for worker in idle:
+                worker.active = True
+        for worker in idle:
+            # 上一轮刚结束时等它完全退出再启动
+            worker.wait()
+            worker.start(QThread.LowPriority)
+
+    def _next_request(self, worker):
+        """在工作线程中调用，取出最近的请求；队列为空时返回 None，线程随后退出"""
+        with self._lock:
+            if not self._pending:
+                worker.active = False
+                return None
+            path, _ = self._pending.popitem(last=True)
+            self._inflight.add(path)
+            return path
+
+    def _on_rendered(self, results):
+        for path, image in results:
+            with self._lock:
+                self._inflight.discard(path)
+            if image is None:
+                self._failed[path] = None
+                continue
+            self._pixmaps[path] = QPixmap.fromImage(image)
+            self._pixmaps.move_to_end(path)
+        while len(self._pixmaps) > self.MAX_PIXMAPS:
+            self._pixmaps.popitem(last=False)
+        # 超出上限时忘掉最早的失败记录，这些路径再次显示时会重新尝试
+        while len(self._failed) > self.MAX_FAILED:
+            self._failed.popitem(last=False)
+        self.ready.emit()
+
+    def _start_prune(self):
+        """在工作线程中调用：第一次使用磁盘缓存时在单独的线程中清理，不阻塞缩略图生成"""
+        with self._lock:
+            if self._prune_thread is not None:
+                return
+            self._prune_thread = threading.Thread(target=self._prune, name='thumbnail-prune', daemon=True)
+        self._prune_thread.start()
+
+    def _prune(self):
+        try:
+            self.cache.prune()
+        except Exception:
+            # 清理失败不影响缩略图，下次启动时再试
+            pass
+
+    def cancel_pending(self):
+        """丢弃尚未开始的请求（如清空列表时），同时忘掉无法生成的路径，重新添加时再试"""
+        with self._lock:
+            self._pending.clear()
+        self._failed.clear()
+
+    def invalidate(self, path=None):
+        """丢弃内存中的缩略图，path 为空时全部丢弃；磁盘缓存按修改时间自动失效"""
+        if path is None:
+            self._pixmaps.clear()
+            self._failed.clear()
+        else:
+            self._pixmaps.pop(path, None)
+            self._failed.pop(path, None)
+
+    def shutdown(self):
+        self.cancel_pending()
+        for worker in self._workers:
+            worker.wait()
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """绘制缩略图和文件名，缩略图未生成时只画占位框"""
+    TEXT_HEIGHT = 20
+    MARGIN = 6
+
+    def __init__(self, provider, parent=None):
+        super().__init__(parent)
+        self.provider = provider
+
+    def sizeHint(self, option, index):
+        size = self.provider.size + 2 * self.MARGIN
+        return QSize(size, size + self.TEXT_HEIGHT)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(rect, option.palette.highlight())
+        path = index.data(PathRole)
+        size = self.provider.size
+        area = QRect(rect.x() + self.MARGIN, rect.y() + self.MARGIN, size, size)
+        pixmap = self.provider.pixmap(path) if path else None
+        if pixmap is not None:
+            x = area.x() + (size - pixmap.width()) // 2
+            y = area.y() + (size - pixmap.height()) // 2
+            painter.drawPixmap(x, y, pixmap)
+        else:
+            painter.setPen(option.palette.mid().color())
+            painter.drawRect(area.adjusted(size // 4, size // 4, -size // 4, -size // 4))
+        text_rect = QRect(rect.x() + 2, area.bottom() + 2, rect.width() - 4, self.TEXT_HEIGHT)
+        name = option.fontMetrics.elidedText(os.path.basename(path or ''), Qt.ElideMiddle, text_rect.width())
+        painter.setPen(option.palette.highlightedText().color() if option.state & QStyle.State_Selected
+                       else option.palette.text().color())
+        painter.drawText(text_rect, Qt.AlignHCenter | Qt.AlignVCenter, name)
+        painter.restore()
+
+
+class ThumbnailStrip(QListView):
+    """横向排列的缩略图条，只为可见的项请求缩略图，上万项也能流畅滚动"""
+
+    def __init__(self, provider, parent=None):
+        super().__init__(parent)
+        self.provider = provider
+        self.setItemDelegate(ThumbnailDelegate(provider, self))
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(False)
+        # 所有项大小相同，视图不需要逐项计算布局
+        self.setUniformItemSizes(True)
+        self.setHorizontalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        margin = ThumbnailDelegate.MARGIN
+        self.setFixedHeight(provider.size + 2 * margin + ThumbnailDelegate.TEXT_HEIGHT
+                            + self.horizontalScrollBar().sizeHint().height() + 2 * self.frameWidth() + 4)
+        provider.ready.connect(self.viewport().update)
@@ -1,4 +1,28 @@
-from .file_utils import allowed_file, ALLOWED_EXTENSIONS
-from .image_utils import convert_image
+import importlib
 
-__all__ = ['allowed_file', 'ALLOWED_EXTENSIONS', 'convert_image']
\ No newline at end of file
+# 公开名称所在的子模块；首次访问时才导入，只用到 PDF 合并时不会加载 Pillow
+_EXPORTS = {
+    'allowed_file': 'file_utils',
+    'ALLOWED_EXTENSIONS': 'file_utils',
+    'expand_inputs': 'file_utils',
+    'convert_image': 'image_utils',
+    'merge_gif': 'image_utils',
+    'BatchConverter': 'batch_utils',
+    'ConvertResult': 'batch_utils',
+    'convert_images': 'batch_utils',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,283 @@
+import os
+import struct
+import zlib
+from io import BytesIO
+
+from PIL import Image, ImageChops
+
+from .gif_utils import DeltaFrameWriter, GifStreamWriter, palette_from_tiles, palette_tile
+from .io_utils import open_input
+from .profiling import stage
+
+# 输入为动画时按动画输出的格式（png 输出为 APNG）
+ANIMATED_FORMATS = {'gif', 'webp', 'png'}
+
+# 输出 GIF 时统计全局调色板抽样的帧数
+PALETTE_SAMPLE = 32
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def is_animated(img):
+    return getattr(img, 'is_animated', False) and getattr(img, 'n_frames', 1) > 1
+
+
+def iter_frames(img, size=None):
+    """逐帧解码动画，产出 (RGBA 帧, 时长毫秒)
+
+    Pillow 在 seek 时按每帧的处置方式和混合方式把帧合成到画布上，产出的是完整的画面，
+    处置信息已体现在画面中；写出时各编码器再按相邻帧的差异决定写出的区域。
+    内存中只保留当前帧。size 不为空时把每帧缩放到该大小。
+    """
+    index = 0
+    while True:
+        try:
+            img.seek(index)
+        except EOFError:
+            return
+        frame = img.convert('RGBA')
+        if size and frame.size != size:
+            frame = frame.resize(size, Image.LANCZOS)
+        # WebP 的时长在解码后才写入 info
+        yield frame, int(img.info.get('duration') or 0)
+        index += 1
+
+
+def sample_palette(img, sample=PALETTE_SAMPLE):
+    """均匀抽取 sample 帧统计全局调色板，按帧号顺序 seek，只需向前解码一遍
+
+    Pillow 的 APNG 回到第一帧后无法再向后 seek，调用后不要继续使用 img。
+    """
+    count = img.n_frames
+    sample = min(sample, count)
+    indices = sorted({int(i * count / sample) for i in range(sample)})
+    tiles = []
+    for index in indices:
+        img.seek(index)
+        tiles.append(palette_tile(img.convert('RGBA')))
+    return palette_from_tiles(tiles)
+
+
+def _delay(duration):
+    """毫秒时长转为 APNG 的 (分子, 分母)，两者都不超过 16 位"""
+    numerator, denominator = int(duration), 1000
+    while numerator > 0xFFFF and denominator > 1:
+        numerator, denominator = numerator // 10, denominator // 10
+    return min(numerator, 0xFFFF), denominator
+
+
+def _changed_box(frame, previous):
+    """frame 与 previous 不同的包围盒，完全相同时返回 None"""
+    return ImageChops.difference(frame, previous).getbbox(alpha_only=False)
+
+
+class ApngStreamWriter:
+    """逐帧写出的 APNG 编码器
+
+    Pillow 保存 APNG 时先把所有帧放进内存，这里每帧压缩后立即写入文件。
+    与上一帧相同的帧合并时长，其余帧只写与上一帧不同的矩形区域（blend_op=SOURCE 直接替换）。
+    帧数要写在文件开头的 acTL 中，写完后回填，fp 需要支持 seek。
+    为了合并重复帧，帧会延迟一帧写出，内存中最多保留两帧。
+    """
+
+    def __init__(self, fp, size, loop=0):
+        self.fp = fp
+        self.size = size
+        self.frame_count = 0
+        self._sequence = 0
+        self._previous = None
+        self._pending = None
+        width, height = size
+        fp.write(PNG_SIGNATURE)
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+        self._actl_offset = fp.tell()
+        self._loop = loop
+        self._chunk(b'acTL', struct.pack('>II', 0, loop))
+
+    def _chunk(self, chunk_type, data):
+        self.fp.write(struct.pack('>I', len(data)) + chunk_type + data
+                      + struct.pack('>I', zlib.crc32(chunk_type + data)))
+
+    def add_frame(self, frame, duration=100):
+        """写入一帧与画布同样大小的 RGBA 图像，duration 单位为毫秒"""
+        if self._previous is None:
+            box = (0, 0) + self.size
+        else:
+            box = _changed_box(frame, self._previous)
+            if box is None:
+                self._pending['duration'] += duration
+                return
+        if self._pending is not None:
+            self._flush()
+        self._pending = {'image': frame.crop(box), 'offset': box[:2], 'duration': duration}
+        self._previous = frame
+
+    def _flush(self):
+        pending = self._pending
+        image = pending['image']
+        buf = BytesIO()
+        with stage('encode') as s:
+            image.save(buf, format='PNG')
+            data = buf.getvalue()
+            idat = []
+            pos = len(PNG_SIGNATURE)
+            while pos < len(data):
+                length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+                if chunk_type == b'IDAT':
+                    idat.append(data[pos + 8:pos + 8 + length])
+                pos += 12 + length
+            idat = b''.join(idat)
+            numerator, denominator = _delay(pending['duration'])
+            # dispose_op=NONE，blend_op=SOURCE
+            self._chunk(b'fcTL', struct.pack('>IIIIIHHBB', self._sequence, image.width, image.height,
+                                              pending['offset'][0], pending['offset'][1],
+                                              numerator, denominator, 0, 0))
+            self._sequence += 1
+            if self.frame_count == 0:
+                # 第一帧同时作为不支持 APNG 的查看器显示的静态图像
+                self._chunk(b'IDAT', idat)
+            else:
+                self._chunk(b'fdAT', struct.pack('>I', self._sequence) + idat)
+                self._sequence += 1
+            s.bytes = len(idat)
+        self.frame_count += 1
+
+    def close(self):
+        if self._pending is not None:
+            self._flush()
+            self._pending = None
+        self._chunk(b'IEND', b'')
+        end = self.fp.tell()
+        self.fp.seek(self._actl_offset)
+        self._chunk(b'acTL', struct.pack('>II', self.frame_count, self._loop))
+        self.fp.seek(end)
+
+
+class WebPStreamWriter:
+    """逐帧写出的动画 WebP 编码器
+
+    Pillow 的 save_all 由 libwebp 在内存中组装整个动画；这里每帧用 Pillow 编码为静态 WebP，
+    取出其中的 ALPH/VP8/VP8L 数据块作为 ANMF 帧立即写入文件。与 ApngStreamWriter 相同，
+    重复帧合并时长，其余帧只写变化的区域（WebP 要求偏移为偶数），RIFF 头中的大小写完后回填。
+    """
+
+    def __init__(self, fp, size, loop=0, quality=80, lossless=False):
+        self.fp = fp
+        self.size = size
+        self.options = {'quality': quality, 'lossless': lossless}
+        self.frame_count = 0
+        self._previous = None
+        self._pending = None
+        self._alpha = False
+        self._start = fp.tell()
+        fp.write(b'RIFF\0\0\0\0WEBP')
+        self._vp8x_offset = fp.tell()
+        self._chunk(b'VP8X', self._vp8x())
+        # 背景色透明；loop=0 表示无限循环
+        self._chunk(b'ANIM', struct.pack('<IH', 0, loop))
+
+    def _vp8x(self):
+        width, height = self.size
+        flags = 0x02 | (0x10 if self._alpha else 0)
+        return struct.pack('<I', flags) + (width - 1).to_bytes(3, 'little') + (height - 1).to_bytes(3, 'little')
+
+    def _chunk(self, chunk_type, data):
+        self.fp.write(chunk_type + struct.pack('<I', len(data)) + data + (b'\0' if len(data) & 1 else b''))
+
+    def add_frame(self, frame, duration=100):
+        """写入一帧与画布同样大小的 RGBA 图像，duration 单位为毫秒"""
+        if self._previous is None:
+            box = (0, 0) + self.size
+        else:
+            box = _changed_box(frame, self._previous)
+            if box is None:
+                self._pending['duration'] += duration
+                return
+            box = (box[0] & ~1, box[1] & ~1) + box[2:]
+        if self._pending is not None:
+            self._flush()
+        self._pending = {'image': frame.crop(box), 'offset': box[:2], 'duration': duration}
+        self._previous = frame
+
+    def _flush(self):
+        pending = self._pending
+        image = pending['image']
+        has_alpha = image.getchannel('A').getextrema()[0] < 255
+        self._alpha = self._alpha or has_alpha
+        buf = BytesIO()
+        with stage('encode') as s:
+            (image if has_alpha else image.convert('RGB')).save(buf, format='WEBP', **self.options)
+            data = buf.getvalue()
+            frame_data = []
+            pos = 12
+            while pos < len(data):
+                chunk_type, length = struct.unpack('<4sI', data[pos:pos + 8])
+                if chunk_type in (b'ALPH', b'VP8 ', b'VP8L'):
+                    frame_data.append(data[pos:pos + 8 + length + (length & 1)])
+                pos += 8 + length + (length & 1)
+            x, y = pending['offset']
+            header = b''.join(value.to_bytes(3, 'little') for value in
+                              (x // 2, y // 2, image.width - 1, image.height - 1,
+                               min(int(pending['duration']), 0xFFFFFF)))
+            # 标志位：不与上一帧混合（整块替换），显示后不处置
+            self._chunk(b'ANMF', header + b'\x02' + b''.join(frame_data))
+            s.bytes = len(data)
+        self.frame_count += 1
+
+    def close(self):
+        if self._pending is not None:
+            self._flush()
+            self._pending = None
+        end = self.fp.tell()
+        self.fp.seek(self._start + 4)
+        self.fp.write(struct.pack('<I', end - self._start - 8))
+        self.fp.seek(self._vp8x_offset)
+        self._chunk(b'VP8X', self._vp8x())
+        self.fp.seek(end)
+
+
+def convert_animation(img, input_path, output_path, format, max_size=None):
+    """把从 input_path 打开的动画 img 逐帧转换为 GIF、动画 WebP 或 APNG，返回输出路径
+
+    帧按需解码、立即编码写出，内存只与单帧大小有关；max_size 限制画布最长边。
+    保留每帧的时长和循环次数；输出 GIF 时先另外打开一次输入，抽样统计全局调色板。
+    """
+    from .image_utils import fit_size
+
+    size = fit_size(img.size, max_size) if max_size else img.size
+    # GIF 没有 NETSCAPE 扩展时只播放一次；APNG/WebP 中 0 表示无限循环，1 表示播放一次
+    loop = img.info.get('loop')
+    temp_path = output_path + '.part'
+    try:
+        with open(temp_path, 'wb') as fp:
+            if format == 'gif':
+                with stage('palette', input_path), open_input(input_path) as source, \
+                        Image.open(source) as sample:
+                    palette_image = sample_palette(sample)
+                writer = GifStreamWriter(fp, size, loop=loop, global_palette=palette_image.getpalette())
+                frame_writer = DeltaFrameWriter(writer, palette_image)
+            elif format == 'webp':
+                writer = frame_writer = WebPStreamWriter(fp, size, loop=1 if loop is None else loop)
+            else:
+                writer = frame_writer = ApngStreamWriter(fp, size, loop=1 if loop is None else loop)
+
+            frames = iter_frames(img, size)
+            while True:
+                with stage('decode', input_path):
+                    item = next(frames, None)
+                if item is None:
+                    break
+                frame, duration = item
+                if format == 'gif':
+                    frame_writer.add(frame, duration, input_path)
+                else:
+                    frame_writer.add_frame(frame, duration)
+            if format == 'gif':
+                frame_writer.close()
+            writer.close()
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return output_path
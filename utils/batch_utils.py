@@ -0,0 +1,260 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from . import profiling
+from .image_utils import _convert_image, output_path_for_format
+from .vector_utils import is_svg
+
+# 单个文件的转换结果，cached 表示结果来自转换缓存，
+# stages 为启用计时时工作进程中记录的 profiling.StageRecord，
+# resumed 表示按作业日志跳过了上次已完成的文件，duplicate_of 为按感知哈希跳过的重复文件所重复的输入，
+# search 为按目标大小或画质编码时的搜索结果（encode_utils.SearchResult，不含数据），met 为假时未达到目标
+ConvertResult = namedtuple('ConvertResult', ['input_path', 'output_path', 'success', 'error', 'cached', 'stages',
+                                             'resumed', 'duplicate_of', 'search'],
+                           defaults=(False, (), False, None, None))
+
+
+def missed_target(result):
+    """按目标大小或画质编码时没有达到目标（仍写出了最接近的结果）"""
+    return result.search is not None and not result.search.met
+
+
+def output_path_for(input_path, format, output_dir=None):
+    """根据输入文件和目标格式生成输出路径（默认与源文件同目录）"""
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    if output_dir is None:
+        output_dir = os.path.dirname(input_path)
+    return os.path.join(output_dir, f"{base_name}.{format}")
+
+
+def _convert_job(input_path, output_path, format, options=None, profile=False):
+    """在工作进程中执行的转换任务，异常转换为结果返回
+
+    profile 为真时收集各阶段计时，随结果带回主进程。
+    """
+    collector = profiling.StageCollector()
+    if profile:
+        profiling.add_hook(collector)
+    report = []
+    try:
+        output_path = _convert_image(input_path, output_path, format, search_report=report, **(options or {}))
+        return ConvertResult(input_path, output_path, True, None, stages=tuple(collector.records),
+                             search=report[0] if report else None)
+    except Exception as e:
+        return ConvertResult(input_path, output_path, False, str(e), stages=tuple(collector.records))
+    finally:
+        if profile:
+            profiling.remove_hook(collector)
+
+
+def _convert_jobs(jobs, profile=False):
+    """在工作进程中依次执行一组任务，返回 ConvertResult 列表"""
+    return [_convert_job(*job, profile=profile) for job in jobs]
+
+
+def group_jobs(jobs):
+    """把连续的、输入为同一个 SVG 的任务（如 --sizes 的多个尺寸）合为一组，其它任务各自一组
+
+    同一组在一个工作进程中转换，SVG 只读取一次（流水线中也只预读一次），不必在每个进程中分别加载。
+    """
+    group = []
+    for job in jobs:
+        if group and not (job[0] == group[0][0] and is_svg(job[0])):
+            yield group
+            group = []
+        group.append(job)
+    if group:
+        yield group
+
+
+def _job_error(error):
+    """任务在进程池中抛出的异常（不是转换本身的错误）转换为错误信息"""
+    if isinstance(error, BrokenProcessPool):
+        return "转换进程异常退出（可能是内存不足或解码器崩溃）"
+    return str(error) or type(error).__name__
+
+
+class _ProcessPool:
+    """进程池，工作进程异常退出使进程池损坏后，下一次提交任务时换新的进程池
+
+    损坏时已提交的任务都会以 BrokenProcessPool 结束，由调用方逐个报告失败，后面的任务照常转换。
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    def submit(self, fn, *args, **kwargs):
+        try:
+            return self.executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            self.executor.shutdown(wait=False)
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.executor.submit(fn, *args, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown()
+
+
+class BatchConverter:
+    """批量图片转换引擎
+
+    将 convert_image 任务分发到进程池，同时在途的任务数有上限，
+    避免一次性提交上万个任务占满内存。可在任意线程调用 cancel() 取消。
+    传入 cache（cache_utils.ConversionCache）时，缓存查询和写入在当前进程完成，
+    命中的文件不会提交到进程池。
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, cache=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # 每个进程保留两个任务排队，保证进程不空闲
+        self.max_pending = max_pending or self.max_workers * 2
+        self.cache = cache
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        """请求取消：不再提交新任务，已提交但未开始的任务会被丢弃"""
+        self._cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def iter_results(self, jobs):
+        """执行 (input_path, output_path, format[, options]) 任务，按完成顺序逐个产出 ConvertResult
+
+        options 为传给 _convert_image 的关键字参数字典（如 max_size），同时参与缓存键。
+        """
+        self._cancel_event.clear()
+        groups = group_jobs(jobs)
+        # 进程池中的钩子不会被调用，启用计时时由工作进程收集记录后在这里分发
+        profile = profiling.enabled()
+        with _ProcessPool(self.max_workers) as executor:
+            pending = {}  # future -> [(任务, 缓存键或 None)]
+            exhausted = False
+            while True:
+                # 补充任务直到达到在途上限
+                while not exhausted and not self.cancelled and len(pending) < self.max_pending:
+                    try:
+                        group = next(groups)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    todo = []
+                    for job in group:
+                        cached, key = self._check_cache(job)
+                        if cached is not None:
+                            yield cached
+                        else:
+                            todo.append((job, key))
+                    if todo:
+                        future = executor.submit(_convert_jobs, [job for job, _ in todo], profile=profile)
+                        pending[future] = todo
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    todo = pending.pop(future)
+                    if future.cancelled():
+                        continue
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        # 工作进程崩溃时在途的任务都以失败结束，之后的任务提交到新的进程池
+                        for job, _ in todo:
+                            yield ConvertResult(job[0], job[1], False, _job_error(e))
+                        continue
+                    for (job, key), result in zip(todo, results):
+                        for record in result.stages:
+                            profiling.emit(record)
+                        # 未达到目标的结果不缓存，下次仍然报告
+                        if key and result.success and not missed_target(result):
+                            self.cache.store(key, result.output_path)
+                        yield result
+
+                if self.cancelled:
+                    # 丢弃尚未开始的任务，正在执行的任务照常收尾
+                    for future in list(pending):
+                        if future.cancel():
+                            del pending[future]
+
+    def _check_cache(self, job):
+        """查询缓存，返回 (命中时的 ConvertResult 或 None, 缓存键或 None)"""
+        if self.cache is None:
+            return None, None
+        input_path, output_path, format = job[:3]
+        options = job[3] if len(job) > 3 else None
+        output_path = output_path_for_format(output_path, format)
+        try:
+            key = self.cache.make_key(input_path, format, options)
+            if self.cache.fetch(key, output_path):
+                return ConvertResult(input_path, output_path, True, None, True), key
+        except OSError:
+            # 输入无法读取时交给转换任务报告错误
+            return None, None
+        return None, key
+
+    def iter_journaled(self, jobs, journal):
+        """与 iter_results 相同，同时在 journal（journal_utils.JobJournal）中记录计划和成功的文件
+
+        同一批任务上次没有完成（崩溃、取消或有失败）时，输入和输出都未改动的已完成文件
+        直接产出 resumed 为真的结果，不再转换。全部成功后删除日志中的记录。
+        """
+        jobs = list(jobs)
+        job = journal.open_job('convert', [[os.path.abspath(item[0]), os.path.abspath(item[1]), item[2],
+                                            item[3] if len(item) > 3 else None] for item in jobs])
+        done = job.completed() if job.resumed else {}
+        # 结果按完成顺序返回，按输出路径找回任务序号
+        seqs = {}
+        remaining = []
+        for seq, item in enumerate(jobs):
+            unit = done.get(seq)
+            if unit is not None and job.still_valid(unit):
+                yield ConvertResult(item[0], unit[3], True, None, resumed=True)
+                continue
+            seqs.setdefault(item[1], seq)
+            seqs.setdefault(output_path_for_format(item[1], item[2]), seq)
+            remaining.append(item)
+
+        failed = False
+        try:
+            for result in self.iter_results(remaining):
+                if result.success:
+                    job.record(seqs[result.output_path], result.input_path, result.output_path)
+                else:
+                    failed = True
+                yield result
+        finally:
+            job.flush()
+        if not failed and not self.cancelled:
+            job.finish()
+
+    def run(self, jobs, progress_callback=None, journal=None):
+        """执行全部任务并返回结果列表
+
+        progress_callback(done, total, result) 在每个文件完成后调用；
+        传入 journal 时记录进度，见 iter_journaled。
+        """
+        jobs = list(jobs)
+        total = len(jobs)
+        results = []
+        for result in (self.iter_journaled(jobs, journal) if journal else self.iter_results(jobs)):
+            results.append(result)
+            if progress_callback:
+                progress_callback(len(results), total, result)
+        return results
+
+
+def convert_images(file_paths, format, output_dir=None, max_workers=None, progress_callback=None,
+                   cache=None, **options):
+    """并行转换多个文件，返回 ConvertResult 列表；options 传给 _convert_image"""
+    jobs = [(path, output_path_for(path, format, output_dir), format, options) for path in file_paths]
+    return BatchConverter(max_workers, cache=cache).run(jobs, progress_callback)
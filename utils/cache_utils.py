@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+# 缓存格式变化时递增，使旧缓存全部失效
+CACHE_VERSION = 1
+
+# 各目标格式的输出版本，计入缓存键：某种格式的转换结果变化时递增该格式的版本，
+# 只有该格式的旧结果不再命中
+OUTPUT_VERSIONS = {'png': 1, 'jpg': 1, 'webp': 1, 'gif': 1, 'ico': 1, 'icns': 1, 'svg': 1, 'eps': 1, 'pdf': 1}
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def default_cache_dir():
+    """默认缓存目录：$XDG_CACHE_HOME/pyhandle/convert"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pyhandle', 'convert')
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """计算文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """按内容寻址的转换结果缓存
+
+    缓存键由输入文件内容的哈希、目标格式和转换选项组成。输入文件的大小和
+    修改时间作为快速预检：未变化时直接复用记录的哈希，不再读取文件内容；
+    上次生成的输出文件仍然存在且未被改动时连复制都省去，只需几次 stat。
+    缓存总大小超过 max_bytes 时按最近最少使用淘汰。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.join(self.cache_dir, 'objects'), exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.cache_dir, 'index.sqlite'),
+                                         timeout=30, check_same_thread=False)
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS inputs (
+                    path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT);
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, size INTEGER, last_access REAL);
+                CREATE TABLE IF NOT EXISTS outputs (
+                    path TEXT PRIMARY KEY, key TEXT, size INTEGER, mtime_ns INTEGER);
+            ''')
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _blob_path(self, key):
+        return os.path.join(self.cache_dir, 'objects', key[:2], key)
+
+    def _input_digest(self, input_path):
+        """输入文件大小和修改时间未变时复用记录的哈希"""
+        input_path = os.path.abspath(input_path)
+        st = os.stat(input_path)
+        row = self.conn.execute('SELECT size, mtime_ns, digest FROM inputs WHERE path = ?',
+                                (input_path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        digest = file_digest(input_path)
+        self.conn.execute('INSERT OR REPLACE INTO inputs VALUES (?, ?, ?, ?)',
+                          (input_path, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def make_key(self, input_path, format, options=None):
+        """生成缓存键：内容哈希 + 目标格式 + 选项"""
+        with self._lock:
+            digest = self._input_digest(input_path)
+            self.conn.commit()
+        format = format.lower()
+        payload = json.dumps([CACHE_VERSION, OUTPUT_VERSIONS.get(format, 1), digest, format, options or {}],
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def fetch(self, key, output_path):
+        """命中时保证 output_path 为缓存内容并返回 True，否则返回 False"""
+        output_path = os.path.abspath(output_path)
+        with self._lock:
+            row = self.conn.execute('SELECT size FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return False
+
+            size = row[0]
+            recorded = self.conn.execute('SELECT key, size, mtime_ns FROM outputs WHERE path = ?',
+                                         (output_path,)).fetchone()
+            try:
+                st = os.stat(output_path)
+            except OSError:
+                st = None
+            if not (recorded and st and recorded == (key, st.st_size, st.st_mtime_ns)):
+                # 输出不存在或已被改动，从缓存恢复
+                blob_path = self._blob_path(key)
+                if not os.path.exists(blob_path):
+                    self.conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                    self.conn.commit()
+                    self.misses += 1
+                    return False
+                temp_path = output_path + '.part'
+                shutil.copyfile(blob_path, temp_path)
+                os.replace(temp_path, output_path)
+                st = os.stat(output_path)
+                self.conn.execute('INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)',
+                                  (output_path, key, st.st_size, st.st_mtime_ns))
+
+            self.conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+            self.bytes_saved += size
+            return True
+
+    def store(self, key, output_path):
+        """把新生成的输出文件存入缓存，必要时淘汰旧条目"""
+        output_path = os.path.abspath(output_path)
+        with self._lock:
+            blob_path = self._blob_path(key)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temp_path = blob_path + '.part'
+            shutil.copyfile(output_path, temp_path)
+            os.replace(temp_path, blob_path)
+
+            st = os.stat(output_path)
+            self.conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                              (key, st.st_size, time.time()))
+            self.conn.execute('INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)',
+                              (output_path, key, st.st_size, st.st_mtime_ns))
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(self._blob_path(key))
+            except FileNotFoundError:
+                pass
+            self.conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """删除全部缓存内容"""
+        with self._lock:
+            self.close()
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def stats(self):
+        """返回本次会话的命中统计和缓存当前占用"""
+        with self._lock:
+            entries, total = self.conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'bytes_saved': self.bytes_saved,
+            'evictions': self.evictions,
+            'entries': entries,
+            'cache_bytes': total,
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,173 @@
+from collections import namedtuple
+from io import BytesIO
+
+from PIL import Image
+
+# 支持按目标大小或画质搜索编码参数的格式及 Pillow 格式名
+SEARCH_FORMATS = {'jpg': 'JPEG', 'webp': 'WEBP'}
+
+# 搜索的质量范围；Pillow 不建议 JPEG 使用 95 以上的质量
+MIN_QUALITY = 10
+MAX_QUALITY = 95
+
+# 提前结束的容差：大小落在目标的 97%~100% 之间、SSIM 高出下限不到 0.002 时不再继续二分
+SIZE_SLACK = 0.03
+SSIM_SLACK = 0.002
+
+# SSIM 的窗口为 8x8，步长 4：相邻窗口跨过 JPEG 的 8x8 块边界，块效应也计入评分；
+# 按行分块计算以限制临时数组的内存
+SSIM_BLOCK = 4
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+SSIM_BAND_ROWS = 256
+
+# 搜索结果：编码后的数据、质量、大小（字节）、SSIM（未计算时为 None）、编码次数、是否满足目标
+SearchResult = namedtuple('SearchResult', ['data', 'quality', 'size', 'ssim', 'attempts', 'met'])
+
+
+def _luma(img):
+    """图像的亮度通道，float64 数组"""
+    import numpy as np
+    if img.mode not in ('L', 'RGB'):
+        img = img.convert('RGB')
+    return np.asarray(img.convert('L'), dtype=np.float64)
+
+
+def _window_sums(a):
+    """a 中每个 8x8 窗口（步长 4）的元素和：先求 4x4 块的和，再把相邻 2x2 个块相加"""
+    rows, cols = a.shape[0] // SSIM_BLOCK, a.shape[1] // SSIM_BLOCK
+    blocks = a[:rows * SSIM_BLOCK, :cols * SSIM_BLOCK].reshape(rows, SSIM_BLOCK, cols, SSIM_BLOCK).sum(axis=(1, 3))
+    return blocks[:-1, :-1] + blocks[1:, :-1] + blocks[:-1, 1:] + blocks[1:, 1:]
+
+
+def _ssim_terms(sums, x, y, n):
+    """按窗口和 sums 计算每个窗口的 SSIM，n 为窗口内的像素数"""
+    mean_x = sums(x) / n
+    mean_y = sums(y) / n
+    var_x = sums(x * x) / n - mean_x * mean_x
+    var_y = sums(y * y) / n - mean_y * mean_y
+    cov = sums(x * y) / n - mean_x * mean_y
+    return ((2 * mean_x * mean_y + SSIM_C1) * (2 * cov + SSIM_C2)
+            / ((mean_x * mean_x + mean_y * mean_y + SSIM_C1) * (var_x + var_y + SSIM_C2)))
+
+
+def ssim(reference, candidate):
+    """两幅亮度图（_luma 的结果）的平均 SSIM，全部用数组运算完成；小于 8x8 的图像整体作为一个窗口"""
+    height = reference.shape[0]
+    if min(reference.shape) < 2 * SSIM_BLOCK:
+        return float(_ssim_terms(lambda a: a.sum(), reference, candidate, reference.size))
+    total = 0.0
+    count = 0
+    for top in range(0, height - SSIM_BLOCK, SSIM_BAND_ROWS):
+        # 每块多取 4 行，跨块的窗口也被计算
+        bottom = top + SSIM_BAND_ROWS + SSIM_BLOCK
+        if min(bottom, height) - top < 2 * SSIM_BLOCK:
+            break
+        terms = _ssim_terms(_window_sums, reference[top:bottom], candidate[top:bottom], (2 * SSIM_BLOCK) ** 2)
+        total += float(terms.sum())
+        count += terms.size
+    return total / count
+
+
+def encode(img, format, quality, method=None):
+    """在内存中按给定质量编码，返回字节串
+
+    JPEG 同时优化哈夫曼表，体积更小且不影响画质；method 为 WebP 的压缩力度（0-6）。
+    """
+    options = {'quality': quality}
+    if format == 'jpg':
+        options['optimize'] = True
+    elif method is not None:
+        options['method'] = method
+    buf = BytesIO()
+    img.save(buf, format=SEARCH_FORMATS[format], **options)
+    return buf.getvalue()
+
+
+def search_quality(img, format, target_bytes=None, min_ssim=None, method=None,
+                   min_quality=MIN_QUALITY, max_quality=MAX_QUALITY):
+    """二分搜索编码质量，返回 SearchResult
+
+    target_bytes：输出不超过该大小，取满足条件的最高质量；
+    min_ssim：与原图的 SSIM 不低于该值，取满足条件的最低质量（文件最小）。
+    两者同时给出时在大小限制内取满足画质下限的最低质量；无法同时满足时大小优先，
+    met 为假。img 只解码一次，每次尝试只重新编码，同一质量不会编码两次。
+    """
+    if format not in SEARCH_FORMATS:
+        raise ValueError(f"{format} 不支持按目标大小或画质编码（仅支持 jpg、webp）")
+    if target_bytes is None and min_ssim is None:
+        raise ValueError("需要指定目标大小或最低 SSIM")
+    if img.mode not in ('RGB', 'L') and not (format == 'webp' and img.mode == 'RGBA'):
+        img = img.convert('RGB')
+
+    encoded = {}
+    scores = {}
+    reference = []
+
+    def size_at(quality):
+        if quality not in encoded:
+            encoded[quality] = encode(img, format, quality, method)
+        return len(encoded[quality])
+
+    def ssim_at(quality):
+        if quality not in scores:
+            if not reference:
+                reference.append(_luma(img))
+            size_at(quality)
+            with Image.open(BytesIO(encoded[quality])) as decoded:
+                scores[quality] = ssim(reference[0], _luma(decoded))
+        return scores[quality]
+
+    met = True
+    upper = max_quality
+    if target_bytes is not None:
+        # 找满足大小限制的最高质量：lower 总是满足，upper 总是不满足
+        if size_at(max_quality) <= target_bytes:
+            upper = max_quality
+        elif size_at(min_quality) > target_bytes:
+            upper = min_quality
+            met = False
+        else:
+            lower, upper = min_quality, max_quality
+            while upper - lower > 1:
+                middle = (lower + upper) // 2
+                size = size_at(middle)
+                if size <= target_bytes:
+                    lower = middle
+                    if size >= target_bytes * (1 - SIZE_SLACK):
+                        break
+                else:
+                    upper = middle
+            upper = lower
+
+    quality = upper
+    if min_ssim is not None:
+        # 在 [min_quality, upper] 中找满足画质下限的最低质量：lower 总是不满足，upper 总是满足
+        if ssim_at(upper) < min_ssim:
+            met = False
+        elif ssim_at(min_quality) >= min_ssim:
+            quality = min_quality
+        else:
+            lower = min_quality
+            while upper - lower > 1:
+                middle = (lower + upper) // 2
+                score = ssim_at(middle)
+                if score >= min_ssim:
+                    upper = middle
+                    if score < min_ssim + SSIM_SLACK:
+                        break
+                else:
+                    lower = middle
+            quality = upper
+
+    size_at(quality)
+    return SearchResult(encoded[quality], quality, len(encoded[quality]), scores.get(quality),
+                        len(encoded), met)
+
+
+def save_with_search(img, output_path, format, target_bytes=None, min_ssim=None, method=None):
+    """搜索质量后把结果写入 output_path，返回 SearchResult"""
+    result = search_quality(img, format, target_bytes=target_bytes, min_ssim=min_ssim, method=method)
+    with open(output_path, 'wb') as f:
+        f.write(result.data)
+    return result
@@ -1,3 +1,6 @@
+import glob
+import os
+
 # 允许的文件扩展名
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'ico'}
 
@@ -12,4 +15,55 @@ def allowed_file(filename, allowed_types=None):
     if allowed_types is None:
         return ext in ALLOWED_EXTENSIONS
     else:
-        return ext in allowed_types
\ No newline at end of file
+        return ext in allowed_types
+
+def read_manifest(manifest_path):
+    """读取清单文件：每行一个路径，# 开头为注释，相对路径以清单所在目录为准"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    paths = []
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            paths.append(os.path.join(base_dir, os.path.expanduser(line)))
+    return paths
+
+
+def expand_inputs(inputs, allowed_types=None, recursive=False, manifests=(), unique=True):
+    """把通配符、目录和清单文件展开为文件列表（保持顺序，unique 为真时去重）
+
+    目录只收集扩展名在 allowed_types 中的文件；显式给出的文件原样保留，
+    由调用方决定如何处理不支持的类型。
+    """
+    candidates = []
+    for manifest in manifests:
+        candidates.extend(read_manifest(manifest))
+    candidates.extend(inputs)
+
+    files = []
+    for item in candidates:
+        item = os.path.expanduser(item)
+        if os.path.isdir(item):
+            if recursive:
+                for root, dirs, names in os.walk(item):
+                    dirs.sort()
+                    files.extend(os.path.join(root, n) for n in sorted(names)
+                                 if allowed_file(n, allowed_types))
+            else:
+                files.extend(os.path.join(item, n) for n in sorted(os.listdir(item))
+                             if os.path.isfile(os.path.join(item, n)) and allowed_file(n, allowed_types))
+        elif glob.has_magic(item):
+            files.extend(sorted(glob.glob(item, recursive=recursive)))
+        else:
+            files.append(item)
+
+    if not unique:
+        return files
+    seen = set()
+    result = []
+    for path in files:
+        if path not in seen:
+            seen.add(path)
+            result.append(path)
+    return result
@@ -0,0 +1,297 @@
+import os
+import struct
+import time
+from collections import namedtuple
+
+from PIL import Image, ImageChops, GifImagePlugin
+
+from .io_utils import open_input, source_size
+from .phash_utils import hamming, image_hash
+from .profiling import stage
+
+# 透明像素使用调色板最后一个索引，其余 255 个颜色留给画面
+TRANSPARENT_INDEX = 255
+
+# 统计全局调色板时每帧缩略图的最长边
+PALETTE_TILE_SIZE = 320
+
+# GIF 合成结果：输入帧数、实际写出的帧数（重复帧会被合并）、耗时（秒）和输出大小（字节）
+GifReport = namedtuple('GifReport', ['output_path', 'frame_count', 'written_frames', 'seconds', 'output_bytes'])
+
+
+class GifStreamWriter:
+    """逐帧写出的 GIF 编码器
+
+    Pillow 的 save(append_images=...) 需要先把所有帧放进内存，
+    这里每添加一帧就立即压缩写入文件，内存中只保留当前帧。
+    """
+
+    def __init__(self, fp, size, loop=0, global_palette=None):
+        self.fp = fp
+        self.size = size
+        self.frame_count = 0
+        self.global_palette = global_palette
+        self._write_header(loop)
+
+    def _write_header(self, loop):
+        width, height = self.size
+        if self.global_palette:
+            # 全局颜色表，256 色
+            flags, palette = 0xF7, _pad_palette(self.global_palette)
+        else:
+            flags, palette = 0, b""
+        # 背景色索引指向透明索引，处置方式 2 恢复背景时显示为透明
+        self.fp.write(b"GIF89a" + struct.pack("<HHBBB", width, height, flags, TRANSPARENT_INDEX, 0) + palette)
+        if loop is not None:
+            # NETSCAPE2.0 扩展，loop=0 表示无限循环
+            self.fp.write(b"!\xff\x0bNETSCAPE2.0\x03\x01" + struct.pack("<H", loop) + b"\x00")
+
+    def add_frame(self, frame, duration=100, offset=(0, 0), disposal=1, transparency=None):
+        """写入一帧 P 模式图像，duration 单位为毫秒"""
+        params = {'duration': duration, 'disposal': disposal}
+        if transparency is not None:
+            params['transparency'] = transparency
+        # 调色板与全局颜色表不同时写入局部颜色表
+        if not self.global_palette or _pad_palette(frame.getpalette()) != _pad_palette(self.global_palette):
+            params['include_color_table'] = True
+        with stage('encode') as s:
+            for chunk in GifImagePlugin.getdata(frame, offset, **params):
+                self.fp.write(chunk)
+                s.bytes += len(chunk)
+        self.frame_count += 1
+
+    def close(self):
+        self.fp.write(b";")
+
+
+def _pad_palette(palette):
+    palette = bytes(palette or b"")[:768]
+    return palette + b"\x00" * (768 - len(palette))
+
+
+def target_size(size, canvas_size=None, max_size=None):
+    """计算输出画布大小：默认使用首帧大小，最长边不超过 max_size"""
+    width, height = canvas_size or size
+    if max_size and max(width, height) > max_size:
+        scale = max_size / max(width, height)
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+    return width, height
+
+
+def normalize_frame(img, size, keep_aspect=True):
+    """把一帧统一为画布大小的 RGBA 图像
+
+    keep_aspect 为真时等比缩放并居中放在透明画布上，否则直接拉伸。
+    """
+    # JPEG 可以按 1/2、1/4、1/8 比例解码，大图合成小 GIF 时省去大部分解码时间；
+    # 其它格式的 draft() 不做任何事
+    img.draft(None, size)
+    img = img.convert("RGBA")
+    if img.size == size:
+        return img
+    if not keep_aspect:
+        return img.resize(size, Image.LANCZOS)
+
+    scale = min(size[0] / img.width, size[1] / img.height)
+    resized = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+    canvas = Image.new("RGBA", size, (0, 0, 0, 0))
+    canvas.paste(resized, ((size[0] - resized.width) // 2, (size[1] - resized.height) // 2))
+    return canvas
+
+
+def quantize_frame(rgba):
+    """RGBA 帧量化为 P 模式，半透明以下的像素映射到 TRANSPARENT_INDEX
+
+    返回 (P 图像, 透明索引或 None)。
+    """
+    alpha = rgba.getchannel("A")
+    frame = rgba.convert("RGB").quantize(colors=255, method=Image.Quantize.MEDIANCUT)
+    frame.putpalette(_pad_palette(frame.getpalette()))
+    mask = alpha.point(lambda a: 255 if a < 128 else 0, mode="1")
+    if mask.getbbox() is None:
+        return frame, None
+    frame.paste(TRANSPARENT_INDEX, mask=mask)
+    return frame, TRANSPARENT_INDEX
+
+
+def palette_tile(img):
+    """统计调色板用的小图：最长边不超过 PALETTE_TILE_SIZE 的 RGB 图像"""
+    tile_size = target_size(img.size, max_size=PALETTE_TILE_SIZE)
+    img.draft(None, tile_size)
+    # 最近邻采样保留原始颜色，屏幕录像中的细线和文字颜色不会被平均掉
+    return img.convert("RGB").resize(tile_size, Image.NEAREST)
+
+
+def palette_from_tiles(tiles):
+    """把 palette_tile 生成的小图拼在一起统一量化，返回只含调色板（255 色）的 P 模式图像"""
+    tiles = list(tiles)
+    montage = Image.new("RGB", (max(t.width for t in tiles), sum(t.height for t in tiles)))
+    y = 0
+    for tile in tiles:
+        montage.paste(tile, (0, y))
+        y += tile.height
+
+    palette = montage.quantize(colors=255, method=Image.Quantize.MEDIANCUT).getpalette()[:255 * 3]
+    palette_image = Image.new("P", (1, 1))
+    palette_image.putpalette(palette)
+    return palette_image
+
+
+def build_global_palette(file_paths, sample=64):
+    """统计整个序列的全局调色板（255 色），返回只含调色板的 P 模式图像
+
+    序列很长时只均匀抽取 sample 帧，每帧缩小后拼成一张图统一量化。
+    """
+    if sample and len(file_paths) > sample:
+        step = len(file_paths) / sample
+        file_paths = [file_paths[int(i * step)] for i in range(sample)]
+
+    tiles = []
+    for path in file_paths:
+        with Image.open(path) as img:
+            tiles.append(palette_tile(img))
+    return palette_from_tiles(tiles)
+
+
+def _index_image(frame):
+    """把 P 图像的索引当作灰度值，用于逐像素比较"""
+    return Image.frombytes("L", frame.size, frame.tobytes())
+
+
+class DeltaFrameWriter:
+    """使用全局调色板并只写出变化区域的帧写入器
+
+    每帧裁剪到与上一帧不同的包围盒，未变化的像素设为透明索引；
+    与上一帧完全相同的帧不写出，而是把时长累加到上一帧。
+    为了合并重复帧并决定处置方式，帧会延迟一帧写出，内存中最多保留两帧。
+    """
+
+    def __init__(self, writer, palette_image):
+        self.writer = writer
+        self.palette_image = palette_image
+        self.pending = None
+
+    def add(self, rgba, duration, file=None):
+        with stage('quantize', file):
+            alpha = rgba.getchannel("A")
+            has_alpha = alpha.getextrema()[0] < 128
+            frame = rgba.convert("RGB").quantize(palette=self.palette_image, dither=Image.Dither.NONE)
+            if has_alpha:
+                frame.paste(TRANSPARENT_INDEX, mask=alpha.point(lambda a: 255 if a < 128 else 0, mode="1"))
+
+            diff = None
+            if self.pending is not None and not has_alpha and not self.pending['alpha']:
+                diff = ImageChops.difference(_index_image(frame), _index_image(self.pending['frame']))
+
+        if self.pending is not None:
+            if diff is not None and diff.getbbox() is None:
+                self.pending['duration'] += duration
+                return
+            self._flush(next_has_alpha=has_alpha)
+
+        self.pending = {'frame': frame, 'alpha': has_alpha, 'duration': duration, 'diff': diff}
+
+    def _flush(self, next_has_alpha):
+        pending = self.pending
+        frame, diff = pending['frame'], pending['diff']
+        duration = int(pending['duration'])
+
+        if pending['alpha'] or next_has_alpha or diff is None:
+            # 含透明像素的帧无法叠加在上一帧上：整帧写出，并在显示后清空画布
+            disposal = 2 if pending['alpha'] or next_has_alpha else 1
+            transparency = TRANSPARENT_INDEX if pending['alpha'] else None
+            self.writer.add_frame(frame, duration, disposal=disposal, transparency=transparency)
+            return
+
+        bbox = diff.getbbox()
+        delta = frame.crop(bbox)
+        unchanged = diff.crop(bbox).point(lambda v: 255 if v == 0 else 0, mode="1")
+        delta.paste(TRANSPARENT_INDEX, mask=unchanged)
+        self.writer.add_frame(delta, duration, offset=bbox[:2], disposal=1, transparency=TRANSPARENT_INDEX)
+
+    def close(self):
+        if self.pending is not None:
+            self._flush(next_has_alpha=False)
+            self.pending = None
+
+
+def build_gif(file_paths, output_path, duration=100, loop=0, size=None, max_size=None,
+              keep_aspect=True, optimize=True, palette_sample=64, progress_callback=None,
+              merge_similar=None, hash_index=None):
+    """逐帧解码、量化并写出 GIF，内存只与单帧大小有关
+
+    size 指定画布大小 (宽, 高)，默认为首帧大小；max_size 限制画布最长边；
+    optimize 为真时使用全局调色板和帧差分（palette_sample 为统计调色板时抽样的帧数），
+    否则每帧独立量化并整帧写出；progress_callback(done, total) 每处理完一帧调用一次。
+    merge_similar 不为 None 时，与上一个写出的帧感知哈希距离不超过该值的帧不写出，
+    时长累加到上一帧；传入 hash_index（phash_utils.HashIndex）时全部使用索引中的文件哈希，
+    被合并的帧无需解码（无法计算哈希的帧不参与合并），否则全部按规范化后的帧计算。感知哈希忽略小范围的变化，只有局部变化的帧
+    （如屏幕录像）也会被合并，这类序列不要启用。返回 GifReport。
+    """
+    start = time.perf_counter()
+    with Image.open(file_paths[0]) as first:
+        canvas_size = target_size(first.size, size, max_size)
+
+    palette_image = None
+    if optimize:
+        with stage('palette'):
+            palette_image = build_global_palette(file_paths, palette_sample)
+
+    file_hashes = {}
+    if merge_similar is not None and hash_index is not None:
+        file_hashes = hash_index.hash_paths(file_paths)
+
+    temp_path = output_path + '.part'
+    try:
+        with open(temp_path, 'wb') as fp:
+            writer = GifStreamWriter(fp, canvas_size, loop=loop,
+                                     global_palette=palette_image.getpalette() if optimize else None)
+            delta_writer = DeltaFrameWriter(writer, palette_image) if optimize else None
+
+            def write(rgba, frame_duration, path):
+                if delta_writer:
+                    delta_writer.add(rgba, frame_duration, path)
+                    return
+                with stage('quantize', path):
+                    frame, transparency = quantize_frame(rgba)
+                # disposal=2：下一帧绘制前恢复为背景，避免透明区域残留上一帧
+                writer.add_frame(frame, int(frame_duration), disposal=2 if transparency is not None else 1,
+                                 transparency=transparency)
+
+            # 等待写出的帧 [RGBA, 时长, 路径]：后面的相似帧把时长累加上来，因此延迟一帧写出
+            held = None
+            held_hash = None
+            for index, path in enumerate(file_paths, 1):
+                value = file_hashes.get(path)
+                similar = held_hash is not None and value is not None and hamming(value, held_hash) <= merge_similar
+                if held is not None and similar:
+                    held[1] += duration
+                else:
+                    with stage('decode', path) as s, open_input(path) as source, Image.open(source) as img:
+                        s.bytes = source_size(source)
+                        rgba = normalize_frame(img, canvas_size, keep_aspect)
+                    if merge_similar is not None and hash_index is None:
+                        # 没有索引时所有帧都按规范化后的帧计算，与索引中的文件哈希不混用
+                        with stage('hash', path):
+                            value = image_hash(rgba)
+                        similar = held_hash is not None and hamming(value, held_hash) <= merge_similar
+                    if held is not None and similar:
+                        held[1] += duration
+                    else:
+                        if held is not None:
+                            write(*held)
+                        held, held_hash = [rgba, duration, path], value
+                if progress_callback:
+                    progress_callback(index, len(file_paths))
+            if held is not None:
+                write(*held)
+            if delta_writer:
+                delta_writer.close()
+            writer.close()
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return GifReport(output_path, len(file_paths), writer.frame_count,
+                     time.perf_counter() - start, os.path.getsize(output_path))
@@ -1,29 +1,221 @@
 import os
 from PIL import Image
 
-def convert_image(input_path, output_path, format):
-    """转换图片格式"""
+from .animation_utils import ANIMATED_FORMATS, convert_animation, is_animated
+from .gif_utils import build_gif
+from .io_utils import open_input, read_all, source_size
+from .profiling import stage
+from .vector_utils import convert_svg, is_svg, save_raster_svg
+
+
+def output_path_for_format(output_path, format):
+    """返回转换实际写入的路径（icns 总是使用 .icns 扩展名）"""
+    if format.lower() == 'icns':
+        return os.path.splitext(output_path)[0] + ".icns"
+    return output_path
+
+
+# 图标中包含的各个尺寸
+ICO_SIZES = (16, 24, 32, 48, 64, 128, 256)
+ICNS_SIZES = (16, 32, 64, 128, 256, 512, 1024)
+
+
+def load_reduced(img, size):
+    """按目标尺寸做降采样解码，返回已加载且不小于 size 的图像
+
+    JPEG 通过 draft() 在解码时按 1/2、1/4、1/8 缩小，其它格式解码后用 reduce()
+    做整数倍的快速缩小；最终的高质量缩放由调用方完成。
+    """
+    img.draft(None, size)
+    factor = min(img.width // size[0], img.height // size[1])
+    if factor >= 2:
+        # reduce() 不支持调色板和二值图像
+        if img.mode in ('P', '1'):
+            img = img.convert('RGBA')
+        return img.reduce(factor)
+    img.load()
+    return img
+
+
+def fit_size(size, max_size):
+    """等比缩放到最长边不超过 max_size"""
+    width, height = size
+    scale = min(1.0, max_size / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def icon_images(img, sizes):
+    """一次解码生成各尺寸的正方形图标，按尺寸从大到小返回"""
+    sizes = sorted(set(sizes), reverse=True)
+    largest = sizes[0]
+    img = load_reduced(img, (largest, largest))
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA')
+    # 只对缩小后的图像做一次高质量缩放，较小尺寸从最大尺寸生成
+    master = img.resize((largest, largest), Image.LANCZOS)
+    return [master] + [master.resize((size, size), Image.LANCZOS) for size in sizes[1:]]
+
+
+def icon_sizes(format, max_size=None):
+    """ico/icns 包含的尺寸，max_size 限制最大尺寸"""
+    sizes = ICNS_SIZES if format == 'icns' else ICO_SIZES
+    if max_size:
+        sizes = [size for size in sizes if size <= max_size] or [min(sizes)]
+    return sorted(sizes, reverse=True)
+
+
+def write_icon(images, output_path, format):
+    """把按尺寸从大到小排列的图像写成 ico/icns，返回实际输出路径"""
+    if format == 'icns':
+        output_path = output_path_for_format(output_path, format)
+        images[0].save(output_path, format='ICNS', append_images=images[1:])
+    else:
+        images[0].save(output_path, format='ICO', sizes=[im.size for im in images],
+                       append_images=images[1:])
+    return output_path
+
+
+def _convert_image(input_path, output_path, format, max_size=None, dpi=96, target_bytes=None, min_ssim=None,
+                   search_report=None):
+    """转换图片格式，失败时抛出异常，返回实际输出路径
+
+    max_size 限制输出的最长边（生成缩略图），图标格式则限制最大的图标尺寸。
+    SVG 输入交给 vector_utils 渲染，dpi 为渲染分辨率，max_size 为输出的最长边。
+    target_bytes 和 min_ssim 只用于 jpg 和 webp：搜索满足目标大小或画质下限的质量，
+    见 encode_utils.search_quality；search_report 为列表时追加搜索结果（不含编码数据的 SearchResult），
+    调用方据此检查 met，目标无法满足时仍写出最接近的结果。
+    动画 GIF/WebP/APNG 转为 gif、webp、png 时逐帧转换为动画（见 animation_utils），
+    转为其它格式时只取第一帧。
+    """
+    format = format.lower()
+    search = None
+    if target_bytes or min_ssim:
+        from .encode_utils import SEARCH_FORMATS
+        if format not in SEARCH_FORMATS:
+            raise ValueError(f"{format} 不支持按目标大小或画质编码（仅支持 jpg、webp）")
+        search = {'target_bytes': target_bytes, 'min_ssim': min_ssim}
+    if is_svg(input_path):
+        return convert_svg(input_path, output_path, format, dpi=dpi, max_size=max_size, search=search,
+                           search_report=search_report)
+
+    # 解码器直接从映射的页缓存读取，转 pdf 时 JPEG 原始数据也不再重新读取文件
+    with open_input(input_path) as source:
+        with stage('read', input_path) as s:
+            img = Image.open(source)
+            s.bytes = source_size(source)
+
+        with img:
+            if format in ANIMATED_FORMATS and is_animated(img):
+                if search:
+                    raise ValueError("动画不支持按目标大小或画质编码")
+                return convert_animation(img, input_path, output_path, format, max_size)
+
+            if format in ('ico', 'icns'):
+                # 图标只需要小尺寸，按目标尺寸降采样解码，避免解码全部像素
+                with stage('resize', input_path):
+                    images = icon_images(img, icon_sizes(format, max_size))
+                with stage('encode', input_path) as s:
+                    output_path = write_icon(images, output_path, format)
+                    s.bytes = os.path.getsize(output_path)
+                return output_path
+
+            resized = False
+            if max_size and max(img.size) > max_size:
+                size = fit_size(img.size, max_size)
+                with stage('decode', input_path):
+                    img = load_reduced(img, size)
+                with stage('resize', input_path):
+                    img = img.resize(size, Image.LANCZOS)
+                resized = True
+            elif format != 'pdf':
+                # 转 pdf 时 JPEG 不需要解码
+                with stage('decode', input_path):
+                    img.load()
+
+            mode = _output_mode(img.mode, format)
+            if mode != img.mode:
+                with stage('convert', input_path):
+                    img = img.convert(mode)
+
+            with stage('encode', input_path) as s:
+                output_path = _save(img, source, output_path, format, resized, search, search_report)
+                s.bytes = os.path.getsize(output_path)
+    return output_path
+
+
+def _output_mode(mode, format):
+    """目标格式能保存的图像模式"""
+    if format in ('jpg', 'eps'):
+        # jpg 和 eps 不支持透明度和调色板
+        return mode if mode in ('RGB', 'L', 'CMYK') else 'RGB'
+    if format == 'png' and mode == 'CMYK':
+        return 'RGB'
+    return mode
+
+
+def _save(img, source, output_path, format, resized, search=None, search_report=None):
+    """按目标格式写出图像，source 为 open_input 打开的输入，返回实际输出路径
+
+    search 为 search_quality 的参数，给出时在内存中搜索质量后写出结果，
+    search_report 为列表时追加搜索结果。
+    """
+    if format == 'pdf':
+        from .pdf_utils import image_to_pdf
+        # 未缩放的 JPEG 直接嵌入原始数据，不重新压缩
+        raw = None
+        if not resized and img.format == 'JPEG':
+            raw = read_all(source)
+        return image_to_pdf(img, output_path, raw)
+
+    if format == 'svg':
+        save_raster_svg(img, output_path)
+        return output_path
+
+    if search:
+        from .encode_utils import save_with_search
+        result = save_with_search(img, output_path, format, **search)
+        if search_report is not None:
+            search_report.append(result._replace(data=None))
+        return output_path
+
+    # 默认保存（Pillow 中 jpg 的格式名为 JPEG）
+    img.save(output_path, format='JPEG' if format == 'jpg' else format.upper())
+    return output_path
+
+
+def convert_image(input_path, output_path, format, cache=None, max_size=None, dpi=None):
+    """转换图片格式
+
+    传入 cache（cache_utils.ConversionCache）时，内容未变化的输入直接使用缓存结果。
+    """
+    options = {'max_size': max_size} if max_size else {}
+    if dpi:
+        options['dpi'] = dpi
     try:
-        with Image.open(input_path) as img:
-            format = format.lower()
-
-            if format == 'jpg':
-                # 确保 jpg 不包含透明度
-                if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                    img = img.convert("RGB")
-
-            elif format == 'icns':
-                # ICNS 需要正方形，推荐尺寸：512x512
-                size = max(img.size)
-                img = img.resize((size, size))
-                output_path = os.path.splitext(output_path)[0] + ".icns"
-                img.save(output_path, format='ICNS')
-                return True
-
-            # 默认保存
-            img.save(output_path, format=format.upper())
+        if cache is None:
+            _convert_image(input_path, output_path, format, **options)
+            return True
+
+        key = cache.make_key(input_path, format, options)
+        if cache.fetch(key, output_path_for_format(output_path, format)):
+            return True
+        output_path = _convert_image(input_path, output_path, format, **options)
+        cache.store(key, output_path)
         return True
 
     except Exception as e:
         print(f"转换失败: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+def merge_gif(file_paths, output_path, duration=100, loop=0, size=None, max_size=None,
+              keep_aspect=True, optimize=True, palette_sample=64, progress_callback=None,
+              merge_similar=None, hash_index=None):
+    """将多张图片合成为 GIF，duration 为每帧间隔（毫秒），loop=0 表示无限循环
+
+    逐帧流式写出，参数含义见 gif_utils.build_gif，返回 GifReport。
+    """
+    return build_gif(file_paths, output_path, duration=duration, loop=loop, size=size,
+                     max_size=max_size, keep_aspect=keep_aspect, optimize=optimize,
+                     palette_sample=palette_sample, progress_callback=progress_callback,
+                     merge_similar=merge_similar, hash_index=hash_index)
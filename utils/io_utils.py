@@ -0,0 +1,113 @@
+import mmap
+import os
+import stat
+import threading
+from contextlib import contextmanager
+
+# 设置环境变量 PYHANDLE_NO_MMAP=1 时全部使用普通文件读取
+USE_MMAP = not os.environ.get('PYHANDLE_NO_MMAP')
+
+# 小文件一次 read 更快，映射和缺页的开销反而更大
+MMAP_MIN_SIZE = 64 * 1024
+
+# 网络和用户态文件系统上的映射在文件被截断时会触发 SIGBUS，不使用 mmap
+NETWORK_FS_TYPES = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'afs', 'ceph', 'glusterfs',
+                    'lustre', 'gpfs', 'davfs', 'fuse', 'fuseblk'}
+
+# 访问模式：sequential 从头读到尾（图片），random 只读少量位置（PDF 探测、提取页面），
+# willneed 会读完但顺序不定（合并整个 PDF），提前把整个文件读入页缓存
+SEQUENTIAL = 'sequential'
+RANDOM = 'random'
+WILLNEED = 'willneed'
+_ADVICE = {SEQUENTIAL: 'MADV_SEQUENTIAL', RANDOM: 'MADV_RANDOM', WILLNEED: 'MADV_WILLNEED'}
+
+_fs_types = {}
+_fs_lock = threading.Lock()
+
+
+def _load_mount_types():
+    """读取 /proc/self/mountinfo，返回 {设备号: 文件系统类型}"""
+    types = {}
+    try:
+        with open('/proc/self/mountinfo') as f:
+            for line in f:
+                fields = line.split()
+                try:
+                    major, minor = fields[2].split(':')
+                    fs_type = fields[fields.index('-') + 1]
+                except (IndexError, ValueError):
+                    continue
+                types[os.makedev(int(major), int(minor))] = fs_type
+    except OSError:
+        pass
+    return types
+
+
+def filesystem_type(st_dev):
+    """设备号对应的文件系统类型，未知时返回 None"""
+    with _fs_lock:
+        if st_dev not in _fs_types:
+            # 新挂载的文件系统需要重新读取
+            _fs_types.update(_load_mount_types())
+            _fs_types.setdefault(st_dev, None)
+        return _fs_types[st_dev]
+
+
+def _is_network_fs(st_dev):
+    fs_type = filesystem_type(st_dev)
+    return fs_type is not None and (fs_type in NETWORK_FS_TYPES or fs_type.startswith('fuse.'))
+
+
+def can_mmap(st):
+    """os.stat 结果对应的文件能否安全映射：本地文件系统上足够大的普通文件"""
+    return (USE_MMAP and stat.S_ISREG(st.st_mode) and st.st_size >= MMAP_MIN_SIZE
+            and not _is_network_fs(st.st_dev))
+
+
+@contextmanager
+def open_input(path, access=SEQUENTIAL):
+    """只读打开输入文件，返回支持 read/seek/tell 的对象
+
+    本地的普通文件映射到内存，读取直接从页缓存复制，没有 read 系统调用，
+    PyPDF2 频繁的 seek 也不会丢弃缓冲区；管道、网络文件系统、小文件和映射失败时
+    退回普通的缓冲文件。access 为访问模式（SEQUENTIAL、RANDOM 或 WILLNEED），
+    用于提示内核的预读策略。
+    """
+    with open(path, 'rb') as f:
+        mapped = None
+        if can_mmap(os.fstat(f.fileno())):
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                mapped = None
+        if mapped is None:
+            yield f
+            return
+        advice = getattr(mmap, _ADVICE.get(access, ''), None)
+        if advice is not None and hasattr(mapped, 'madvise'):
+            mapped.madvise(advice)
+        try:
+            yield mapped
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                # 仍有 memoryview 引用映射，最后一个引用释放时自动解除映射
+                pass
+
+
+def read_all(source):
+    """读取 open_input 返回对象的全部内容
+
+    映射的文件返回 memoryview，不复制数据；使用完毕前不能关闭 source。
+    """
+    if isinstance(source, mmap.mmap):
+        return memoryview(source)
+    source.seek(0)
+    return source.read()
+
+
+def source_size(source):
+    if isinstance(source, mmap.mmap):
+        return len(source)
+    return os.fstat(source.fileno()).st_size
@@ -0,0 +1,628 @@
+"""本地作业服务：通过 HTTP（TCP 或 Unix 套接字）提供图片转换、GIF 合成和 PDF 合并
+
+    POST   /uploads?name=photo.jpg     上传一个输入文件（请求体为文件内容），返回 {"upload": id}
+    POST   /jobs                       提交作业（JSON），返回 {"job": id, "status": "queued"}
+    GET    /jobs/<id>                  查询作业状态
+    GET    /jobs/<id>/result           下载结果文件
+    DELETE /jobs/<id>                  取消排队中的作业或删除已完成作业的结果
+    GET    /status                     队列长度、正在执行的作业数等
+
+作业 JSON：{"type": "convert" | "gif" | "merge" | "img2pdf", "uploads": [id, ...],
+"format": "webp"（仅 convert）, "options": {...}, "priority": 0}，priority 越大越先执行。
+作业在常驻的进程池中执行，调用与命令行和界面相同的函数，结果与直接调用完全一致。
+convert 作业指定 target_bytes 或 min_ssim 时，完成后的状态中有 quality、ssim 和 target_met，
+target_met 为 false 表示在质量下限内无法达到目标，结果为最接近的编码。
+"""
+import asyncio
+import http.client
+import itertools
+import json
+import os
+import shutil
+import signal
+import socket
+import tempfile
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+# 各类作业允许的选项，其它键会被拒绝
+JOB_OPTIONS = {
+    'convert': {'max_size', 'dpi', 'target_bytes', 'min_ssim'},
+    'gif': {'duration', 'loop', 'size', 'max_size', 'keep_aspect', 'optimize', 'palette_sample', 'merge_similar'},
+    'merge': {'page_ranges', 'dedup', 'compress'},
+    'img2pdf': set(),
+}
+CONVERT_FORMATS = {'png', 'jpg', 'webp', 'gif', 'icns', 'ico', 'svg', 'eps', 'pdf'}
+
+LOCAL_HOSTS = {'127.0.0.1', '::1', 'localhost'}
+CHUNK_SIZE = 256 * 1024
+MAX_JSON_BYTES = 1024 * 1024
+
+HTTP_REASONS = {200: 'OK', 201: 'Created', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+                405: 'Method Not Allowed', 409: 'Conflict', 411: 'Length Required',
+                413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _content_length(headers):
+    """Content-Length 头的值，没有时为 0；格式错误时返回 400"""
+    value = headers.get('content-length')
+    if value is None:
+        return 0
+    if not (value.isascii() and value.isdigit()):
+        raise HTTPError(400, "无效的 Content-Length")
+    return int(value)
+
+
+def _ignore_interrupt():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def execute_job(kind, inputs, output_path, format=None, options=None):
+    """在工作进程中执行作业，返回 (实际输出路径, 附加到作业状态中的信息)
+
+    按目标大小或画质转换时附加信息为搜索到的质量、大小、SSIM 和是否达到目标（target_met）。
+    """
+    options = options or {}
+    if kind == 'convert':
+        from .image_utils import _convert_image
+        report = []
+        output_path = _convert_image(inputs[0], output_path, format, search_report=report, **options)
+        if not report:
+            return output_path, {}
+        search = report[0]
+        return output_path, {'quality': search.quality, 'ssim': search.ssim, 'target_met': search.met}
+    if kind == 'gif':
+        from .image_utils import merge_gif
+        if options.get('size'):
+            options['size'] = tuple(options['size'])
+        merge_gif(inputs, output_path, **options)
+    elif kind == 'merge':
+        from .pdf_utils import merge_pdfs
+        merge_pdfs(inputs, output_path, **options)
+    elif kind == 'img2pdf':
+        from .pdf_utils import images_to_pdf
+        images_to_pdf(inputs, output_path)
+    return output_path, {}
+
+
+class Job:
+    __slots__ = ('id', 'kind', 'inputs', 'format', 'options', 'priority', 'status', 'error',
+                 'output_path', 'details', 'created', 'started', 'finished')
+
+    def __init__(self, kind, inputs, format, options, priority):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.inputs = inputs
+        self.format = format
+        self.options = options
+        self.priority = priority
+        self.status = 'queued'
+        self.error = None
+        self.output_path = None
+        self.details = {}
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        info = {'job': self.id, 'type': self.kind, 'status': self.status, 'priority': self.priority,
+                'created': self.created, 'started': self.started, 'finished': self.finished}
+        if self.error:
+            info['error'] = self.error
+        if self.status == 'done':
+            info['size'] = os.path.getsize(self.output_path)
+            info['filename'] = os.path.basename(self.output_path)
+            info.update(self.details)
+        return info
+
+
+class JobServer:
+    """作业服务
+
+    max_concurrent 为同时执行的作业数（默认等于进程数），max_queue 为排队作业数上限，
+    队列满时提交返回 503；max_uploads 为同时接收的上传数，超出的上传在读取请求体前等待，
+    客户端的发送因 TCP 流控而暂停。完成的作业结果保留 result_ttl 秒。
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, unix_path=None, workers=None, max_concurrent=None,
+                 max_queue=1000, max_uploads=8, max_upload_bytes=1024 * 1024 * 1024, result_ttl=3600,
+                 work_dir=None):
+        # 服务没有身份验证，只允许监听本机地址
+        if unix_path is None and host not in LOCAL_HOSTS:
+            raise ValueError(f"只能监听本机地址: {host}")
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrent = max_concurrent or self.workers
+        self.max_queue = max_queue
+        self.max_upload_bytes = max_upload_bytes
+        self.result_ttl = result_ttl
+        self.work_dir = work_dir or tempfile.mkdtemp(prefix='pyhandle-server-')
+        self._own_work_dir = work_dir is None
+        self._upload_slots = asyncio.Semaphore(max_uploads)
+        self._queue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs = {}
+        self._uploads = {}  # id -> (路径, 创建时间)
+        self._running = 0
+        self._executor = None
+        self._server = None
+        self._tasks = []
+        self._connections = {}  # 连接处理任务 -> writer
+
+    # ---- 生命周期 ----
+
+    async def start(self):
+        os.makedirs(os.path.join(self.work_dir, 'uploads'), exist_ok=True)
+        os.makedirs(os.path.join(self.work_dir, 'jobs'), exist_ok=True)
+        self._executor = self._new_executor()
+        if self.unix_path:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=self.unix_path)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+            # port=0 时由系统分配端口
+            self.port = self._server.sockets[0].getsockname()[1]
+        self._tasks = [asyncio.create_task(self._dispatch()) for _ in range(self.max_concurrent)]
+        self._tasks.append(asyncio.create_task(self._cleanup()))
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        # 关闭空闲的长连接，让处理任务正常结束
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        if self.unix_path and os.path.exists(self.unix_path):
+            os.unlink(self.unix_path)
+        if self._own_work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    @property
+    def address(self):
+        return self.unix_path or f"http://{self.host}:{self.port}"
+
+    # ---- 作业调度 ----
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupt)
+
+    def _submit(self, fn, *args):
+        """提交到进程池；工作进程异常退出使进程池损坏后换新的进程池
+
+        损坏时在途的作业都以 BrokenProcessPool 结束并失败，之后的作业在新的进程池中照常执行。
+        """
+        try:
+            return self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._executor.shutdown(wait=False)
+            self._executor = self._new_executor()
+            return self._executor.submit(fn, *args)
+
+    async def _dispatch(self):
+        while True:
+            _, _, job = await self._queue.get()
+            if job.status != 'queued':
+                continue  # 已取消
+            job.status = 'running'
+            job.started = time.time()
+            self._running += 1
+            output_dir = os.path.join(self.work_dir, 'jobs', job.id)
+            os.makedirs(output_dir, exist_ok=True)
+            output_path = os.path.join(output_dir, self._output_name(job))
+            try:
+                job.output_path, job.details = await asyncio.wrap_future(
+                    self._submit(execute_job, job.kind, job.inputs, output_path, job.format, job.options))
+                job.status = 'done'
+            except BrokenProcessPool:
+                job.status = 'failed'
+                job.error = "作业进程异常退出（可能是内存不足或解码器崩溃）"
+            except Exception as e:
+                job.status = 'failed'
+                job.error = str(e) or type(e).__name__
+            finally:
+                self._running -= 1
+                job.finished = time.time()
+                self._remove_inputs(job)
+
+    def _output_name(self, job):
+        if job.kind == 'convert':
+            base = os.path.splitext(os.path.basename(job.inputs[0]))[0].split('-', 1)[-1]
+            return f"{base}.{job.format}"
+        return {'gif': 'result.gif', 'merge': 'merged.pdf', 'img2pdf': 'images.pdf'}[job.kind]
+
+    def _remove_inputs(self, job):
+        for path in job.inputs:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    async def _cleanup(self, interval=60):
+        """定期删除过期的作业结果和未使用的上传"""
+        while True:
+            await asyncio.sleep(interval)
+            deadline = time.time() - self.result_ttl
+            for job_id, job in list(self._jobs.items()):
+                if job.finished and job.finished < deadline:
+                    self._delete_job(job)
+            for upload_id, (path, created) in list(self._uploads.items()):
+                if created < deadline:
+                    del self._uploads[upload_id]
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+
+    def _delete_job(self, job):
+        self._jobs.pop(job.id, None)
+        shutil.rmtree(os.path.join(self.work_dir, 'jobs', job.id), ignore_errors=True)
+
+    def submit(self, kind, upload_ids, format=None, options=None, priority=0):
+        """校验参数并把作业放入队列，返回 Job"""
+        if not isinstance(kind, str) or kind not in JOB_OPTIONS:
+            raise HTTPError(400, f"未知的作业类型: {kind}")
+        if not isinstance(upload_ids, list) or not all(isinstance(upload_id, str) for upload_id in upload_ids):
+            raise HTTPError(400, "uploads 必须是上传 id 的列表")
+        if options is not None and not isinstance(options, dict):
+            raise HTTPError(400, "options 必须是 JSON 对象")
+        if isinstance(priority, bool):
+            raise HTTPError(400, "priority 必须是整数")
+        try:
+            priority = int(priority)
+        except (TypeError, ValueError):
+            raise HTTPError(400, "priority 必须是整数")
+        options = dict(options or {})
+        unknown = set(options) - JOB_OPTIONS[kind]
+        if unknown:
+            raise HTTPError(400, f"不支持的选项: {', '.join(sorted(unknown))}")
+        if kind == 'convert':
+            if not isinstance(format, str) or format not in CONVERT_FORMATS:
+                raise HTTPError(400, f"不支持的目标格式: {format}")
+            if len(upload_ids) != 1:
+                raise HTTPError(400, "convert 作业只能有一个输入")
+        elif not upload_ids:
+            raise HTTPError(400, "没有输入文件")
+        if kind == 'merge' and options.get('page_ranges') is not None:
+            if not isinstance(options['page_ranges'], list):
+                raise HTTPError(400, "page_ranges 必须是列表")
+            if len(options['page_ranges']) != len(upload_ids):
+                raise HTTPError(400, "page_ranges 的数量必须与输入一致")
+        missing = [upload_id for upload_id in upload_ids if upload_id not in self._uploads]
+        if missing:
+            raise HTTPError(404, f"上传不存在: {', '.join(missing)}")
+        if self._queue.qsize() >= self.max_queue:
+            raise HTTPError(503, "作业队列已满")
+
+        # 同一个上传可以在一个作业中出现多次，但只能被一个作业使用
+        inputs = [self._uploads[upload_id][0] for upload_id in upload_ids]
+        for upload_id in set(upload_ids):
+            del self._uploads[upload_id]
+        job = Job(kind, inputs, format, options, priority)
+        self._jobs[job.id] = job
+        self._queue.put_nowait((-job.priority, next(self._seq), job))
+        return job
+
+    # ---- HTTP ----
+
+    async def _handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, query, headers = request
+                try:
+                    keep_alive = await self._route(method, path, query, headers, reader, writer)
+                except HTTPError as e:
+                    # 请求体未读完时无法继续使用这个连接
+                    keep_alive = self._body_consumed(headers)
+                    await self._send_json(writer, e.status, {'error': str(e)},
+                                          None if keep_alive else {'Connection': 'close'})
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    # 服务的缺陷不应让客户端收不到响应；连接状态未知，发送后关闭
+                    traceback.print_exc()
+                    await self._send_json(writer, 500, {'error': str(e) or type(e).__name__},
+                                          {'Connection': 'close'})
+                    keep_alive = False
+                if not keep_alive or headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self._connections[task]
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return method.upper(), url.path.rstrip('/') or '/', query, headers
+
+    async def _iter_body(self, reader, headers):
+        """逐块读取请求体，支持 Content-Length 和 chunked 编码"""
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                try:
+                    size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                except ValueError:
+                    raise HTTPError(400, "无效的 chunked 编码")
+                if size == 0:
+                    await reader.readline()
+                    headers[':consumed'] = True
+                    return
+                while size:
+                    chunk = await reader.read(min(size, CHUNK_SIZE))
+                    if not chunk:
+                        raise asyncio.IncompleteReadError(b'', size)
+                    size -= len(chunk)
+                    yield chunk
+                await reader.readline()
+        remaining = _content_length(headers)
+        while remaining:
+            chunk = await reader.read(min(remaining, CHUNK_SIZE))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(chunk)
+            yield chunk
+        headers[':consumed'] = True
+
+    def _body_consumed(self, headers):
+        try:
+            length = _content_length(headers)
+        except HTTPError:
+            # 不知道请求体有多长
+            return False
+        if headers.get('transfer-encoding', '').lower() == 'chunked' or length:
+            return headers.get(':consumed', False)
+        return True
+
+    async def _read_json(self, reader, headers):
+        body = bytearray()
+        async for chunk in self._iter_body(reader, headers):
+            body.extend(chunk)
+            if len(body) > MAX_JSON_BYTES:
+                raise HTTPError(413, "请求体过大")
+        try:
+            return json.loads(body or b'{}')
+        except ValueError:
+            raise HTTPError(400, "无效的 JSON")
+
+    async def _send(self, writer, status, body=b'', content_type='application/json', extra_headers=None):
+        headers = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+                   f"Content-Type: {content_type}", f"Content-Length: {len(body)}"]
+        headers.extend(f"{name}: {value}" for name, value in (extra_headers or {}).items())
+        writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+        return True
+
+    async def _send_json(self, writer, status, data, extra_headers=None):
+        return await self._send(writer, status, json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                                extra_headers=extra_headers)
+
+    async def _route(self, method, path, query, headers, reader, writer):
+        parts = path.strip('/').split('/')
+        if path == '/uploads' and method == 'POST':
+            return await self._upload(query, headers, reader, writer)
+        if path == '/jobs' and method == 'POST':
+            data = await self._read_json(reader, headers)
+            if not isinstance(data, dict):
+                raise HTTPError(400, "请求体必须是 JSON 对象")
+            job = self.submit(data.get('type'), data.get('uploads') or [], data.get('format'),
+                              data.get('options'), data.get('priority', 0))
+            return await self._send_json(writer, 202, job.to_dict())
+        if path == '/status' and method == 'GET':
+            return await self._send_json(writer, 200, {
+                'queued': self._queue.qsize(), 'running': self._running, 'jobs': len(self._jobs),
+                'uploads': len(self._uploads), 'workers': self.workers, 'max_concurrent': self.max_concurrent})
+        if parts[0] == 'jobs' and len(parts) in (2, 3):
+            job = self._jobs.get(parts[1])
+            if job is None:
+                raise HTTPError(404, "作业不存在")
+            if len(parts) == 2 and method == 'GET':
+                return await self._send_json(writer, 200, job.to_dict())
+            if len(parts) == 2 and method == 'DELETE':
+                if job.status == 'running':
+                    raise HTTPError(409, "作业正在执行，无法取消")
+                if job.status == 'queued':
+                    job.status = 'cancelled'
+                    self._remove_inputs(job)
+                self._delete_job(job)
+                return await self._send_json(writer, 200, {'job': job.id, 'status': job.status})
+            if len(parts) == 3 and parts[2] == 'result' and method == 'GET':
+                return await self._download(job, writer)
+        raise HTTPError(404 if method in ('GET', 'POST', 'DELETE') else 405, "未知的请求")
+
+    async def _upload(self, query, headers, reader, writer):
+        """把请求体流式写入临时文件；同时进行的上传数受限，内存中只有一个数据块"""
+        if 'content-length' not in headers and headers.get('transfer-encoding', '').lower() != 'chunked':
+            raise HTTPError(411, "需要 Content-Length 或 chunked 编码")
+        if _content_length(headers) > self.max_upload_bytes:
+            raise HTTPError(413, "上传文件过大")
+        name = os.path.basename(query.get('name') or 'upload')
+        upload_id = uuid.uuid4().hex
+        # 保留原文件名（扩展名决定输入格式），加前缀避免重名
+        path = os.path.join(self.work_dir, 'uploads', f"{upload_id}-{name}")
+        size = 0
+        async with self._upload_slots:
+            try:
+                with open(path, 'wb') as f:
+                    async for chunk in self._iter_body(reader, headers):
+                        size += len(chunk)
+                        if size > self.max_upload_bytes:
+                            raise HTTPError(413, "上传文件过大")
+                        f.write(chunk)
+            except BaseException:
+                os.unlink(path)
+                raise
+        self._uploads[upload_id] = (path, time.time())
+        return await self._send_json(writer, 201, {'upload': upload_id, 'size': size})
+
+    async def _download(self, job, writer):
+        """分块发送结果文件，每块等待发送缓冲区排空，慢速客户端不会占用大量内存"""
+        if job.status != 'done':
+            raise HTTPError(409, f"作业状态为 {job.status}")
+        size = os.path.getsize(job.output_path)
+        headers = (f"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\nContent-Length: {size}\r\n"
+                   f"Content-Disposition: attachment; filename=\"{os.path.basename(job.output_path)}\"\r\n\r\n")
+        writer.write(headers.encode('latin-1'))
+        with open(job.output_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                writer.write(chunk)
+                await writer.drain()
+        return True
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class JobClient:
+    """同步客户端，address 为 http://host:port 或 Unix 套接字路径"""
+
+    def __init__(self, address='http://127.0.0.1:8765', timeout=None):
+        if address.startswith('http://'):
+            url = urlsplit(address)
+            self._connect = lambda: http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+        else:
+            self._connect = lambda: _UnixHTTPConnection(address, timeout=timeout)
+        self._conn = None
+
+    def _request(self, method, path, body=None, headers=None):
+        if self._conn is None:
+            self._conn = self._connect()
+        self._conn.request(method, path, body=body, headers=headers or {})
+        response = self._conn.getresponse()
+        if response.status >= 400:
+            data = response.read()
+            try:
+                message = json.loads(data)['error']
+            except (ValueError, KeyError):
+                message = data.decode('utf-8', 'replace')
+            raise HTTPError(response.status, message)
+        return response
+
+    def _json(self, method, path, data=None):
+        body = None if data is None else json.dumps(data).encode('utf-8')
+        return json.loads(self._request(method, path, body, {'Content-Type': 'application/json'}).read())
+
+    def upload(self, path):
+        """流式上传文件，返回上传 id"""
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            response = self._request('POST', '/uploads?' + urlencode({'name': os.path.basename(path)}), f,
+                                     {'Content-Length': str(size)})
+            return json.loads(response.read())['upload']
+
+    def submit(self, kind, paths, format=None, options=None, priority=0):
+        uploads = [self.upload(path) for path in paths]
+        return self._json('POST', '/jobs', {'type': kind, 'uploads': uploads, 'format': format,
+                                            'options': options or {}, 'priority': priority})['job']
+
+    def status(self, job_id=None):
+        return self._json('GET', f"/jobs/{job_id}" if job_id else '/status')
+
+    def cancel(self, job_id):
+        return self._json('DELETE', f"/jobs/{job_id}")
+
+    def wait(self, job_id, interval=0.1, timeout=None):
+        """轮询直到作业结束，返回最终状态"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            info = self.status(job_id)
+            if info['status'] in ('done', 'failed', 'cancelled'):
+                return info
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"作业 {job_id} 未在 {timeout} 秒内完成")
+            time.sleep(interval)
+
+    def download(self, job_id, output_path):
+        """把结果分块写入 output_path"""
+        response = self._request('GET', f"/jobs/{job_id}/result")
+        with open(output_path, 'wb') as f:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                f.write(chunk)
+        return output_path
+
+    def run(self, kind, paths, output_path, format=None, options=None, priority=0):
+        """提交作业、等待完成并下载结果，失败时抛出 RuntimeError"""
+        job_id = self.submit(kind, paths, format, options, priority)
+        info = self.wait(job_id)
+        if info['status'] != 'done':
+            raise RuntimeError(info.get('error') or info['status'])
+        self.download(job_id, output_path)
+        self.cancel(job_id)
+        return output_path
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def serve(**options):
+    """运行服务直到 Ctrl+C"""
+    server = JobServer(**options)
+
+    async def main():
+        await server.start()
+        print(f"作业服务已启动: {server.address}（{server.workers} 个工作进程）", flush=True)
+        try:
+            await server._server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
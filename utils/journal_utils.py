@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 批量转换时最多每隔这么多秒提交一次完成记录；崩溃时最多重做这段时间内完成的文件
+COMMIT_INTERVAL = 1.0
+
+
+def default_journal_path():
+    """默认作业日志：$XDG_STATE_HOME/pyhandle/journal.sqlite"""
+    base = os.environ.get('XDG_STATE_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(base, 'pyhandle', 'journal.sqlite')
+
+
+def _stat(path):
+    """(大小, 修改时间)，文件不存在时返回 (None, None)"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None, None
+    return st.st_size, st.st_mtime_ns
+
+
+class JobJournal:
+    """批量作业的进度日志（SQLite）
+
+    每个作业按类型和计划（输入、输出和选项）的哈希标识：同一计划再次运行时，
+    如果上次没有完成，就从日志中恢复已完成的单元；完成后删除记录，下次重新开始。
+    日志使用 WAL 模式，完成记录批量提交，不会拖慢转换。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_journal_path()
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, kind TEXT, plan TEXT, state TEXT, created REAL, updated REAL);
+                CREATE TABLE IF NOT EXISTS units (
+                    job TEXT, seq INTEGER, input TEXT, input_size INTEGER, input_mtime_ns INTEGER,
+                    output TEXT, output_size INTEGER, output_mtime_ns INTEGER, error TEXT,
+                    PRIMARY KEY (job, seq));
+                CREATE TABLE IF NOT EXISTS merge_objects (
+                    job TEXT, obj_id INTEGER, offset INTEGER, PRIMARY KEY (job, obj_id));
+                CREATE TABLE IF NOT EXISTS merge_pages (
+                    job TEXT, position INTEGER, page_id INTEGER, PRIMARY KEY (job, position));
+                CREATE TABLE IF NOT EXISTS merge_digests (
+                    job TEXT, digest BLOB, obj_id INTEGER, PRIMARY KEY (job, digest));
+            ''')
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def open_job(self, kind, plan):
+        """开始或恢复一个作业，返回 Job；plan 为可 JSON 序列化的计划"""
+        text = json.dumps(plan, ensure_ascii=False, sort_keys=True)
+        job_id = hashlib.sha1(f"{kind}\0{text}".encode('utf-8', 'surrogateescape')).hexdigest()
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None:
+                self.conn.execute('INSERT INTO jobs VALUES (?, ?, ?, NULL, ?, ?)',
+                                  (job_id, kind, text, now, now))
+                self.conn.commit()
+        return Job(self, job_id, resumed=row is not None, state=json.loads(row[0]) if row and row[0] else None)
+
+    def unfinished(self):
+        """未完成的作业：[(作业 id, 类型, 已完成的单元数, 最后更新时间)]"""
+        with self._lock:
+            return self.conn.execute('''
+                SELECT jobs.id, jobs.kind, COUNT(units.seq), jobs.updated FROM jobs
+                LEFT JOIN units ON units.job = jobs.id GROUP BY jobs.id ORDER BY jobs.updated
+            ''').fetchall()
+
+
+class Job:
+    """日志中的一个作业：查询和记录完成的单元"""
+
+    def __init__(self, journal, job_id, resumed=False, state=None):
+        self.journal = journal
+        self.id = job_id
+        self.resumed = resumed
+        self.state = state
+        self._last_commit = time.monotonic()
+
+    def _execute(self, sql, params=()):
+        return self.journal.conn.execute(sql, params)
+
+    def completed(self):
+        """已完成的单元：{序号: (输入, 输入大小, 输入修改时间, 输出, 输出大小, 输出修改时间, 错误)}"""
+        with self.journal._lock:
+            rows = self._execute('''SELECT seq, input, input_size, input_mtime_ns, output, output_size,
+                                    output_mtime_ns, error FROM units WHERE job = ?''', (self.id,)).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    @staticmethod
+    def still_valid(unit):
+        """快速验证完成记录：输入未变化，输出仍存在且未被改动（只做 stat，不读文件内容）"""
+        input_path, input_size, input_mtime_ns, output_path, output_size, output_mtime_ns, _ = unit
+        if _stat(input_path) != (input_size, input_mtime_ns):
+            return False
+        return output_path is None or _stat(output_path) == (output_size, output_mtime_ns)
+
+    def record(self, seq, input_path, output_path=None, error=None, commit=False):
+        """记录一个完成的单元，按 COMMIT_INTERVAL 批量提交；commit 为真时立即提交"""
+        input_size, input_mtime_ns = _stat(input_path)
+        output_size, output_mtime_ns = _stat(output_path) if output_path else (None, None)
+        with self.journal._lock:
+            self._execute('INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                          (self.id, seq, input_path, input_size, input_mtime_ns,
+                           output_path, output_size, output_mtime_ns, error))
+            if commit or time.monotonic() - self._last_commit >= COMMIT_INTERVAL:
+                self._commit()
+
+    def _commit(self):
+        self._execute('UPDATE jobs SET updated = ? WHERE id = ?', (time.time(), self.id))
+        self.journal.conn.commit()
+        self._last_commit = time.monotonic()
+
+    def flush(self):
+        with self.journal._lock:
+            self._commit()
+
+    def checkpoint_merge(self, units, writer_state):
+        """记录合并写入器新增的状态（PdfStreamWriter.checkpoint 的结果），与这期间处理完的输入
+        units [(序号, 路径, 错误或 None)] 在同一事务中提交
+
+        调用前输出文件需已 fsync 到 writer_state['offset']。
+        """
+        rows = [(self.id, seq, path) + _stat(path) + (error,) for seq, path, error in units]
+        state = {key: writer_state[key] for key in ('offset', 'next_id', 'counters')}
+        with self.journal._lock:
+            conn = self.journal.conn
+            conn.executemany('INSERT OR REPLACE INTO merge_objects VALUES (?, ?, ?)',
+                             [(self.id, obj_id, offset) for obj_id, offset in writer_state['objects']])
+            conn.executemany('INSERT OR REPLACE INTO merge_pages VALUES (?, ?, ?)',
+                             [(self.id, position, page_id) for position, page_id in writer_state['pages']])
+            conn.executemany('INSERT OR REPLACE INTO merge_digests VALUES (?, ?, ?)',
+                             [(self.id, digest, obj_id) for digest, obj_id in writer_state['digests']])
+            conn.executemany('INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, ?, NULL, NULL, NULL, ?)', rows)
+            conn.execute('UPDATE jobs SET state = ? WHERE id = ?', (json.dumps(state), self.id))
+            self._commit()
+        self.state = state
+
+    def merge_state(self):
+        """恢复 PdfStreamWriter 所需的全部状态（格式同 PdfStreamWriter.checkpoint），没有检查点时返回 None"""
+        if not self.state:
+            return None
+        with self.journal._lock:
+            objects = self._execute('SELECT obj_id, offset FROM merge_objects WHERE job = ?',
+                                    (self.id,)).fetchall()
+            pages = self._execute('SELECT position, page_id FROM merge_pages WHERE job = ? ORDER BY position',
+                                  (self.id,)).fetchall()
+            digests = self._execute('SELECT digest, obj_id FROM merge_digests WHERE job = ?',
+                                    (self.id,)).fetchall()
+        return dict(self.state, objects=objects, pages=pages, digests=digests)
+
+    def reset(self):
+        """丢弃已记录的进度（验证失败时从头开始）"""
+        with self.journal._lock:
+            self._delete_progress()
+            self._execute('UPDATE jobs SET state = NULL WHERE id = ?', (self.id,))
+            self._commit()
+        self.state = None
+        self.resumed = False
+
+    def finish(self):
+        """作业完成，删除全部记录"""
+        with self.journal._lock:
+            self._delete_progress()
+            self._execute('DELETE FROM jobs WHERE id = ?', (self.id,))
+            self.journal.conn.commit()
+
+    def _delete_progress(self):
+        for table in ('units', 'merge_objects', 'merge_pages', 'merge_digests'):
+            self._execute(f'DELETE FROM {table} WHERE job = ?', (self.id,))
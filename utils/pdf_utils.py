@@ -0,0 +1,813 @@
+import hashlib
+import os
+import struct
+import time
+import zlib
+from bisect import bisect_left
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from io import BytesIO
+
+import PyPDF2
+from PyPDF2.generic import (ArrayObject, ByteStringObject, DecodedStreamObject, DictionaryObject,
+                            EncodedStreamObject, FloatObject, IndirectObject, NameObject,
+                            NullObject, NumberObject, StreamObject)
+
+from .io_utils import RANDOM, WILLNEED, open_input, read_all, source_size
+from .profiling import stage
+
+PDF_HEADER = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+
+# 图片模式对应的 PDF 颜色空间
+COLOR_SPACES = {'L': '/DeviceGray', 'RGB': '/DeviceRGB', 'CMYK': '/DeviceCMYK'}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# 带日志合并时最多每隔这么多秒提交一次检查点（每次需要 fsync 输出文件）
+CHECKPOINT_INTERVAL = 1.0
+
+# 页面可以从页面树中的父节点继承的属性
+INHERITABLE_ATTRS = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+
+
+# 预先探测到的 PDF 信息：页数、文件大小、是否加密，无法打开时 error 为错误信息
+PdfInfo = namedtuple('PdfInfo', ['pages', 'size', 'encrypted', 'error'])
+
+
+# 合并时去重和压缩的统计：写出的对象数、跳过的重复对象数及其字节数、压缩节省的字节数
+DedupReport = namedtuple('DedupReport', ['objects', 'duplicates', 'duplicate_bytes', 'compressed_bytes'])
+
+
+class MergeCancelled(Exception):
+    """合并被取消"""
+
+
+class _NotShareable(Exception):
+    """对象子图中有环、过深或包含不能共享的对象，改为按输入逐个写出"""
+
+
+class _CopyContext:
+    """复制单个输入时的状态
+
+    id_map: 源对象 (编号, 代数) -> 输出编号；skip_refs: 不复制、引用处置空的对象；
+    unshared: 不参与跨文档去重的对象（也包括正在去重、尚未写出的对象，用于发现环）。
+    """
+    __slots__ = ('id_map', 'skip_refs', 'unshared', 'depth')
+
+    def __init__(self):
+        self.id_map = {}
+        self.skip_refs = set()
+        self.unshared = set()
+        self.depth = 0
+
+
+class PdfStreamWriter:
+    """逐页写出的 PDF 写入器
+
+    与 PyPDF2.PdfWriter 不同，页面及其引用的对象在添加时立即序列化到文件，
+    内存中只保留对象偏移表和页面编号，因此合并时的内存占用只取决于
+    当前正在读取的单个输入文件。
+
+    dedup 为真时对字体、图片、ICC 配置、表单 XObject 等对象按内容哈希去重，
+    不同输入中内容相同的对象只写一次；compress 为真时把未压缩的流压缩为 FlateDecode。
+    """
+
+    CATALOG_ID = 1
+    PAGES_ID = 2
+    # 深度优先去重时的最大嵌套深度，更深的对象链按普通方式复制
+    MAX_SHARED_DEPTH = 32
+
+    def __init__(self, fp, dedup=False, compress=False, state=None):
+        self.fp = fp
+        self.dedup = dedup
+        self.compress = compress
+        self._offsets = {}
+        self._next_id = 3
+        self._page_ids = []
+        self._pages_ref = IndirectObject(self.PAGES_ID, 0, None)
+        self._digests = {}
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+        self.compressed_bytes = 0
+        # 上次 checkpoint() 时的位置，之后新增的对象、页面和哈希在下次 checkpoint() 时返回
+        self._checkpoint_id = self._next_id
+        self._checkpoint_pages = 0
+        self._new_digests = []
+        if state is None:
+            self.fp.write(PDF_HEADER)
+        else:
+            self._restore(state)
+
+    def checkpoint(self):
+        """返回上次调用以来新增的写入状态，用于断点续写
+
+        offset 为当前写到的位置；objects、pages、digests 为新增的 (编号, 偏移)、(位置, 页面编号)、
+        (哈希, 编号)。把各次结果合并后传给构造函数的 state，即可截断到 offset 继续写入。
+        """
+        state = {
+            'offset': self.fp.tell(),
+            'next_id': self._next_id,
+            'counters': [self.duplicates, self.duplicate_bytes, self.compressed_bytes],
+            # 每个输入分配的对象都在该输入内写出，新增的对象编号都不小于上次的 _next_id
+            'objects': [(obj_id, self._offsets[obj_id]) for obj_id in range(self._checkpoint_id, self._next_id)
+                        if obj_id in self._offsets],
+            'pages': list(enumerate(self._page_ids[self._checkpoint_pages:], self._checkpoint_pages)),
+            'digests': self._new_digests,
+        }
+        self._checkpoint_id = self._next_id
+        self._checkpoint_pages = len(self._page_ids)
+        self._new_digests = []
+        return state
+
+    def _restore(self, state):
+        self._offsets = dict(state['objects'])
+        self._next_id = self._checkpoint_id = state['next_id']
+        self._page_ids = [page_id for _, page_id in sorted(state['pages'])]
+        self._checkpoint_pages = len(self._page_ids)
+        self._digests = {bytes(digest): obj_id for digest, obj_id in state['digests']}
+        self.duplicates, self.duplicate_bytes, self.compressed_bytes = state['counters']
+
+    @property
+    def page_count(self):
+        return len(self._page_ids)
+
+    @property
+    def report(self):
+        return DedupReport(len(self._offsets), self.duplicates, self.duplicate_bytes, self.compressed_bytes)
+
+    def _alloc(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write_object(self, obj_id, obj, data=None):
+        # 先完整序列化再写入，避免异常时留下半个对象
+        if self.compress and isinstance(obj, DecodedStreamObject):
+            obj, data = self._compressed(obj), None
+        if data is None:
+            data = _serialize(obj)
+        self._offsets[obj_id] = self.fp.tell()
+        self.fp.write(f"{obj_id} 0 obj\n".encode() + data + b"\nendobj\n")
+
+    def _compressed(self, stream):
+        """未压缩的流压缩后更小时返回 FlateDecode 流，否则原样返回"""
+        packed = zlib.compress(stream._data)
+        if len(packed) >= len(stream._data):
+            return stream
+        self.compressed_bytes += len(stream._data) - len(packed)
+        copy = EncodedStreamObject()
+        copy._data = packed
+        for key, item in stream.items():
+            copy[key] = item
+        copy[NameObject('/Filter')] = NameObject('/FlateDecode')
+        return copy
+
+    def _write_new(self, obj):
+        obj_id = self._alloc()
+        self._write_object(obj_id, obj)
+        return obj_id
+
+    def _write_unique(self, obj):
+        """按内容写出对象：已写过相同内容的对象时直接返回其编号"""
+        data = _serialize(obj)
+        digest = hashlib.sha1(data).digest()
+        obj_id = self._digests.get(digest)
+        if obj_id is None:
+            obj_id = self._digests[digest] = self._alloc()
+            self._new_digests.append((digest, obj_id))
+            self._write_object(obj_id, obj, data)
+        else:
+            self.duplicates += 1
+            self.duplicate_bytes += len(data)
+        return obj_id
+
+    def _remap(self, value, ctx, queue):
+        """复制对象，把源文件中的间接引用替换为输出文件中的新编号
+
+        queue 为 None 时处于去重复制中，遇到不能共享的引用抛出 _NotShareable。
+        """
+        if isinstance(value, IndirectObject):
+            key = (value.idnum, value.generation)
+            if key in ctx.skip_refs:
+                return NullObject()
+            if key not in ctx.id_map:
+                # 指向未选中页面或页面树节点的引用（如链接目标）置空，避免把整页拖进来
+                obj = value.get_object()
+                if isinstance(obj, DictionaryObject) and obj.get('/Type') in ('/Page', '/Pages'):
+                    ctx.skip_refs.add(key)
+                    return NullObject()
+                if not (self.dedup and self._copy_shared(key, obj, ctx)):
+                    if queue is None:
+                        raise _NotShareable()
+                    ctx.id_map[key] = self._alloc()
+                    queue.append((value, ctx.id_map[key]))
+            return IndirectObject(ctx.id_map[key], 0, None)
+        if isinstance(value, DictionaryObject):
+            if isinstance(value, StreamObject):
+                copy = EncodedStreamObject() if '/Filter' in value else DecodedStreamObject()
+                copy._data = value._data
+            else:
+                copy = DictionaryObject()
+            for key, item in value.items():
+                copy[NameObject(key)] = self._remap(item, ctx, queue)
+            return copy
+        if isinstance(value, ArrayObject):
+            return ArrayObject(self._remap(item, ctx, queue) for item in value)
+        return value
+
+    def _copy_shared(self, key, obj, ctx):
+        """深度优先复制对象及其引用的对象并按内容去重，成功时返回真
+
+        子对象先写出，父对象序列化后的内容才与其它文档中的相同对象一致。
+        有环、过深或包含注释的子图放弃去重，由调用方按普通方式复制。
+        """
+        if key in ctx.unshared or ctx.depth >= self.MAX_SHARED_DEPTH or not _shareable(obj):
+            ctx.unshared.add(key)
+            return False
+        ctx.unshared.add(key)
+        ctx.depth += 1
+        try:
+            copy = self._remap(obj, ctx, None)
+        except _NotShareable:
+            return False
+        finally:
+            ctx.depth -= 1
+        ctx.unshared.discard(key)
+        ctx.id_map[key] = self._write_unique(copy)
+        return True
+
+    def iter_add_pages(self, reader, page_indices=None, source=None):
+        """把 reader 中的页面写入输出，每写完一页产出一次已写页数
+
+        page_indices 为要复制的页面序号（从 0 开始，可重复、可乱序），默认为全部页面。
+        只解析选中的页面及其引用的对象，source 为输入文件路径，只用于阶段计时记录。
+        """
+        if page_indices is None:
+            page_indices = range(pdf_page_count(reader))
+        selected = select_pages(reader, page_indices)
+
+        # 先为选中的页面分配编号，页面之间的链接才能保留
+        ctx = _CopyContext()
+        for ref, _, _ in selected:
+            ctx.id_map.setdefault((ref.idnum, ref.generation), None)
+        for key in ctx.id_map:
+            ctx.id_map[key] = self._alloc()
+
+        # 同一输入内共享的对象（字体、图片等）只写一次
+        copied = set()
+        for written, (ref, page, inherited) in enumerate(selected, 1):
+            key = (ref.idnum, ref.generation)
+            # 同一页被选中多次时，之后的副本使用新编号
+            page_id = self._alloc() if key in copied else ctx.id_map[key]
+            copied.add(key)
+            with stage('copy', source) as s:
+                start = self.fp.tell()
+                self._copy_page(page, inherited, page_id, ctx)
+                s.bytes = self.fp.tell() - start
+            self._page_ids.append(page_id)
+            yield written
+
+    def _copy_page(self, page, inherited, page_id, ctx):
+        """以 page_id 写出页面及其引用的全部对象，inherited 为从页面树继承的属性"""
+        queue = deque()
+        page_copy = DictionaryObject()
+        for name, item in page.items():
+            if name == '/Parent':
+                continue
+            page_copy[NameObject(name)] = self._remap(item, ctx, queue)
+        for name, item in inherited.items():
+            if name not in page_copy:
+                page_copy[NameObject(name)] = self._remap(item, ctx, queue)
+        page_copy[NameObject('/Parent')] = self._pages_ref
+        self._write_object(page_id, page_copy)
+
+        while queue:
+            src_ref, obj_id = queue.popleft()
+            obj = src_ref.get_object()
+            if obj is None:
+                obj = NullObject()
+            self._write_object(obj_id, self._remap(obj, ctx, queue))
+
+    def add_image_page(self, img, raw=None):
+        """把一张图片写成单独的一页，页面大小按图片的 DPI（默认 72）换算
+
+        raw 为该图片未经修改的 JPEG 文件内容时直接作为 DCTDecode 流嵌入，
+        不解码也不重新压缩；其它情况压缩为 FlateDecode，透明通道写为软遮罩。
+        """
+        image, smask = image_xobject(img, raw)
+        if smask is not None:
+            smask_id = self._write_unique(smask) if self.dedup else self._write_new(smask)
+            image[NameObject('/SMask')] = IndirectObject(smask_id, 0, None)
+        image_id = self._write_unique(image) if self.dedup else self._write_new(image)
+
+        dpi = img.info.get('dpi') or (72, 72)
+        width = img.width * 72 / (dpi[0] or 72)
+        height = img.height * 72 / (dpi[1] or 72)
+        content = DecodedStreamObject()
+        content._data = f"q {width:.4f} 0 0 {height:.4f} 0 0 cm /Im0 Do Q".encode('ascii')
+        content_id = self._write_new(content)
+
+        page = DictionaryObject({
+            NameObject('/Type'): NameObject('/Page'),
+            NameObject('/Parent'): self._pages_ref,
+            NameObject('/MediaBox'): ArrayObject([NumberObject(0), NumberObject(0),
+                                                  FloatObject(width), FloatObject(height)]),
+            NameObject('/Resources'): DictionaryObject({
+                NameObject('/XObject'): DictionaryObject({
+                    NameObject('/Im0'): IndirectObject(image_id, 0, None)}),
+            }),
+            NameObject('/Contents'): IndirectObject(content_id, 0, None),
+        })
+        page_id = self._alloc()
+        self._write_object(page_id, page)
+        self._page_ids.append(page_id)
+
+    def add_pages(self, reader, page_indices=None):
+        """写入页面，返回写入的页数"""
+        written = 0
+        for written in self.iter_add_pages(reader, page_indices):
+            pass
+        return written
+
+    def close(self):
+        """写出页面树、目录、交叉引用表和文件尾"""
+        kids = ' '.join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_raw(self.PAGES_ID, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>")
+        self._write_raw(self.CATALOG_ID, f"<< /Type /Catalog /Pages {self.PAGES_ID} 0 R >>")
+
+        xref_offset = self.fp.tell()
+        size = self._next_id
+        lines = [f"xref\n0 {size}\n", "0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            offset = self._offsets.get(obj_id)
+            if offset is None:
+                lines.append("0000000000 65535 f \n")
+            else:
+                lines.append(f"{offset:010d} 00000 n \n")
+        lines.append(f"trailer\n<< /Size {size} /Root {self.CATALOG_ID} 0 R >>\n")
+        lines.append(f"startxref\n{xref_offset}\n%%EOF\n")
+        self.fp.write(''.join(lines).encode('ascii'))
+
+    def _write_raw(self, obj_id, text):
+        self._offsets[obj_id] = self.fp.tell()
+        self.fp.write(f"{obj_id} 0 obj\n{text}\nendobj\n".encode('ascii'))
+
+
+def _serialize(obj):
+    buf = BytesIO()
+    obj.write_to_stream(buf, None)
+    return buf.getvalue()
+
+
+def _shareable(obj):
+    """对象能否与其它页面共享：注释（带 /Rect）只能属于一个页面"""
+    if isinstance(obj, DictionaryObject) and not isinstance(obj, StreamObject):
+        return obj.get('/Type') != '/Annot' and '/Rect' not in obj
+    return obj is not None
+
+
+def _stream(data, filter_name, **entries):
+    stream = EncodedStreamObject()
+    stream._data = data
+    stream[NameObject('/Filter')] = NameObject(filter_name)
+    for key, value in entries.items():
+        stream[NameObject('/' + key)] = value
+    return stream
+
+
+def image_xobject(img, raw=None):
+    """生成图片 XObject，返回 (图片流, 软遮罩流或 None)"""
+    common = {'Type': NameObject('/XObject'), 'Subtype': NameObject('/Image'),
+            'Width': NumberObject(img.width), 'Height': NumberObject(img.height),
+            'BitsPerComponent': NumberObject(8)}
+
+    if raw is not None and img.format == 'JPEG' and img.mode in COLOR_SPACES:
+        image = _stream(raw, '/DCTDecode', ColorSpace=NameObject(COLOR_SPACES[img.mode]), **common)
+        if img.mode == 'CMYK' and 'adobe' in img.info:
+            # Photoshop 写出的 CMYK JPEG 是反相存储的
+            image[NameObject('/Decode')] = ArrayObject([NumberObject(v) for v in (1, 0) * 4])
+        return image, None
+
+    if raw is not None and img.format == 'PNG':
+        image = png_xobject(raw)
+        if image is not None:
+            return image, None
+
+    alpha = None
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        if img.mode != 'LA':
+            img = img.convert('RGBA')
+        alpha = img.getchannel('A')
+        img = img.convert('L' if img.mode == 'LA' else 'RGB')
+    elif img.mode not in COLOR_SPACES:
+        img = img.convert('RGB')
+
+    image = _stream(zlib.compress(img.tobytes()), '/FlateDecode',
+                    ColorSpace=NameObject(COLOR_SPACES[img.mode]), **common)
+    smask = None
+    if alpha is not None and alpha.getextrema() != (255, 255):
+        smask = _stream(zlib.compress(alpha.tobytes()), '/FlateDecode',
+                        ColorSpace=NameObject('/DeviceGray'), **common)
+    return image, smask
+
+
+def png_xobject(raw):
+    """把 PNG 的 IDAT 数据直接作为 FlateDecode 流嵌入
+
+    PDF 的 PNG 预测器与 PNG 的逐行过滤相同，因此压缩数据无需解码。
+    只处理不含透明度且非隔行扫描的灰度、RGB 和调色板图片，其它情况返回 None。
+    """
+    if bytes(raw[:len(PNG_SIGNATURE)]) != PNG_SIGNATURE:
+        return None
+    pos = len(PNG_SIGNATURE)
+    header = palette = None
+    idat = []
+    while pos + 8 <= len(raw):
+        length, chunk_type = struct.unpack(">I4s", raw[pos:pos + 8])
+        data = raw[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if chunk_type == b"IHDR":
+            header = struct.unpack(">IIBBBBB", data)
+        elif chunk_type == b"PLTE":
+            palette = data
+        elif chunk_type == b"IDAT":
+            idat.append(data)
+        elif chunk_type == b"tRNS":
+            return None
+        elif chunk_type == b"IEND":
+            break
+    if header is None or not idat:
+        return None
+
+    width, height, bit_depth, color_type, _, _, interlace = header
+    colors = {0: 1, 2: 3, 3: 1}.get(color_type)
+    if colors is None or interlace:
+        return None
+    if color_type == 3:
+        if palette is None:
+            return None
+        color_space = ArrayObject([NameObject('/Indexed'), NameObject('/DeviceRGB'),
+                                   NumberObject(len(palette) // 3 - 1), ByteStringObject(palette)])
+    else:
+        color_space = NameObject('/DeviceGray' if color_type == 0 else '/DeviceRGB')
+
+    return _stream(b"".join(idat), '/FlateDecode',
+                   Type=NameObject('/XObject'), Subtype=NameObject('/Image'),
+                   Width=NumberObject(width), Height=NumberObject(height),
+                   BitsPerComponent=NumberObject(bit_depth), ColorSpace=color_space,
+                   DecodeParms=DictionaryObject({
+                       NameObject('/Predictor'): NumberObject(15),
+                       NameObject('/Colors'): NumberObject(colors),
+                       NameObject('/BitsPerComponent'): NumberObject(bit_depth),
+                       NameObject('/Columns'): NumberObject(width),
+                   }))
+
+
+def image_to_pdf(img, output_path, raw=None):
+    """把单张图片保存为一页 PDF，raw 的含义见 PdfStreamWriter.add_image_page"""
+    with open(output_path, 'wb') as fp:
+        writer = PdfStreamWriter(fp)
+        writer.add_image_page(img, raw)
+        writer.close()
+    return output_path
+
+
+def pdf_page_count(reader):
+    """从页面树根节点的 /Count 读取页数
+
+    PyPDF2 的 len(reader.pages) 会展开并解析整棵页面树，/Count 无效时才退回这种方式。
+    """
+    try:
+        count = reader.trailer['/Root']['/Pages']['/Count']
+        if isinstance(count, int) and count >= 0:
+            return int(count)
+    except Exception:
+        pass
+    return len(reader.pages)
+
+
+def parse_page_ranges(text, page_count):
+    """把 "1-3,5,8-" 形式的页码范围（从 1 开始）解析为页面序号列表（从 0 开始）
+
+    "8-" 表示第 8 页到最后一页，"-3" 表示第 1 到 3 页，"5-3" 表示倒序；
+    格式错误或页码超出范围时抛出 ValueError。
+    """
+    indices = []
+    for part in text.replace('，', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        try:
+            first = int(first) if first.strip() else 1
+            last = (int(last) if last.strip() else page_count) if sep else first
+        except ValueError:
+            raise ValueError(f"无效的页码范围: {part}")
+        for number in (first, last):
+            if not 1 <= number <= page_count:
+                raise ValueError(f"页码 {number} 超出范围（共 {page_count} 页）")
+        step = 1 if last >= first else -1
+        indices.extend(range(first - 1, last - 1 + step, step))
+    if not indices:
+        raise ValueError("页码范围为空")
+    return indices
+
+
+def select_pages(reader, page_indices):
+    """按 page_indices 的顺序返回 [(页面引用, 页面字典, 继承的属性)]
+
+    沿页面树按各节点的 /Count 只进入包含选中页面的子树，不展开整棵树，
+    未选中的页面不会被复制或解析其内容。页面树损坏时退回 PyPDF2 的完整展开。
+    """
+    wanted = sorted(set(page_indices))
+    found = {}
+    if wanted:
+        try:
+            _walk_page_tree(reader.trailer['/Root'].raw_get('/Pages'), 0, {}, wanted, found, set())
+        except Exception:
+            found = {}
+
+    selected = []
+    for index in page_indices:
+        if index not in found:
+            page = reader.pages[index]
+            found[index] = (page.indirect_reference, page, {})
+        selected.append(found[index])
+    return selected
+
+
+def _walk_page_tree(node_ref, start, inherited, wanted, found, visited):
+    """遍历页面树节点，把序号在 wanted 中的页面写入 found，返回该节点下的页数"""
+    node = node_ref.get_object()
+    if id(node) in visited:
+        raise PyPDF2.errors.PdfReadError("页面树存在循环引用")
+    visited.add(id(node))
+
+    inherited = dict(inherited)
+    for name in INHERITABLE_ATTRS:
+        if name in node:
+            inherited[name] = node.raw_get(name)
+
+    index = start
+    for kid_ref in node['/Kids']:
+        if index > wanted[-1]:
+            break
+        kid = kid_ref.get_object()
+        if '/Kids' not in kid:
+            if wanted[bisect_left(wanted, index)] == index:
+                found[index] = (kid_ref, kid, inherited)
+            index += 1
+            continue
+        count = kid.get('/Count')
+        position = bisect_left(wanted, index)
+        if isinstance(count, int) and (position == len(wanted) or wanted[position] >= index + count):
+            # 子树中没有选中的页面，整棵跳过
+            index += count
+            continue
+        index += _walk_page_tree(kid_ref, index, inherited, wanted, found, visited)
+    return index - start
+
+
+def open_pdf(file_path, fileobj):
+    """打开 PDF，加密文件尝试空密码解密，失败时抛出异常"""
+    pdf_reader = PyPDF2.PdfReader(fileobj)
+
+    # 处理加密PDF（尝试空密码解密）
+    if pdf_reader.is_encrypted:
+        if not pdf_reader.decrypt(""):
+            raise PyPDF2.errors.FileNotDecryptedError(f"{file_path} 加密无法合并")
+    return pdf_reader
+
+
+@contextmanager
+def _atomic_output(output_file, resume_offset=None):
+    """先写到同目录的临时文件，成功后原子替换，失败或取消时删除临时文件
+
+    resume_offset 不为空时续写上次留下的临时文件：截断到该位置后继续写入。
+    """
+    temp_path = output_file + '.part'
+    try:
+        with open(temp_path, 'wb' if resume_offset is None else 'r+b') as fp:
+            if resume_offset is not None:
+                fp.truncate(resume_offset)
+                fp.seek(resume_offset)
+            yield fp
+        os.replace(temp_path, output_file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def images_to_pdf(input_files, output_file, progress_callback=None, error_callback=None,
+                  cancel_event=None):
+    """把多张图片按顺序合成一个 PDF，每张图片一页
+
+    JPEG 和常见的 PNG 直接嵌入压缩数据，不解码也不重新压缩，输出大小接近输入之和；
+    其它图片压缩为 FlateDecode。每页写完立即落盘，内存只与单张图片有关。
+    回调和 cancel_event 的用法与 merge_pdfs 相同（每张图片视为一页），返回写入的页数。
+    """
+    # 只合并 PDF 时不需要 Pillow
+    from PIL import Image
+
+    with _atomic_output(output_file) as fp:
+        pdf_writer = PdfStreamWriter(fp)
+        file_count = len(input_files)
+
+        for file_index, file_path in enumerate(input_files):
+            if cancel_event is not None and cancel_event.is_set():
+                raise MergeCancelled()
+            try:
+                with open_input(file_path) as source:
+                    with stage('read', file_path) as s:
+                        raw = read_all(source)
+                        s.bytes = len(raw)
+                    # Image.open 只读取文件头，可直接嵌入的图片不会被解码，映射的数据直接写入输出
+                    source.seek(0)
+                    with stage('encode', file_path) as s, Image.open(source) as img:
+                        start = fp.tell()
+                        pdf_writer.add_image_page(img, raw)
+                        s.bytes = fp.tell() - start
+                    del raw
+            except Exception as e:
+                if error_callback is None:
+                    raise
+                error_callback(file_path, e)
+                continue
+            if progress_callback:
+                progress_callback(file_index, file_count, 1, 1)
+
+        pdf_writer.close()
+    return pdf_writer.page_count
+
+
+def probe_pdf(file_path):
+    """读取 PDF 的页数、大小和加密状态，不会抛出异常"""
+    try:
+        size = os.path.getsize(file_path)
+    except OSError as e:
+        return PdfInfo(None, None, False, str(e))
+    encrypted = False
+    try:
+        # 只读取交叉引用表和页面树的根节点，不预读整个文件
+        with open_input(file_path, RANDOM) as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            encrypted = pdf_reader.is_encrypted
+            if encrypted and not pdf_reader.decrypt(""):
+                return PdfInfo(None, size, True, "加密无法合并")
+            return PdfInfo(pdf_page_count(pdf_reader), size, encrypted, None)
+    except Exception as e:
+        return PdfInfo(None, size, encrypted, str(e) or type(e).__name__)
+
+
+def _merge_resume_point(job, temp_path):
+    """验证日志中的检查点，返回 (写入器状态, 下一个输入的序号)；无法续写时清空日志并返回 (None, 0)
+
+    只检查临时文件的长度和已合并输入的大小、修改时间，不读取文件内容。
+    """
+    state = job.merge_state()
+    if state is not None:
+        units = job.completed()
+        try:
+            part_size = os.path.getsize(temp_path)
+        except OSError:
+            part_size = -1
+        if (part_size >= state['offset'] and units and sorted(units) == list(range(len(units)))
+                and all(job.still_valid(unit) for unit in units.values())):
+            return state, len(units)
+    if job.resumed:
+        job.reset()
+    return None, 0
+
+
+def merge_pdfs(input_files, output_file, progress_callback=None, error_callback=None,
+               cancel_event=None, page_ranges=None, dedup=True, compress=False, report_callback=None,
+               journal=None):
+    """按顺序合并多个 PDF 文件
+
+    每个输入只解析一次，页面复制后立即写入磁盘。输出先写到同目录的临时文件，
+    成功后再原子替换，失败时不会留下半个文件。
+
+    page_ranges 为与 input_files 一一对应的页码范围（格式见 parse_page_ranges），
+    为空的项合并整个文件；只有选中的页面及其引用的对象会被读取和写出。
+    progress_callback(file_index, file_count, page_number, page_count) 每复制一页调用一次，
+    page_count 为该文件选中的页数；error_callback(file_path, error) 在某个输入无法处理
+    （包括页码范围无效）时调用，该文件被跳过。cancel_event（threading.Event）被设置后
+    在下一页之前抛出 MergeCancelled，临时文件会被删除。
+
+    dedup 和 compress 的含义见 PdfStreamWriter；合并完成后以 DedupReport 调用
+    report_callback。返回实际写入的页数。
+
+    传入 journal（journal_utils.JobJournal）时定期把写入进度记入日志，临时文件在崩溃后保留；
+    以相同的参数再次合并时验证检查点，从最后提交的输入之后继续写入，已合并的输入不再读取。
+    """
+    job, state, start = None, None, 0
+    if journal is not None:
+        job = journal.open_job('merge', {
+            'inputs': [os.path.abspath(path) for path in input_files], 'output': os.path.abspath(output_file),
+            'page_ranges': page_ranges, 'dedup': dedup, 'compress': compress})
+        state, start = _merge_resume_point(job, output_file + '.part')
+
+    with _atomic_output(output_file, state['offset'] if state else None) as fp:
+        pdf_writer = PdfStreamWriter(fp, dedup=dedup, compress=compress, state=state)
+        file_count = len(input_files)
+        # 上次检查点之后处理完的输入：(序号, 路径, 错误)
+        uncommitted = []
+        last_checkpoint = time.monotonic()
+
+        for file_index in range(start, file_count):
+            file_path = input_files[file_index]
+            if cancel_event is not None and cancel_event.is_set():
+                raise MergeCancelled()
+            if job is not None and uncommitted and time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL:
+                _checkpoint(job, fp, pdf_writer, uncommitted)
+                uncommitted = []
+                last_checkpoint = time.monotonic()
+            error = None
+            try:
+                selected = bool(page_ranges and page_ranges[file_index])
+                # 只提取部分页面时按需读取，合并整个文件时提前读入页缓存
+                with open_input(file_path, RANDOM if selected else WILLNEED) as file:
+                    with stage('parse', file_path) as s:
+                        pdf_reader = open_pdf(file_path, file)
+                        page_count = pdf_page_count(pdf_reader)
+                        s.bytes = source_size(file)
+
+                    page_indices = None
+                    if selected:
+                        page_indices = parse_page_ranges(page_ranges[file_index], page_count)
+                        page_count = len(page_indices)
+
+                    # 添加页面并更新进度
+                    for page_number in pdf_writer.iter_add_pages(pdf_reader, page_indices, source=file_path):
+                        if cancel_event is not None and cancel_event.is_set():
+                            raise MergeCancelled()
+                        if progress_callback:
+                            progress_callback(file_index, file_count, page_number, page_count)
+
+            except MergeCancelled:
+                raise
+            except Exception as e:
+                if error_callback is None:
+                    raise
+                error_callback(file_path, e)
+                error = str(e) or type(e).__name__
+            uncommitted.append((file_index, file_path, error))
+
+        pdf_writer.close()
+    if job is not None:
+        job.finish()
+    if report_callback:
+        report_callback(pdf_writer.report)
+    return pdf_writer.page_count
+
+
+def _checkpoint(job, fp, pdf_writer, units):
+    """把输出落盘后提交检查点，崩溃后可从这里续写"""
+    fp.flush()
+    os.fsync(fp.fileno())
+    job.checkpoint_merge(units, pdf_writer.checkpoint())
+
+
+def extract_pages(input_file, output_file, page_ranges, progress_callback=None, cancel_event=None):
+    """把 input_file 中 page_ranges 指定的页面按顺序提取为新的 PDF，返回写入的页数"""
+    return merge_pdfs([input_file], output_file, progress_callback=progress_callback,
+                      cancel_event=cancel_event, page_ranges=[page_ranges])
+
+
+def split_pdf(input_file, output_dir=None, chunk_size=1, progress_callback=None, cancel_event=None):
+    """把 PDF 按每 chunk_size 页拆分为多个文件，返回输出路径列表
+
+    输出命名为 <原名>-<序号>.pdf，默认写到源文件所在目录。输入只解析一次，
+    每个输出只包含对应页面引用的对象。progress_callback(chunk_index, chunk_count,
+    page_number, page_count) 每复制一页调用一次；取消时抛出 MergeCancelled，
+    已完成的文件保留，正在写的文件被删除。
+    """
+    if chunk_size < 1:
+        raise ValueError("每个文件的页数必须大于 0")
+    base = os.path.splitext(os.path.basename(input_file))[0]
+    output_dir = output_dir or os.path.dirname(os.path.abspath(input_file))
+
+    output_files = []
+    with open_input(input_file, WILLNEED) as file:
+        with stage('parse', input_file) as s:
+            pdf_reader = open_pdf(input_file, file)
+            page_count = pdf_page_count(pdf_reader)
+            s.bytes = source_size(file)
+
+        chunk_count = (page_count + chunk_size - 1) // chunk_size
+        width = len(str(chunk_count))
+        for chunk_index in range(chunk_count):
+            first = chunk_index * chunk_size
+            page_indices = range(first, min(first + chunk_size, page_count))
+            output_file = os.path.join(output_dir, f"{base}-{chunk_index + 1:0{width}d}.pdf")
+            with _atomic_output(output_file) as fp:
+                pdf_writer = PdfStreamWriter(fp, dedup=True)
+                for page_number in pdf_writer.iter_add_pages(pdf_reader, page_indices, source=input_file):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise MergeCancelled()
+                    if progress_callback:
+                        progress_callback(chunk_index, chunk_count, page_number, len(page_indices))
+                pdf_writer.close()
+            output_files.append(output_file)
+    return output_files
@@ -0,0 +1,291 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+
+from PIL import Image
+
+from .io_utils import open_input
+from .profiling import stage
+
+# 哈希算法变化时递增，使索引中的旧哈希失效
+HASH_VERSION = 1
+
+# 支持的感知哈希，均为 64 位：ahash 与均值比较，dhash 比较相邻像素，phash 比较 DCT 低频系数
+HASH_METHODS = ('ahash', 'dhash', 'phash')
+
+# 汉明距离不超过此值的两张图片视为重复（同一张照片的不同压缩、缩放版本通常在 4 以内）
+DUPLICATE_DISTANCE = 4
+
+# 多索引哈希：64 位哈希分成 4 段 16 位，每段单独建索引。距离不超过 d 的两个哈希
+# 至少有一段的差异不超过 d // 4 位，只需按各段及其邻近值查找候选，再逐个验证完整距离
+BANDS = 4
+BAND_BITS = 16
+
+# 计算哈希前降采样解码的最小边长
+HASH_DECODE_SIZE = 64
+
+# 计算哈希的线程数；Pillow 解码时释放 GIL
+HASH_THREADS = 4
+
+# maybe_prune() 两次清理已删除文件的记录至少间隔的秒数
+PRUNE_INTERVAL = 24 * 3600
+
+
+def default_index_path():
+    """默认哈希索引：$XDG_CACHE_HOME/pyhandle/phash.sqlite"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pyhandle', 'phash.sqlite')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def _gray(img, size):
+    """缩小为 size 大小的灰度 float 数组，透明区域按白色背景处理"""
+    import numpy as np
+    from .image_utils import load_reduced
+
+    # 降采样解码只缩到 HASH_DECODE_SIZE，再统一用 LANCZOS 缩到 size，不同大小的副本哈希一致
+    img = load_reduced(img, (max(size[0], HASH_DECODE_SIZE), max(size[1], HASH_DECODE_SIZE)))
+    if img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img)
+    return np.asarray(img.convert('L').resize(size, Image.LANCZOS), dtype=np.float64)
+
+
+def _dct_matrix(n):
+    import numpy as np
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+
+def _bits_to_int(bits):
+    import numpy as np
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def image_hash(img, method='phash'):
+    """图像的 64 位感知哈希（int）；只需解码缩小后的图像，JPEG 按 1/8 降采样解码"""
+    import numpy as np
+
+    if method == 'ahash':
+        pixels = _gray(img, (8, 8))
+        return _bits_to_int(pixels > pixels.mean())
+    if method == 'dhash':
+        pixels = _gray(img, (9, 8))
+        return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+    if method == 'phash':
+        pixels = _gray(img, (32, 32))
+        matrix = _dct_matrix(32)
+        low = (matrix @ pixels @ matrix.T)[:8, :8]
+        return _bits_to_int(low > np.median(low))
+    raise ValueError(f"不支持的哈希算法: {method}")
+
+
+def file_hash(path, method='phash'):
+    """图片文件的感知哈希，动画取第一帧；SVG 等矢量文件返回 None"""
+    from .vector_utils import is_svg
+
+    if is_svg(path):
+        return None
+    with stage('hash', path), open_input(path) as source, Image.open(source) as img:
+        return image_hash(img, method)
+
+
+def _signed(value):
+    """SQLite 的 INTEGER 是有符号 64 位"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * i)) & mask for i in range(BANDS)]
+
+
+def _neighbors(band, radius):
+    """与 band 的汉明距离不超过 radius 的全部 16 位值"""
+    values = [band]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(BAND_BITS), r):
+            flipped = band
+            for position in positions:
+                flipped ^= 1 << position
+            values.append(flipped)
+    return values
+
+
+class HashIndex:
+    """持久化的感知哈希索引（SQLite）
+
+    按路径记录文件大小、修改时间和哈希，文件未变化时不再解码。哈希的 4 个 16 位分段
+    各有一个索引，按汉明距离查找时只读取至少一段相近的候选行（多索引哈希），
+    百万条记录时每次查找也只需几次索引查询。
+    """
+
+    def __init__(self, path=None, method='phash'):
+        if method not in HASH_METHODS:
+            raise ValueError(f"不支持的哈希算法: {method}")
+        self.path = path or default_index_path()
+        self.method = method
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS hashes (
+                    method TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, hash INTEGER,
+                    b0 INTEGER, b1 INTEGER, b2 INTEGER, b3 INTEGER, PRIMARY KEY (method, path));
+                CREATE INDEX IF NOT EXISTS hashes_b0 ON hashes (method, b0);
+                CREATE INDEX IF NOT EXISTS hashes_b1 ON hashes (method, b1);
+                CREATE INDEX IF NOT EXISTS hashes_b2 ON hashes (method, b2);
+                CREATE INDEX IF NOT EXISTS hashes_b3 ON hashes (method, b3);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+            ''')
+        return self._conn
+
+    @property
+    def _method_key(self):
+        return f"{self.method}:{HASH_VERSION}"
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def hash_paths(self, paths, threads=HASH_THREADS):
+        """返回 {路径: 哈希}；索引中没有或文件已变化的在线程池中计算后写入索引
+
+        无法读取或不支持的文件（如 SVG）不在结果中。
+        """
+        hashes = {}
+        missing = []
+        with self._lock:
+            for path in dict.fromkeys(paths):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                row = self.conn.execute('SELECT size, mtime_ns, hash FROM hashes WHERE method = ? AND path = ?',
+                                        (self._method_key, os.path.abspath(path))).fetchone()
+                if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+                    hashes[path] = row[2] & ((1 << 64) - 1)
+                else:
+                    missing.append((path, st))
+
+        def compute(item):
+            try:
+                return file_hash(item[0], self.method)
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(threads) as pool:
+            computed = list(pool.map(compute, missing))
+        rows = []
+        for (path, st), value in zip(missing, computed):
+            if value is None:
+                continue
+            hashes[path] = value
+            rows.append((self._method_key, os.path.abspath(path), st.st_size, st.st_mtime_ns, _signed(value),
+                         *_bands(value)))
+        if rows:
+            with self._lock:
+                self.conn.executemany('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                self.conn.commit()
+        return hashes
+
+    def lookup(self, value, max_distance=DUPLICATE_DISTANCE):
+        """索引中与哈希 value 的距离不超过 max_distance 的文件，按距离排序：[(距离, 路径)]"""
+        radius = max_distance // BANDS
+        found = {}
+        with self._lock:
+            for i, band in enumerate(_bands(value)):
+                candidates = _neighbors(band, radius)
+                placeholders = ','.join('?' * len(candidates))
+                for path, other in self.conn.execute(
+                        f'SELECT path, hash FROM hashes WHERE method = ? AND b{i} IN ({placeholders})',
+                        [self._method_key] + candidates):
+                    if path not in found:
+                        found[path] = hamming(value, other & ((1 << 64) - 1))
+        return sorted((distance, path) for path, distance in found.items() if distance <= max_distance)
+
+    def duplicates(self, paths, max_distance=DUPLICATE_DISTANCE):
+        """找出 paths 中与排在前面的图片重复的文件，返回 {重复的路径: 保留的路径}
+
+        每组重复中保留最先出现的一张，重复的文件对应距离最近的保留文件。只与本次给出的文件比较：
+        索引只用来缓存哈希，候选在内存中按分段分桶查找，耗时与索引中的记录数无关。
+        """
+        hashes = self.hash_paths(paths)
+        radius = max_distance // BANDS
+        # 每段一个桶：{16 位分段值: [(哈希, 序号, 保留的路径)]}，距离相同时取先出现的
+        buckets = [defaultdict(list) for _ in range(BANDS)]
+        result = {}
+        for order, path in enumerate(dict.fromkeys(paths)):
+            value = hashes.get(path)
+            if value is None:
+                continue
+            best = None
+            bands = _bands(value)
+            for i, band in enumerate(bands):
+                for candidate in _neighbors(band, radius):
+                    for other_value, other_order, other in buckets[i].get(candidate, ()):
+                        distance = hamming(value, other_value)
+                        if distance <= max_distance and (best is None or (distance, other_order) < best[:2]):
+                            best = (distance, other_order, other)
+            if best is None:
+                for i, band in enumerate(bands):
+                    buckets[i][band].append((value, order, path))
+            else:
+                result[path] = best[2]
+        return result
+
+    def prune(self):
+        """删除文件已不存在的记录，返回删除的条数；检查文件时不占用索引
+
+        需要检查索引中的每个文件，记录很多时较慢，不要在转换过程中同步调用。
+        """
+        with self._lock:
+            rows = self.conn.execute('SELECT method, path FROM hashes').fetchall()
+        exists = {}
+        gone = []
+        for method, path in rows:
+            if path not in exists:
+                exists[path] = os.path.exists(path)
+            if not exists[path]:
+                gone.append((method, path))
+        with self._lock:
+            # 按主键 (method, path) 删除，每条只需一次索引查找
+            self.conn.executemany('DELETE FROM hashes WHERE method = ? AND path = ?', gone)
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('pruned_at', ?)", (time.time(),))
+            self.conn.commit()
+        return len(gone)
+
+    def maybe_prune(self, interval=PRUNE_INTERVAL):
+        """距上次清理超过 interval 秒时调用 prune()，返回删除的条数"""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = 'pruned_at'").fetchone()
+        if row and time.time() - row[0] < interval:
+            return 0
+        return self.prune()
+
+
+def split_duplicates(jobs, index, max_distance=DUPLICATE_DISTANCE):
+    """去掉输入与前面的任务重复的 (input_path, output_path, format[, options]) 任务
+
+    返回 (保留的任务, {重复的输入: 保留的输入})；同一输入的多个任务（如多个尺寸）一起保留或去掉。
+    """
+    duplicates = index.duplicates([job[0] for job in jobs], max_distance)
+    return [job for job in jobs if job[0] not in duplicates], duplicates
@@ -0,0 +1,214 @@
+import errno
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import profiling
+from .batch_utils import BatchConverter, ConvertResult, _ProcessPool, _convert_jobs, _job_error, group_jobs, missed_target
+from .image_utils import output_path_for_format
+from .io_utils import _is_network_fs
+
+# 预读和写出的线程数：网络文件系统上的读写主要在等待，线程数可以多于 CPU 核数
+IO_THREADS = 4
+
+COPY_BUFFER = 1024 * 1024
+
+
+def stage_input(path, scratch_dir, name, copy=None):
+    """预读输入文件，返回转换进程实际读取的路径
+
+    网络文件系统上的文件复制到本地临时目录 scratch_dir（文件名为 name），转换进程不再等待网络；
+    本地文件只提示内核预读，返回原路径。copy 为 True/False 时强制复制/不复制。
+    """
+    with profiling.stage('prefetch', path) as s, open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        s.bytes = st.st_size
+        if copy is None:
+            copy = _is_network_fs(st.st_dev)
+        if not copy:
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            return path
+        staged = os.path.join(scratch_dir, name)
+        with open(staged, 'wb') as out:
+            shutil.copyfileobj(f, out, COPY_BUFFER)
+        return staged
+
+
+def commit_output(scratch_path, output_path, durable=True):
+    """把临时目录中的转换结果原子地放到 output_path
+
+    同一文件系统上直接 rename；否则先复制到目标目录中的隐藏临时文件再 rename。
+    中途崩溃最多留下 .part 临时文件，不会出现截断的输出。durable 为真时 rename 前 fsync。
+    """
+    with profiling.stage('write', output_path) as s:
+        s.bytes = os.path.getsize(scratch_path)
+        try:
+            if durable:
+                _fsync(scratch_path)
+            os.replace(scratch_path, output_path)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+        directory, name = os.path.split(output_path)
+        temp_path = os.path.join(directory, f".{name}.{os.getpid()}-{threading.get_ident()}.part")
+        try:
+            with open(scratch_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER)
+                if durable:
+                    dst.flush()
+                    os.fsync(dst.fileno())
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        finally:
+            os.unlink(scratch_path)
+
+
+def _fsync(path):
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+def _remove(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+class PipelineConverter(BatchConverter):
+    """分阶段的批量转换：预读 → 进程池解码和编码 → 原子写出
+
+    预读和写出在线程池中进行，与进程池中的转换重叠，网络共享上的读写延迟被计算掩盖。
+    各阶段之间的排队数有上限（背压）：prefetch 为已预读和预读中的文件数，
+    max_pending 为转换中和等待写出的文件数，write_behind 为写出中的文件数。
+    转换结果先写入本地临时目录（scratch_dir，默认系统临时目录），再由写出阶段原子地放到目标位置，
+    源文件旁不会出现写了一半的输出。接口与 BatchConverter 相同。
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, cache=None, prefetch=None, write_behind=None,
+                 io_threads=IO_THREADS, scratch_dir=None, stage_inputs=None, durable=True):
+        super().__init__(max_workers, max_pending, cache)
+        self.prefetch = prefetch or self.max_workers * 2
+        self.write_behind = write_behind or io_threads
+        self.io_threads = io_threads
+        self.scratch_dir = scratch_dir
+        # None 表示只复制网络文件系统上的输入，True/False 强制复制/不复制
+        self.stage_inputs = stage_inputs
+        self.durable = durable
+
+    def iter_results(self, jobs):
+        """执行 (input_path, output_path, format[, options]) 任务，按完成顺序逐个产出 ConvertResult"""
+        self._cancel_event.clear()
+        groups = group_jobs(jobs)
+        profile = profiling.enabled()
+        with tempfile.TemporaryDirectory(prefix='pyhandle-', dir=self.scratch_dir) as scratch, \
+                ThreadPoolExecutor(self.io_threads) as io_pool, \
+                _ProcessPool(self.max_workers) as cpu_pool:
+            reading, converting, writing = {}, {}, {}
+            # 已预读、等待转换的任务组和已转换、等待写出的任务；同一组（同一个 SVG 的多个尺寸）只预读一次
+            staged, converted = deque(), deque()
+            count = 0
+            exhausted = False
+            while True:
+                while not exhausted and not self.cancelled and len(reading) + len(staged) < self.prefetch:
+                    try:
+                        group = next(groups)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    todo = []
+                    for job in group:
+                        cached, key = self._check_cache(job)
+                        if cached is not None:
+                            yield cached
+                        else:
+                            todo.append((job, key))
+                    if not todo:
+                        continue
+                    count += 1
+                    # 临时文件保留原扩展名，转换时按扩展名识别 SVG
+                    name = f"{count}-{os.path.basename(todo[0][0][0])}"
+                    future = io_pool.submit(stage_input, todo[0][0][0], scratch, name, self.stage_inputs)
+                    reading[future] = (count, todo)
+
+                while staged and len(converting) + len(converted) < self.max_pending:
+                    number, todo, source = staged.popleft()
+                    tasks = [(source, os.path.join(scratch, f"{number}-{i}-out-{os.path.basename(job[1])}"), job[2],
+                              job[3] if len(job) > 3 else None) for i, (job, _) in enumerate(todo)]
+                    future = cpu_pool.submit(_convert_jobs, tasks, profile=profile)
+                    converting[future] = (todo, source)
+
+                while converted and len(writing) < self.write_behind:
+                    job, key, scratch_output, search = converted.popleft()
+                    output_path = output_path_for_format(job[1], job[2])
+                    future = io_pool.submit(commit_output, scratch_output, output_path, self.durable)
+                    writing[future] = (job, key, scratch_output, output_path, search)
+
+                if not (reading or converting or writing):
+                    break
+
+                done, _ = wait(list(reading) + list(converting) + list(writing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in reading:
+                        number, todo = reading.pop(future)
+                        if future.cancelled():
+                            continue
+                        try:
+                            staged.append((number, todo, future.result()))
+                        except Exception as e:
+                            for job, _ in todo:
+                                yield ConvertResult(job[0], job[1], False, str(e))
+
+                    elif future in converting:
+                        todo, source = converting.pop(future)
+                        if source != todo[0][0][0]:
+                            _remove(source)
+                        if future.cancelled():
+                            continue
+                        try:
+                            results = future.result()
+                        except Exception as e:
+                            # 工作进程崩溃时在途的任务都以失败结束，之后的任务提交到新的进程池
+                            for job, _ in todo:
+                                yield ConvertResult(job[0], job[1], False, _job_error(e))
+                            continue
+                        for (job, key), result in zip(todo, results):
+                            # 工作进程记录的是临时文件名，换回原路径
+                            for record in result.stages:
+                                profiling.emit(record._replace(file=job[0]) if record.file == source else record)
+                            if result.success:
+                                # 未达到目标的结果不缓存，下次仍然报告
+                                if missed_target(result):
+                                    key = None
+                                converted.append((job, key, result.output_path, result.search))
+                            else:
+                                _remove(result.output_path)
+                                error = result.error.replace(source, job[0]) if result.error else result.error
+                                yield result._replace(input_path=job[0], output_path=job[1], error=error)
+
+                    else:
+                        job, key, scratch_output, output_path, search = writing.pop(future)
+                        try:
+                            future.result()
+                        except Exception as e:
+                            _remove(scratch_output)
+                            yield ConvertResult(job[0], output_path, False, str(e))
+                            continue
+                        if key:
+                            self.cache.store(key, output_path)
+                        yield ConvertResult(job[0], output_path, True, None, search=search)
+
+                if self.cancelled:
+                    # 丢弃尚未开始的预读和转换，已转换完成的结果照常写出
+                    for future in list(reading) + list(converting):
+                        future.cancel()
+                    staged.clear()
@@ -0,0 +1,200 @@
+import io
+import threading
+import time
+from collections import namedtuple
+
+# 一个处理阶段的计时记录：文件、阶段名、耗时（秒）和处理的字节数
+StageRecord = namedtuple('StageRecord', ['file', 'stage', 'seconds', 'bytes'])
+
+# 阶段名对应的显示名称
+STAGE_NAMES = {
+    'prefetch': '预读',
+    'read': '读取',
+    'decode': '解码',
+    'convert': '模式转换',
+    'resize': '缩放',
+    'palette': '统计调色板',
+    'hash': '感知哈希',
+    'quantize': '量化',
+    'encode': '编码写入',
+    'parse': '解析',
+    'copy': '复制页面',
+    'write': '写出',
+}
+
+# 已注册的钩子；为空时 stage() 返回共享的空对象，几乎没有开销
+_hooks = []
+_hooks_lock = threading.Lock()
+
+
+def add_hook(callback):
+    """注册钩子，每个阶段结束时以 StageRecord 调用 callback（可能在工作线程中）"""
+    with _hooks_lock:
+        _hooks.append(callback)
+
+
+def remove_hook(callback):
+    with _hooks_lock:
+        if callback in _hooks:
+            _hooks.remove(callback)
+
+
+def enabled():
+    return bool(_hooks)
+
+
+def emit(record):
+    """把一条记录分发给所有钩子（进程池返回的记录也经由这里）"""
+    for callback in list(_hooks):
+        callback(record)
+
+
+class _Stage:
+    __slots__ = ('file', 'name', 'bytes', '_start')
+
+    def __init__(self, name, file, nbytes):
+        self.name = name
+        self.file = file
+        self.bytes = nbytes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        emit(StageRecord(self.file, self.name, time.perf_counter() - self._start, self.bytes))
+        return False
+
+
+class _NullStage:
+    """未启用时使用的空阶段，设置 bytes 不产生任何效果"""
+    bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, file=None, nbytes=0):
+    """为一个处理阶段计时：with stage('decode', path) as s: ...; s.bytes = n"""
+    if not _hooks:
+        return _NULL_STAGE
+    return _Stage(name, file, nbytes)
+
+
+class StageCollector:
+    """收集记录的钩子，用于在工作进程中暂存记录，随结果返回给主进程"""
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def __enter__(self):
+        add_hook(self)
+        return self
+
+    def __exit__(self, *exc):
+        remove_hook(self)
+        return False
+
+
+class StageStats:
+    """按阶段汇总耗时和字节数，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.totals = {}
+            self.files = set()
+
+    def __call__(self, record):
+        with self._lock:
+            seconds, nbytes, count = self.totals.get(record.stage, (0.0, 0, 0))
+            self.totals[record.stage] = (seconds + record.seconds, nbytes + record.bytes, count + 1)
+            if record.file:
+                self.files.add(record.file)
+
+    def summary(self):
+        """一行摘要，按耗时从多到少排列，如“解码 1.20s · 编码写入 0.80s”"""
+        with self._lock:
+            items = sorted(self.totals.items(), key=lambda item: item[1][0], reverse=True)
+            file_count = len(self.files)
+        if not items:
+            return ''
+        parts = [f"{STAGE_NAMES.get(name, name)} {seconds:.2f}s" for name, (seconds, _, _) in items]
+        return f"{file_count} 个文件: " + ' · '.join(parts)
+
+    def report(self):
+        """多行报告：各阶段的总耗时、次数和吞吐量"""
+        with self._lock:
+            items = sorted(self.totals.items(), key=lambda item: item[1][0], reverse=True)
+        lines = [f"{'阶段':10s} {'耗时(s)':>9s} {'次数':>7s} {'MB':>9s} {'MB/s':>8s}"]
+        for name, (seconds, nbytes, count) in items:
+            mb = nbytes / 1024 / 1024
+            rate = f"{mb / seconds:8.1f}" if nbytes and seconds else f"{'-':>8s}"
+            lines.append(f"{STAGE_NAMES.get(name, name):10s} {seconds:9.3f} {count:7d} {mb:9.2f} {rate}")
+        return '\n'.join(lines)
+
+
+class Capture:
+    """可选的 cProfile / tracemalloc 采集，只覆盖当前进程
+
+        with Capture(profile=True, memory=True) as capture:
+            ...
+        print(capture.report())
+    """
+
+    def __init__(self, profile=True, memory=False):
+        import cProfile
+
+        self.profiler = cProfile.Profile() if profile else None
+        self.memory = memory
+        self.peak_memory = None
+        self._snapshot = None
+
+    def __enter__(self):
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        if self.profiler:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler:
+            self.profiler.disable()
+        if self.memory:
+            import tracemalloc
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            self._snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        return False
+
+    def dump(self, path):
+        """保存 cProfile 结果，可用 snakeviz 等工具查看"""
+        self.profiler.dump_stats(path)
+
+    def report(self, limit=20):
+        import pstats
+
+        out = io.StringIO()
+        if self.profiler:
+            pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        if self._snapshot is not None:
+            out.write(f"Python 内存峰值: {self.peak_memory / 1024 / 1024:.1f} MB\n")
+            for stat in self._snapshot.statistics('lineno')[:limit]:
+                out.write(f"{stat}\n")
+        return out.getvalue()
@@ -0,0 +1,252 @@
+import hashlib
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageOps
+
+from .io_utils import RANDOM, open_input
+
+# 缩略图的最长边（像素）；生成逻辑变化时递增版本号，使旧缩略图失效
+THUMBNAIL_SIZE = 128
+THUMBNAIL_VERSION = 1
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 页面内容中的文字绘制操作符，含文字的页面不当作扫描件处理
+_TEXT_OPERATORS = re.compile(rb'(?:^|[\s\]\)>])(?:Tj|TJ|\'|")(?=\s|$)')
+
+
+def default_thumbnail_dir():
+    """默认缩略图目录：$XDG_CACHE_HOME/pyhandle/thumbnails"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pyhandle', 'thumbnails')
+
+
+def image_thumbnail(path, size=THUMBNAIL_SIZE):
+    """图片缩略图：JPEG 按 1/2~1/8 降采样解码，其它格式解码后整数倍缩小"""
+    from .image_utils import load_reduced
+    from .vector_utils import is_svg
+
+    if is_svg(path):
+        from .vector_utils import load_svg, rasterize_svg, _fit_dimensions
+        tree = load_svg(path)
+        width, height = _fit_dimensions(tree, 96, size)
+        return rasterize_svg(tree, 96, width, height)
+
+    with open_input(path) as source, Image.open(source) as img:
+        img = load_reduced(img, (size, size))
+        img.thumbnail((size, size), Image.LANCZOS)
+        return img.copy()
+
+
+def _first_page(path):
+    import PyPDF2
+    from .pdf_utils import select_pages
+
+    with open_input(path, RANDOM) as source:
+        reader = PyPDF2.PdfReader(source)
+        if reader.is_encrypted and not reader.decrypt(""):
+            raise ValueError("加密的 PDF")
+        # 只解析第一页，不展开整个页面树；继承的属性合并进页面，文字提取才能找到字体
+        ref, page_dict, inherited = select_pages(reader, [0])[0]
+        page = PyPDF2.PageObject(reader, ref)
+        page.update(inherited)
+        page.update(page_dict)
+        media_box = page.get('/MediaBox')
+        media_box = [float(value) for value in media_box.get_object()] if media_box else [0, 0, 612, 792]
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b''
+        resources = page.get('/Resources')
+        images = []
+        if resources is not None and not _TEXT_OPERATORS.search(data):
+            xobjects = resources.get_object().get('/XObject')
+            for ref in (xobjects.get_object().values() if xobjects else ()):
+                obj = ref.get_object()
+                if obj.get('/Subtype') == '/Image':
+                    images.append(obj)
+        image = None
+        if images:
+            # 扫描件通常只有一张整页图片，取面积最大的一张
+            largest = max(images, key=lambda obj: int(obj.get('/Width', 0)) * int(obj.get('/Height', 0)))
+            try:
+                image = _decode_xobject(largest)
+            except Exception:
+                # 损坏或不常见的图片编码，退回文字占位
+                image = None
+        text = '' if image is not None else page.extract_text()[:400]
+    return media_box, image, text
+
+
+def _decode_xobject(obj, size=THUMBNAIL_SIZE):
+    """解码常见的图片 XObject（JPEG、8 位 Flate），不支持时返回 None"""
+    filters = obj.get('/Filter')
+    if isinstance(filters, list) and len(filters) == 1:
+        filters = filters[0]
+    color_space = obj.get('/ColorSpace')
+    color_space = color_space.get_object() if color_space is not None else None
+    if filters == '/DCTDecode':
+        img = Image.open(BytesIO(obj._data))
+        img.draft('RGB', (size, size))
+        if img.mode == 'CMYK':
+            img = ImageOps.invert(img.convert('RGB')) if '/Decode' in obj else img.convert('RGB')
+        return img
+    if filters == '/FlateDecode' and obj.get('/BitsPerComponent') == 8:
+        width, height = int(obj['/Width']), int(obj['/Height'])
+        palette = None
+        if isinstance(color_space, list) and color_space[0] == '/Indexed':
+            lookup = color_space[3].get_object()
+            palette = lookup if isinstance(lookup, bytes) else lookup.get_data()
+            color_type, mode = 3, 'P'
+        elif color_space in ('/DeviceRGB', '/DeviceGray'):
+            color_type, mode = (2, 'RGB') if color_space == '/DeviceRGB' else (0, 'L')
+        else:
+            return None
+        params = obj.get('/DecodeParms') or {}
+        if params.get('/Predictor', 1) >= 10:
+            # PNG 预测器与 PNG 的逐行过滤相同，补上文件头后交给 Pillow 解码
+            return Image.open(BytesIO(_png_file(obj._data, width, height, color_type, palette)))
+        img = Image.frombytes(mode, (width, height), zlib.decompress(obj._data))
+        if palette is not None:
+            img.putpalette(palette)
+        return img
+    return None
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def _png_file(idat, width, height, color_type, palette=None):
+    header = struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)
+    chunks = [_png_chunk(b'IHDR', header)]
+    if palette is not None:
+        chunks.append(_png_chunk(b'PLTE', bytes(palette)))
+    chunks += [_png_chunk(b'IDAT', idat), _png_chunk(b'IEND', b'')]
+    return b'\x89PNG\r\n\x1a\n' + b''.join(chunks)
+
+
+def pdf_thumbnail(path, size=THUMBNAIL_SIZE):
+    """PDF 第一页的缩略图
+
+    安装了 PyMuPDF 时直接渲染；否则只解析第一页：只有图片的页面（扫描件）解码其中最大的图片，
+    含文字的页面按页面比例画出白纸和开头的文字。
+    """
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+    if fitz is not None:
+        with fitz.open(path) as doc:
+            page = doc[0]
+            zoom = size / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+            return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+    media_box, image, text = _first_page(path)
+    width, height = abs(media_box[2] - media_box[0]), abs(media_box[3] - media_box[1])
+    scale = size / max(width, height, 1)
+    page_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if image is not None:
+        image = image.convert('RGB')
+        image.thumbnail(page_size, Image.LANCZOS)
+        return image
+
+    page = Image.new('RGB', page_size, (255, 255, 255))
+    draw = ImageDraw.Draw(page)
+    draw.rectangle([0, 0, page_size[0] - 1, page_size[1] - 1], outline=(160, 160, 160))
+    # 缩略图上的文字只用来辨认页面，截断到页面宽度即可
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    y = 4
+    for line in lines:
+        if y > page_size[1] - 12:
+            break
+        draw.text((4, y), line[:max(1, page_size[0] // 6)], fill=(60, 60, 60))
+        y += 11
+    return page
+
+
+def make_thumbnail(path, size=THUMBNAIL_SIZE):
+    if path.lower().endswith('.pdf'):
+        return pdf_thumbnail(path, size)
+    return image_thumbnail(path, size)
+
+
+class ThumbnailCache:
+    """缩略图磁盘缓存
+
+    文件名由路径、大小、修改时间和缩略图尺寸的哈希组成，文件被修改后自动失效，
+    不需要索引数据库。总大小超过 max_bytes 时 prune() 删除最久未使用的缩略图。
+    """
+
+    def __init__(self, cache_dir=None, size=THUMBNAIL_SIZE, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_thumbnail_dir()
+        self.size = size
+        self.max_bytes = max_bytes
+
+    def _thumb_path(self, path, st):
+        key = hashlib.sha1(f"{THUMBNAIL_VERSION}\0{self.size}\0{os.path.abspath(path)}\0"
+                           f"{st.st_size}\0{st.st_mtime_ns}".encode('utf-8', 'surrogateescape')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.png')
+
+    def get(self, path):
+        """返回 PNG 编码的缩略图，缓存中没有时生成并保存；文件无法读取时抛出异常"""
+        thumb_path = self._thumb_path(path, os.stat(path))
+        try:
+            with open(thumb_path, 'rb') as f:
+                data = f.read()
+            # 更新访问时间供 prune() 使用，noatime 挂载时 atime 不可靠
+            os.utime(thumb_path)
+            return data
+        except OSError:
+            pass
+
+        buf = BytesIO()
+        img = make_thumbnail(path, self.size)
+        if img.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            img = img.convert('RGBA')
+        img.save(buf, format='PNG')
+        data = buf.getvalue()
+        try:
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            temp_path = f"{thumb_path}.{os.getpid()}-{threading.get_ident()}.part"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, thumb_path)
+        except OSError:
+            # 缓存目录不可写时只是不缓存
+            pass
+        return data
+
+    def prune(self):
+        """删除最久未使用的缩略图，直到总大小不超过 max_bytes，返回删除的文件数"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith('.part') and st.st_mtime < time.time() - 3600:
+                    # 中断留下的临时文件
+                    os.unlink(path)
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
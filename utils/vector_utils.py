@@ -0,0 +1,143 @@
+import base64
+import os
+from io import BytesIO
+from types import SimpleNamespace
+
+from PIL import Image
+
+from .profiling import stage
+
+# cairosvg 可以直接输出的格式及对应的 surface 类
+SURFACE_TYPES = {
+    'png': 'PNGSurface',
+    'pdf': 'PDFSurface',
+    'eps': 'EPSSurface',
+    'ps': 'PSSurface',
+    'svg': 'SVGSurface',
+}
+
+# 矢量输出格式
+VECTOR_FORMATS = {'svg', 'eps', 'pdf'}
+
+
+def _cairosvg():
+    """导入 cairosvg，缺少 cairo 库时给出明确的错误"""
+    try:
+        import cairosvg
+    except (ImportError, OSError) as e:
+        raise RuntimeError(f"SVG 转换需要安装 cairosvg 和 cairo 库: {e}") from e
+    return cairosvg
+
+
+def is_svg(path):
+    return os.path.splitext(path)[1].lower() in ('.svg', '.svgz')
+
+
+def load_svg(path):
+    """解析 SVG 文件，返回新的树
+
+    渲染会修改树中的 mask、pattern 等节点，一棵树只渲染一次，每次渲染前重新解析。
+    重新解析比复制已解析的树（copy.deepcopy）快一倍左右，因此不在进程内缓存解析结果。
+    """
+    return _cairosvg().parser.Tree(url=os.path.abspath(path))
+
+
+def svg_size(tree, dpi=96):
+    """返回 SVG 的原始大小（像素），未声明宽高时使用 viewBox"""
+    helpers = _cairosvg().helpers
+    # node_format 只用到 surface 的这几个属性
+    surface = SimpleNamespace(dpi=dpi, font_size=12 * dpi / 72, context_width=None, context_height=None)
+    width, height, _ = helpers.node_format(surface, tree, reference=False)
+    return width, height
+
+
+def render_svg(tree, output, format='png', dpi=96, width=None, height=None, scale=1):
+    """把已解析的 SVG 渲染到 output（路径或文件对象）
+
+    只给出 width 或 height 之一时保持宽高比；两者都给出时按 SVG 的
+    preserveAspectRatio 放入该大小的画布。渲染会修改 tree，渲染后不要再使用。
+    """
+    surface_type = getattr(_cairosvg().surface, SURFACE_TYPES[format])
+    surface = surface_type(tree, output, dpi, scale=scale, output_width=width, output_height=height)
+    surface.finish()
+
+
+def rasterize_svg(tree, dpi=96, width=None, height=None):
+    """把 SVG 渲染为 RGBA 图像，渲染会修改 tree"""
+    buf = BytesIO()
+    render_svg(tree, buf, 'png', dpi=dpi, width=width, height=height)
+    buf.seek(0)
+    with Image.open(buf) as img:
+        return img.convert('RGBA')
+
+
+def _fit_dimensions(tree, dpi, max_size):
+    """最长边设为 max_size 时的 (width, height) 参数，矢量图可以无损放大"""
+    if not max_size:
+        return None, None
+    width, height = svg_size(tree, dpi)
+    if width >= height:
+        return max_size, None
+    return None, max_size
+
+
+def convert_svg(input_path, output_path, format, dpi=96, max_size=None, search=None, search_report=None):
+    """转换 SVG 文件，返回实际输出路径
+
+    png/pdf/eps/ps/svg 由 cairo 直接输出，其它格式先渲染为位图再由 Pillow 保存；
+    ico/icns 的每个尺寸都从矢量直接渲染。max_size 为输出的最长边（像素）。
+    search 为 jpg/webp 的质量搜索参数（见 encode_utils.search_quality），search_report 为列表时追加搜索结果。
+    """
+    from .image_utils import icon_sizes, write_icon
+
+    with stage('parse', input_path) as s:
+        tree = load_svg(input_path)
+        s.bytes = os.path.getsize(input_path)
+    format = format.lower()
+
+    if format in ('ico', 'icns'):
+        with stage('decode', input_path):
+            # 第一个尺寸使用已解析的树，其余尺寸各自重新解析
+            images = [rasterize_svg(tree if i == 0 else load_svg(input_path), dpi, size, size)
+                      for i, size in enumerate(icon_sizes(format, max_size))]
+        with stage('encode', input_path):
+            return write_icon(images, output_path, format)
+
+    width, height = _fit_dimensions(tree, dpi, max_size)
+    if format in SURFACE_TYPES:
+        with stage('encode', input_path):
+            render_svg(tree, output_path, format, dpi=dpi, width=width, height=height)
+        return output_path
+
+    with stage('decode', input_path):
+        img = rasterize_svg(tree, dpi, width, height)
+    if format == 'jpg':
+        # jpg 不支持透明，铺白底
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        img = background
+    if search:
+        from .encode_utils import save_with_search
+        with stage('encode', input_path):
+            result = save_with_search(img, output_path, format, **search)
+        if search_report is not None:
+            search_report.append(result._replace(data=None))
+        return output_path
+    img.save(output_path, format='JPEG' if format == 'jpg' else format.upper())
+    return output_path
+
+
+def save_raster_svg(img, output_path):
+    """把位图以内嵌 PNG 的形式保存为 SVG"""
+    if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        img = img.convert('RGBA')
+    buf = BytesIO()
+    img.save(buf, format='PNG')
+    data = base64.b64encode(buf.getvalue()).decode('ascii')
+    width, height = img.size
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                f'width="{width}" height="{height}" viewBox="0 0 {width} {height}">\n'
+                f'<image width="{width}" height="{height}" xlink:href="data:image/png;base64,{data}"/>\n'
+                '</svg>\n')
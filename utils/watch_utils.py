@@ -0,0 +1,430 @@
+import ctypes
+import ctypes.util
+import heapq
+import json
+import os
+import select
+import signal
+import struct
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from . import profiling
+from .batch_utils import ConvertResult, _convert_job, _job_error, output_path_for
+from .file_utils import allowed_file
+from .image_utils import output_path_for_format
+
+# 监视目录中会被转换的输入格式
+WATCH_TYPES = {'jpg', 'jpeg', 'png', 'gif', 'svg', 'webp', 'bmp', 'tif', 'tiff'}
+
+# 一条监视规则：目录中的新文件转换为 format，options 为传给 _convert_image 的参数
+WatchRule = namedtuple('WatchRule', ['folder', 'format', 'output_dir', 'options', 'recursive'],
+                       defaults=(None, None, False))
+
+# inotify 事件掩码（linux/inotify.h）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def load_rules(path):
+    """从 JSON 文件读取规则列表
+
+    [{"folder": "drop/web", "format": "webp", "output_dir": "out/web", "max_size": 1600, "recursive": true}]
+    除 folder、format、output_dir、recursive 外的键作为转换选项（如 max_size、dpi）。
+    相对路径以规则文件所在目录为准。
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    rules = []
+    for item in items:
+        item = dict(item)
+        folder = os.path.join(base_dir, os.path.expanduser(item.pop('folder')))
+        format = item.pop('format').lower()
+        output_dir = item.pop('output_dir', None)
+        if output_dir:
+            output_dir = os.path.join(base_dir, os.path.expanduser(output_dir))
+        recursive = bool(item.pop('recursive', False))
+        rules.append(WatchRule(folder, format, output_dir, item or None, recursive))
+    return rules
+
+
+class InotifyBackend:
+    """通过 ctypes 调用 Linux inotify，只报告发生变化的路径，不扫描目录
+
+    read() 返回 [(类型, 路径, 标记)]，类型为 'file'、'dir'（新建的子目录）或 'overflow'
+    （内核事件队列溢出，需要重新扫描），标记为 add_watch 时传入的对象。
+    """
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("系统不支持 inotify")
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._watches = {}  # wd -> (目录, 标记)
+
+    def add_watch(self, folder, tag=None):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"无法监视目录 {folder}")
+        self._watches[wd] = (folder, tag)
+
+    def read(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, pos)
+            name = data[pos + _EVENT_HEADER.size:pos + _EVENT_HEADER.size + length].rstrip(b'\0')
+            pos += _EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.append(('overflow', None, None))
+                continue
+            if mask & IN_IGNORED:
+                # 目录被删除或移走，释放对应的记录
+                self._watches.pop(wd, None)
+                continue
+            if wd not in self._watches or not name:
+                continue
+            folder, tag = self._watches[wd]
+            path = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    events.append(('dir', path, tag))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE):
+                events.append(('file', path, tag))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingBackend:
+    """没有 inotify 时的后备方案：定期扫描监视的目录，比较文件大小和修改时间"""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._watches = {}  # 目录 -> 标记
+        self._snapshots = {}  # 目录 -> {路径: (大小, 修改时间)}
+        self._next_scan = 0
+
+    def add_watch(self, folder, tag=None):
+        self._watches[folder] = tag
+        # 已有的文件由调用方的初始扫描处理，这里只记录状态
+        self._scan(folder, tag, [])
+
+    def read(self, timeout):
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(delay, 0))
+        self._next_scan = time.monotonic() + self.interval
+        events = []
+        for folder, tag in list(self._watches.items()):
+            self._scan(folder, tag, events)
+        return events
+
+    def _scan(self, folder, tag, events):
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            # 目录已被删除
+            self._watches.pop(folder, None)
+            self._snapshots.pop(folder, None)
+            return
+        old = self._snapshots.get(folder, {})
+        # 每次扫描生成新的快照，已删除的文件不会留在内存中
+        snapshot = {}
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if entry.path not in self._watches:
+                        events.append(('dir', entry.path, tag))
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            snapshot[entry.path] = signature
+            if old.get(entry.path) != signature:
+                events.append(('file', entry.path, tag))
+        self._snapshots[folder] = snapshot
+
+    def close(self):
+        self._watches.clear()
+        self._snapshots.clear()
+
+
+def _ignore_interrupt():
+    """工作进程忽略 Ctrl+C，由主进程决定如何收尾"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def create_backend(polling=False, interval=1.0):
+    """优先使用 inotify，不可用时退回轮询"""
+    if not polling:
+        try:
+            return InotifyBackend()
+        except (OSError, AttributeError):
+            pass
+    return PollingBackend(interval)
+
+
+class FolderWatcher:
+    """监视目录并自动转换新增或修改的图片
+
+    文件在 settle 秒内没有新的事件、且前后两次检查的大小和修改时间一致时才开始转换，
+    避免处理正在写入的文件。转换在常驻的进程池中进行，同时在途的任务数有上限，
+    其余就绪的文件在队列中等待。输出文件已存在且比输入新时跳过，
+    因此每个文件只转换一次，修改后再次转换；已处理文件不在内存中保留记录。
+    """
+
+    def __init__(self, rules, settle=0.5, max_workers=None, backend=None, initial_scan=True,
+                 on_result=None, recycle_after=1000):
+        self.rules = list(rules)
+        self.settle = settle
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = self.max_workers * 2
+        self.backend = backend or create_backend()
+        self.initial_scan = initial_scan
+        self.on_result = on_result
+        self.recycle_after = recycle_after
+        self.converted = 0
+        self.failed = 0
+        self.skipped = 0
+        self._deadlines = []  # 堆：(到期时间, 序号, 路径)
+        self._pending = {}  # 路径 -> [到期时间, 规则, 上次检查的 (大小, 修改时间)]
+        self._ready = deque()  # 等待提交的 (路径, 规则)
+        self._inflight = {}  # future -> (路径, 规则)
+        self._busy = set()  # 正在转换的路径
+        self._dirty = set()  # 转换期间又被修改的路径
+        self._seq = 0
+        self._executor = None
+        self._submitted = 0  # 当前进程池已提交的任务数
+
+    def _pool(self):
+        """返回进程池；提交 recycle_after 个任务后换新的进程池，长时间运行时内存不会累积
+
+        旧进程池不再接收任务，已提交的任务完成后其工作进程退出。
+        """
+        if self._executor is not None and self._submitted >= self.recycle_after:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_ignore_interrupt)
+            self._submitted = 0
+        return self._executor
+
+    def _pool_submit(self, fn, *args, **kwargs):
+        """提交到进程池；工作进程异常退出使进程池损坏后换新的进程池
+
+        损坏时在途的任务都以 BrokenProcessPool 结束，由 _collect 逐个报告失败，之后的文件照常转换。
+        """
+        executor = self._pool()
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            executor.shutdown(wait=False)
+            self._executor = None
+            future = self._pool().submit(fn, *args, **kwargs)
+        self._submitted += 1
+        return future
+
+    def _watch_folder(self, folder, rule, events):
+        """监视目录（递归规则包括子目录），目录中已有的文件加入 events"""
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            self.backend.add_watch(current, rule)
+            try:
+                entries = list(os.scandir(current))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if rule.recursive:
+                        stack.append(entry.path)
+                elif events is not None:
+                    events.append(('file', entry.path, rule))
+
+    def _rescan(self):
+        """事件队列溢出后重新扫描全部目录，这是唯一需要整体扫描的情况"""
+        events = []
+        for rule in self.rules:
+            stack = [rule.folder]
+            while stack:
+                current = stack.pop()
+                try:
+                    entries = list(os.scandir(current))
+                except OSError:
+                    continue
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if rule.recursive:
+                            stack.append(entry.path)
+                    else:
+                        events.append(('file', entry.path, rule))
+        return events
+
+    def _schedule(self, path, rule):
+        if not allowed_file(path, WATCH_TYPES):
+            return
+        if path in self._busy:
+            self._dirty.add(path)
+            return
+        deadline = time.monotonic() + self.settle
+        entry = self._pending.get(path)
+        if entry is None:
+            self._pending[path] = [deadline, rule, None]
+        else:
+            entry[0] = deadline
+            entry[2] = None
+        self._seq += 1
+        heapq.heappush(self._deadlines, (deadline, self._seq, path))
+
+    def _handle(self, events):
+        for kind, path, rule in events:
+            if kind == 'file':
+                self._schedule(path, rule)
+            elif kind == 'dir':
+                if rule.recursive:
+                    # 新目录中可能已经有文件在监视建立之前写入
+                    new_events = []
+                    self._watch_folder(path, rule, new_events)
+                    self._handle(new_events)
+            elif kind == 'overflow':
+                self._handle(self._rescan())
+
+    def _settle(self):
+        """把到期且大小、修改时间稳定的文件移入就绪队列"""
+        now = time.monotonic()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            deadline, _, path = heapq.heappop(self._deadlines)
+            entry = self._pending.get(path)
+            if entry is None or entry[0] != deadline:
+                continue  # 之后又有新事件，以新的到期时间为准
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if entry[2] != signature:
+                # 第一次检查或仍在变化，再等一个周期
+                entry[0] = now + self.settle
+                entry[2] = signature
+                self._seq += 1
+                heapq.heappush(self._deadlines, (entry[0], self._seq, path))
+                continue
+            del self._pending[path]
+            self._ready.append((path, entry[1]))
+
+    def _output_path(self, path, rule):
+        """输出路径；指定 output_dir 时按文件相对监视目录的路径放到 output_dir 下，子目录中的同名文件不会冲突"""
+        if not rule.output_dir:
+            return output_path_for(path, rule.format)
+        relative = os.path.relpath(os.path.dirname(path), rule.folder)
+        return output_path_for(path, rule.format, os.path.normpath(os.path.join(rule.output_dir, relative)))
+
+    def _up_to_date(self, path, output_path, rule):
+        """输出与输入相同（如同目录下的转换结果）或已比输入新时不需要转换"""
+        output_path = output_path_for_format(output_path, rule.format)
+        if os.path.abspath(output_path) == os.path.abspath(path):
+            return True
+        try:
+            return os.stat(output_path).st_mtime_ns >= os.stat(path).st_mtime_ns
+        except OSError:
+            return False
+
+    def _submit(self, profile):
+        while self._ready and len(self._inflight) < self.max_pending:
+            path, rule = self._ready.popleft()
+            output_path = self._output_path(path, rule)
+            if self._up_to_date(path, output_path, rule):
+                self.skipped += 1
+                continue
+            if rule.output_dir:
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            future = self._pool_submit(_convert_job, path, output_path, rule.format, rule.options, profile=profile)
+            self._inflight[future] = (path, rule)
+            self._busy.add(path)
+
+    def _collect(self, timeout=0):
+        if not self._inflight:
+            return
+        done, _ = wait(list(self._inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            path, rule = self._inflight.pop(future)
+            self._busy.discard(path)
+            if future.cancelled():
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                result = ConvertResult(path, None, False, _job_error(e))
+            for record in result.stages:
+                profiling.emit(record)
+            if result.success:
+                self.converted += 1
+            else:
+                self.failed += 1
+            if self.on_result:
+                self.on_result(result)
+            if path in self._dirty:
+                self._dirty.discard(path)
+                self._schedule(path, rule)
+
+    def _wait_time(self, poll_interval):
+        """等待文件事件的时间：有任务可做时不阻塞（改为等待转换完成），否则等到最近的到期时间"""
+        if self._inflight or self._ready:
+            return 0
+        if self._deadlines:
+            return min(poll_interval, max(0, self._deadlines[0][0] - time.monotonic()))
+        return poll_interval
+
+    def run(self, stop_event=None, poll_interval=0.2):
+        """持续监视直到 stop_event（threading.Event）被设置"""
+        events = []
+        for rule in self.rules:
+            self._watch_folder(rule.folder, rule, events if self.initial_scan else None)
+        self._handle(events)
+
+        try:
+            while stop_event is None or not stop_event.is_set():
+                profile = profiling.enabled()
+                self._handle(self.backend.read(self._wait_time(poll_interval)))
+                self._settle()
+                self._submit(profile)
+                self._collect(timeout=poll_interval)
+        finally:
+            # 已提交的任务照常完成，未开始的丢弃
+            for future in self._inflight:
+                future.cancel()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            while self._inflight:
+                self._collect(timeout=None)
+            self.backend.close()